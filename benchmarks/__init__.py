@@ -0,0 +1,3 @@
+"""
+This is a definition of performance benchmarks of pizzaapp
+"""
@@ -0,0 +1,276 @@
+"""
+Load test of pizza API routes. Database is seeded with --rows pizzas,
+then every route is driven through Flask test client (in-process, no
+network) and/or real gunicorn server with threaded keep-alive load
+generator.
+
+Usage:
+  python -m benchmarks.bench_api --rows 10000 --mode client
+  python -m benchmarks.bench_api --rows 100000 --mode server --concurrency 16
+  python -m benchmarks.bench_api --database-uri postgresql://... --output run.json
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from .common import configure_environment, seed_pizzas, summarize, write_results
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+WSGI_APP = "pizzaapp.wsgi:app"
+APP_MODULES = {"uvicorn": "pizzaapp.asgi:app"}
+
+
+def scenarios(rows):
+    """
+    Return scenarios, each being function of iteration number returning
+    request (method, path, headers, body). Written rows are kept apart
+    from seeded ones, so read scenarios see the same data.
+    """
+
+    page_cursor = max(rows // 2, 1)
+    counter = itertools.count()
+
+    def created_name(i):
+        return f"bench-{os.getpid()}-{next(counter)}-{i}"
+
+    return {
+        "list_first_page": lambda i: ("GET", "/api/v1/pizza/", {}, None),
+        "list_page_cursor": lambda i: (
+            "GET",
+            f"/api/v1/pizza/?cursor={page_cursor}&limit=100",
+            {},
+            None,
+        ),
+        "list_fields_filters": lambda i: (
+            "GET",
+            "/api/v1/pizza/?fields=name,price&min_price=20&max_price=30",
+            {},
+            None,
+        ),
+        "search": lambda i: (
+            "GET",
+            f"/api/v1/pizza/search?q=pizza+{i % rows:07d}"[:-2],
+            {},
+            None,
+        ),
+        "get_single": lambda i: ("GET", f"/api/v1/pizza/{i % rows + 1}", {}, None),
+        "create": lambda i: (
+            "POST",
+            "/api/v1/pizza/",
+            JSON_HEADERS,
+            json.dumps({"name": created_name(i), "price": "25.00"}),
+        ),
+        "update": lambda i: (
+            "PATCH",
+            f"/api/v1/pizza/{i % rows + 1}",
+            JSON_HEADERS,
+            json.dumps({"name": f"pizza-{i % rows:07d}", "price": "26.00"}),
+        ),
+        "bulk_create": lambda i: (
+            "POST",
+            "/api/v1/pizza/bulk",
+            JSON_HEADERS,
+            json.dumps(
+                {
+                    "create": [
+                        {"name": created_name(f"{i}-{n}"), "price": "25.00"}
+                        for n in range(50)
+                    ]
+                }
+            ),
+        ),
+        "delete_missing": lambda i: (
+            "DELETE",
+            f"/api/v1/pizza/{rows + 10_000_000 + i}",
+            {},
+            None,
+        ),
+    }
+
+
+def drive_client(client, make_request, iterations):
+    """
+    Send iterations requests through test client, return latency samples
+    and error count
+    """
+
+    samples, errors = [], 0
+    for i in range(iterations):
+        method, path, headers, body = make_request(i)
+        call_start = time.perf_counter()
+        response = client.open(path, method=method, headers=headers, data=body)
+        samples.append(time.perf_counter() - call_start)
+        errors += response.status_code >= 500
+    return samples, errors
+
+
+def run_client(app, iterations):
+    """
+    Drive every scenario through Flask test client
+    """
+
+    client = app.test_client()
+    results = {}
+    for name, make_request in scenarios(app.config["BENCH_ROWS"]).items():
+        start = time.perf_counter()
+        samples, errors = drive_client(client, make_request, iterations)
+        results[f"client:{name}"] = {
+            **summarize(samples, time.perf_counter() - start),
+            "errors": errors,
+        }
+    return results
+
+
+def start_server(port, workers, worker_class):
+    """
+    Start gunicorn serving app from benchmark database, wait until ready
+    """
+
+    env = {
+        **os.environ,
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_WORKER_CLASS": worker_class,
+        "GUNICORN_ACCESSLOG": os.devnull,
+    }
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py"]
+        + ["--bind", f"127.0.0.1:{port}", APP_MODULES.get(worker_class, WSGI_APP)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Benchmark server did not start")
+
+
+def drive(port, make_request, iterations, concurrency):
+    """
+    Send iterations requests from concurrency threads, each thread uses
+    own keep-alive connection. Return latency samples and error count.
+    """
+
+    iteration = itertools.count()
+    samples, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local_samples, local_errors = [], 0
+        while (i := next(iteration)) < iterations:
+            method, path, headers, body = make_request(i)
+            call_start = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            local_samples.append(time.perf_counter() - call_start)
+            local_errors += response.status >= 500
+        conn.close()
+        with lock:
+            samples.extend(local_samples)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, sum(errors)
+
+
+def run_server(args):
+    """
+    Drive every scenario through real server
+    """
+
+    server = start_server(args.port, args.workers, args.worker_class)
+    results = {}
+    try:
+        for name, make_request in scenarios(args.rows).items():
+            start = time.perf_counter()
+            samples, errors = drive(
+                args.port, make_request, args.iterations, args.concurrency
+            )
+            results[f"server:{name}"] = {
+                **summarize(samples, time.perf_counter() - start),
+                "errors": errors,
+            }
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def main():
+    """
+    Seed database, run selected modes and write results
+    """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--mode", choices=("client", "server", "both"), default="both")
+    parser.add_argument("--database-uri", help="defaults to temporary SQLite file")
+    parser.add_argument("--cache", default="null", help="FLASK_CACHE_TYPE to use")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", default="gthread", help="gunicorn worker")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_uri = args.database_uri or f"sqlite:///{tmp_dir}/bench.sqlite3"
+        configure_environment(database_uri, args.cache)
+        # pylint: disable=import-outside-toplevel
+        from pizzaapp.app import create_app, db
+
+        app = create_app()
+        app.config["BENCH_ROWS"] = args.rows
+
+        # Database is seeded again before every mode, so writes of one
+        # mode do not change data seen by the other
+        results, seed_seconds = {}, None
+        if args.mode in ("client", "both"):
+            with app.app_context():
+                seed_seconds = seed_pizzas(args.rows)
+            results.update(run_client(app, args.iterations))
+        if args.mode in ("server", "both"):
+            with app.app_context():
+                seed_seconds = seed_pizzas(args.rows)
+                db.engine.dispose()
+            results.update(run_server(args))
+
+    meta = {
+        "benchmark": "api",
+        "rows": args.rows,
+        "iterations": args.iterations,
+        "mode": args.mode,
+        "database": database_uri.split(":", 1)[0],
+        "cache": args.cache,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "worker_class": args.worker_class,
+        "seed_seconds": seed_seconds,
+    }
+    write_results(args.output, meta, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Micro-benchmarks of pizza API building blocks: schema load/dump,
+compiled validation, serializer, custom_response and model methods, each measured in
+isolation on seeded database.
+
+Usage:
+  python -m benchmarks.bench_micro --rows 10000 --iterations 1000
+  python -m benchmarks.bench_micro --database-uri postgresql://... --output run.json
+"""
+
+import argparse
+import itertools
+import tempfile
+from .common import configure_environment, measure, seed_pizzas, write_results
+
+
+def read_benchmarks(rows):
+    """
+    Return benchmarks which do not modify database
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pizzaapp.models.pizza_model import PizzaModel, PizzaSchema
+    from pizzaapp.shared.serializer import dumps
+    from pizzaapp.shared.validation import validated
+    from pizzaapp.views.pizza_view import custom_response
+
+    schema = PizzaSchema()
+    payload = {"name": "margherita", "price": "25.50", "ingredients": ["basil"]}
+    partial_payload = {"price": 25.5}
+    ids = itertools.cycle(range(1, rows + 1))
+    pizza = PizzaModel.get_pizza_by_id(1)
+    page = PizzaModel.get_pizzas_page(100)
+
+    return {
+        "schema_load": lambda: schema.load(payload),
+        "schema_load_partial": lambda: schema.load(partial_payload, partial=True),
+        "validated_load": lambda: validated(schema, payload),
+        "validated_load_partial": lambda: validated(schema, partial_payload, True),
+        "schema_dump": lambda: schema.dump(pizza),
+        "schema_dump_page": lambda: schema.dump(page, many=True),
+        "serializer_dumps": lambda: dumps(schema, pizza),
+        "serializer_dumps_page": lambda: dumps(schema, page, many=True),
+        "custom_response": lambda: custom_response(schema.dump(pizza), 200),
+        "get_pizza_by_id": lambda: PizzaModel.get_pizza_by_id(next(ids)),
+        "get_pizzas_page": lambda: PizzaModel.get_pizzas_page(100, rows // 2),
+        "get_pizzas_page_columns": lambda: PizzaModel.get_pizzas_page(
+            100, rows // 2, ["id", "name", "price"]
+        ),
+        "get_list_version": PizzaModel.get_list_version,
+        "get_pizza_version": lambda: PizzaModel.get_pizza_version(next(ids)),
+    }
+
+
+def write_benchmarks(iterations):
+    """
+    Measure save, update and delete of the same set of new pizzas, then
+    single statement update and delete (UPDATE/DELETE ... RETURNING) of
+    another set
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pizzaapp.models import db
+    from pizzaapp.models.pizza_model import PizzaModel
+
+    pizzas = [
+        PizzaModel({"name": f"micro-{i}", "price": 20.0}) for i in range(iterations)
+    ]
+    created, updated, deleted = iter(pizzas), iter(pizzas), iter(pizzas)
+    results = {
+        "model_save": measure(lambda: next(created).save(), iterations),
+        "model_update": measure(
+            lambda: next(updated).update({"price": 21.0}), iterations
+        ),
+        "model_delete": measure(lambda: next(deleted).delete(), iterations),
+    }
+
+    pizzas = [
+        PizzaModel({"name": f"micro-lean-{i}", "price": 20.0})
+        for i in range(iterations)
+    ]
+    for pizza in pizzas:
+        pizza.save()
+    ids = [pizza.id for pizza in pizzas]
+    updated, deleted = iter(ids), iter(ids)
+    # Session starts empty as in request, rows are not in identity map
+    db.session.remove()
+    results.update(
+        {
+            "model_update_by_id": measure(
+                lambda: PizzaModel.update_by_id(next(updated), {"price": 21.0}),
+                iterations,
+            ),
+            "model_delete_by_id": measure(
+                lambda: PizzaModel.delete_by_id(next(deleted)), iterations
+            ),
+        }
+    )
+    db.session.remove()
+    return results
+
+
+def main():
+    """
+    Seed database, run benchmarks and write results
+    """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--database-uri", help="defaults to temporary SQLite file")
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_uri = args.database_uri or f"sqlite:///{tmp_dir}/bench.sqlite3"
+        configure_environment(database_uri)
+        # pylint: disable=import-outside-toplevel
+        from pizzaapp.app import create_app
+
+        app = create_app()
+        with app.test_request_context():
+            seed_seconds = seed_pizzas(args.rows)
+            results = {
+                name: measure(func, args.iterations)
+                for name, func in read_benchmarks(args.rows).items()
+            }
+            results.update(write_benchmarks(args.iterations))
+
+    meta = {
+        "benchmark": "micro",
+        "rows": args.rows,
+        "iterations": args.iterations,
+        "database": database_uri.split(":", 1)[0],
+        "seed_seconds": seed_seconds,
+    }
+    write_results(args.output, meta, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark of SQL statements issued by pizza list endpoints while catalog
+grows. Database is seeded with every size of --sizes (pizzas with
+--ingredients ingredients each), then page of list endpoint, ingredient
+filter and search are requested through Flask test client. Page of
+pizzas with ingredients has to cost the same number of statements for
+any catalog size, lazy loading of the same page (N+1) is measured for
+comparison.
+
+Usage:
+  python -m benchmarks.bench_queries --sizes 100,1000,10000 --limit 100
+  python -m benchmarks.bench_queries --database-uri postgresql://... --output run.json
+"""
+
+import argparse
+import tempfile
+from sqlalchemy import event
+from .common import configure_environment, measure, seed_pizzas, write_results
+
+
+def seed_ingredients(rows, per_pizza, batch_size=10000):
+    """
+    Link every pizza with per_pizza of ingredients ingredient-0..9
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pizzaapp.models import db
+    from pizzaapp.models.ingredient_model import IngredientModel, pizza_ingredient
+
+    ids = [
+        ingredient.id
+        for ingredient in IngredientModel.get_or_create(
+            f"ingredient-{i}" for i in range(10)
+        )
+    ]
+    links = [
+        {"pizza_id": pizza_id, "ingredient_id": ids[(pizza_id + i) % len(ids)]}
+        for pizza_id in range(1, rows + 1)
+        for i in range(per_pizza)
+    ]
+    for offset in range(0, len(links), batch_size):
+        db.session.execute(
+            db.insert(pizza_ingredient), links[offset : offset + batch_size]
+        )
+    db.session.commit()
+
+
+class StatementCounter:
+    """
+    Count SQL statements executed by engine
+    """
+
+    def __init__(self, engine):
+        """
+        Class constructor
+        """
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *_):
+        self.count += 1
+
+    def statements(self, func):
+        """
+        Return number of statements executed by func
+        """
+
+        start = self.count
+        func()
+        return self.count - start
+
+
+def list_paths(limit):
+    """
+    Return paths of list requests by benchmark name
+    """
+
+    return {
+        "list_page": f"/api/v1/pizza/?limit={limit}",
+        "list_page_ingredient": f"/api/v1/pizza/?limit={limit}&ingredient=ingredient-0",
+        "search": f"/api/v1/pizza/search?q=pizza&limit={limit}",
+    }
+
+
+def lazy_page(limit):
+    """
+    Serialize page of pizzas loading ingredients pizza by pizza (N+1)
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pizzaapp.models import db
+    from pizzaapp.models.pizza_model import PizzaModel, PizzaSchema
+
+    pizzas = db.session.scalars(
+        db.select(PizzaModel).order_by(PizzaModel.id).limit(limit)
+    ).all()
+    PizzaSchema(many=True).dump(pizzas)
+    db.session.remove()
+
+
+def main():
+    """
+    Seed database with every size, count statements and measure latency
+    of list requests, write results
+    """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--ingredients", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--database-uri", help="defaults to temporary SQLite file")
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_uri = args.database_uri or f"sqlite:///{tmp_dir}/bench.sqlite3"
+        configure_environment(database_uri)
+        # pylint: disable=import-outside-toplevel
+        from pizzaapp.app import create_app
+        from pizzaapp.models import db
+
+        app = create_app()
+        client = app.test_client()
+        with app.app_context():
+            counter = StatementCounter(db.engine)
+        results = {}
+        for size in sizes:
+            with app.app_context():
+                seed_pizzas(size)
+                seed_ingredients(size, args.ingredients)
+            # Statements are counted once app is warm (search backend
+            # is detected on first request)
+            for name, path in list_paths(args.limit).items():
+                results[f"{name}_{size}"] = {
+                    **measure(lambda path=path: client.get(path), args.iterations),
+                    "statements": counter.statements(
+                        lambda path=path: client.get(path)
+                    ),
+                }
+            with app.app_context():
+                results[f"lazy_page_{size}"] = {
+                    **measure(lambda: lazy_page(args.limit), args.iterations),
+                    "statements": counter.statements(lambda: lazy_page(args.limit)),
+                }
+
+    meta = {
+        "benchmark": "queries",
+        "sizes": sizes,
+        "limit": args.limit,
+        "ingredients": args.ingredients,
+        "iterations": args.iterations,
+        "database": database_uri.split(":", 1)[0],
+    }
+    write_results(args.output, meta, results)
+
+
+if __name__ == "__main__":
+    main()
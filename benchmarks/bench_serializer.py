@@ -0,0 +1,65 @@
+"""
+Benchmark of pizza list serialization: marshmallow schema.dump +
+flask.json.dumps compared with compiled fast serializer
+
+Usage: python -m benchmarks.bench_serializer [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+
+def main():
+    """
+    Run benchmark and print results as JSON
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("FLASK_ENV", "local")
+    # pylint: disable=import-outside-toplevel
+    from pizzaapp.app import create_app
+    from pizzaapp.models.pizza_model import PizzaModel, PizzaSchema
+    from pizzaapp.shared.serializer import dumps
+
+    app = create_app()
+    schema = PizzaSchema()
+    now = datetime.now(timezone.utc)
+    pizzas = []
+    for i in range(args.rows):
+        pizza = PizzaModel({"name": f"pizza-{i}", "price": 10 + i / 100})
+        pizza.id = i + 1
+        pizza.created_at = pizza.modified_at = now
+        pizzas.append(pizza)
+
+    results = {"rows": args.rows, "repeat": args.repeat}
+    outputs = {}
+    with app.app_context():
+        for serializer in ("marshmallow", "fast"):
+            app.config["PIZZA_SERIALIZER"] = serializer
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                outputs[serializer] = dumps(schema, pizzas, many=True)
+                timings.append(time.perf_counter() - start)
+            results[serializer] = {
+                "min_s": min(timings),
+                "median_s": statistics.median(timings),
+            }
+
+    results["identical"] = outputs["marshmallow"] == outputs["fast"]
+    results["speedup"] = (
+        results["marshmallow"]["median_s"] / results["fast"]["median_s"]
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
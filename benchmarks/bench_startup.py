@@ -0,0 +1,135 @@
+"""
+Startup benchmark: time from interpreter start to first served request
+of serve only entry point (pizzaapp.wsgi) and of full app (with
+migration machinery, used by flask CLI). Every run is fresh interpreter,
+slowest imports are reported from python -X importtime.
+
+Usage:
+  python -m benchmarks.bench_startup --runs 20
+  python -m benchmarks.bench_startup --top 20 --output startup.json
+"""
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from .common import configure_environment, seed_pizzas, summarize, write_results
+
+TARGETS = {
+    "wsgi": "import pizzaapp.wsgi as entry; app = entry.app",
+    "full": "from pizzaapp.app import create_app; app = create_app()",
+}
+PROBE = """
+import json, time
+start = time.perf_counter()
+{target}
+created = time.perf_counter()
+status = app.test_client().get("/api/v1/pizza/").status_code
+print(json.dumps({{
+    "load": created - start,
+    "first_request": time.perf_counter() - created,
+    "status": status,
+}}), flush=True)
+"""
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_probe(target):
+    """
+    Start fresh interpreter serving first request, return wall time
+    until response and times measured inside interpreter
+    """
+
+    start = time.perf_counter()
+    with subprocess.Popen(
+        [sys.executable, "-c", PROBE.format(target=TARGETS[target])],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    ) as process:
+        # create_app prints profile before timings
+        line = next((line for line in process.stdout if line.startswith("{")), None)
+        elapsed = time.perf_counter() - start
+    if line is None:
+        raise RuntimeError(f"App {target} failed to start")
+    timings = json.loads(line)
+    if timings["status"] != 200:
+        raise RuntimeError(f"First request of {target} failed: {timings['status']}")
+    return elapsed, timings
+
+
+def slowest_imports(target, top):
+    """
+    Return top modules by self import time (microseconds) with their
+    cumulative time
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", TARGETS[target]],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = [
+        {"module": match[4], "self_us": int(match[1]), "cumulative_us": int(match[2])}
+        for match in IMPORTTIME_RE.finditer(result.stderr)
+    ]
+    return sorted(imports, key=lambda row: row["self_us"], reverse=True)[:top]
+
+
+def main():
+    """
+    Seed database, run startup probes and write results
+    """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports shown")
+    parser.add_argument("--database-uri", help="defaults to temporary SQLite file")
+    parser.add_argument("--output", default="-", help="JSON file, - for stdout")
+    args = parser.parse_args()
+
+    results, imports = {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_uri = args.database_uri or f"sqlite:///{tmp_dir}/bench.sqlite3"
+        # Probes inherit environment
+        configure_environment(database_uri)
+        # pylint: disable=import-outside-toplevel
+        from pizzaapp.app import create_app
+
+        with create_app().app_context():
+            seed_pizzas(args.rows)
+
+        for target in TARGETS:
+            samples = {"time_to_first_request": [], "load": [], "first_request": []}
+            for _ in range(args.runs):
+                elapsed, timings = run_probe(target)
+                samples["time_to_first_request"].append(elapsed)
+                samples["load"].append(timings["load"])
+                samples["first_request"].append(timings["first_request"])
+            results.update(
+                {
+                    f"{target}_{name}": summarize(values)
+                    for name, values in samples.items()
+                }
+            )
+            imports[target] = slowest_imports(target, args.top)
+
+    meta = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "rows": args.rows,
+        "database": database_uri.split(":", 1)[0],
+        "slowest_imports": imports,
+    }
+    write_results(args.output, meta, results)
+
+
+if __name__ == "__main__":
+    main()
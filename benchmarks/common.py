@@ -0,0 +1,111 @@
+"""
+This is a definition of helpers shared by benchmarks
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def configure_environment(database_uri, cache_type="null"):
+    """
+    Point local profile to benchmark database, must be called before
+    pizzaapp is imported (configuration is read on import)
+    """
+
+    os.environ["FLASK_ENV"] = "local"
+    os.environ["FLASK_DB_URI"] = database_uri
+    os.environ["FLASK_CACHE_TYPE"] = cache_type
+
+
+def summarize(samples, wall_time=None):
+    """
+    Return count, mean and percentiles (milliseconds) of latency samples
+    given in seconds, throughput if wall time of run is known
+    """
+
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+    summary = {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "min_ms": ordered[0] * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+    if wall_time:
+        summary["rps"] = len(ordered) / wall_time
+    return summary
+
+
+def measure(func, iterations):
+    """
+    Call func iterations times, return summary of call latencies
+    """
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - call_start)
+    return summarize(samples, time.perf_counter() - start)
+
+
+def seed_pizzas(rows, batch_size=10000):
+    """
+    Insert rows pizzas into empty database of current app context,
+    return elapsed seconds
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from pizzaapp.models import db
+    from pizzaapp.models.pizza_model import PizzaModel
+
+    db.drop_all()
+    db.create_all()
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        batch = [
+            {
+                "name": f"pizza-{i:07d}",
+                "price": 10 + (i % 5000) / 100,
+                "created_at": now,
+                "modified_at": now,
+            }
+            for i in range(offset, min(rows, offset + batch_size))
+        ]
+        db.session.execute(db.insert(PizzaModel), batch)
+    db.session.commit()
+    return time.perf_counter() - start
+
+
+def write_results(path, meta, results):
+    """
+    Write results with run metadata as JSON (stdout when path is "-")
+    """
+
+    document = {
+        "meta": {
+            **meta,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    if path == "-":
+        print(json.dumps(document, indent=2))
+        return
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(document, output, indent=2)
@@ -0,0 +1,71 @@
+"""
+Compare benchmark results with baseline produced by the same benchmark.
+Exit code is 1 when any metric got slower than threshold allows, so
+comparison can gate CI.
+
+Usage:
+  python -m benchmarks.compare baseline.json run.json [--threshold 1.2]
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(baseline, current, threshold, metrics=METRICS):
+    """
+    Return rows (name, metric, baseline, current, ratio, regressed) for
+    every benchmark present in both results
+    """
+
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        for metric in metrics:
+            before, after = baseline["results"][name][metric], result[metric]
+            ratio = after / before if before else float("inf")
+            rows.append((name, metric, before, after, ratio, ratio > threshold))
+    return rows
+
+
+def main():
+    """
+    Print comparison table, exit with 1 on regression
+    """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="allowed ratio of current to baseline latency",
+    )
+    parser.add_argument("--metric", action="append", choices=METRICS)
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current, encoding="utf-8") as current_file:
+        current = json.load(current_file)
+
+    rows = compare(baseline, current, args.threshold, args.metric or METRICS)
+    for name, metric, before, after, ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{name:40} {metric:7} {before:10.3f} {after:10.3f} {ratio:6.2f}x {flag}")
+
+    regressions = sum(row[-1] for row in rows)
+    print(
+        f"{len(rows)} compared, {regressions} regressed (threshold {args.threshold}x)"
+    )
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+This is a definition of gunicorn configuration used in containers,
+every setting can be overridden with GUNICORN_* environment variable
+"""
+
+# pylint: disable=invalid-name
+
+import math
+import os
+
+WORKER_CLASSES = ("sync", "gthread", "gevent", "uvicorn")
+
+
+def available_cpus():
+    """
+    Return number of CPUs available to container, cgroup v2 quota
+    (Kubernetes CPU limit) is respected
+    """
+
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def default_workers(worker):
+    """
+    Return worker count for worker class, sync workers block on I/O
+    so more processes than CPUs are needed
+    """
+
+    if worker == "sync":
+        return 2 * available_cpus() + 1
+    return available_cpus()
+
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(
+        f"Unknown GUNICORN_WORKER_CLASS: {worker_class}, "
+        f"possible values: {' '.join(WORKER_CLASSES)}"
+    )
+
+bind = f"0.0.0.0:{os.environ.get('GUNICORN_PORT', '5000')}"
+workers = int(os.environ.get("GUNICORN_WORKERS", default_workers(worker_class)))
+# Used by gthread workers only
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# Used by gevent workers only (requires gevent package)
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+if worker_class == "uvicorn":
+    # ASGI worker, serves pizzaapp.asgi:app
+    worker_class = "uvicorn.workers.UvicornWorker"
+
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+# Must stay below terminationGracePeriodSeconds of pod
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 25))
+
+# Recycle workers periodically to contain memory growth, jitter avoids
+# restarting all workers at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# App is imported once in master and inherited by forked workers, which
+# shortens scale-out and worker recycling (see post_fork)
+preload_app = os.environ.get("GUNICORN_PRELOAD_APP", "true").lower() == "true"
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+errorlog = "-"
+
+
+def child_exit(_server, worker):
+    """
+    Drop metrics of exited worker (Prometheus multiprocess mode)
+    """
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # pylint: disable=import-outside-toplevel
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, _worker):
+    """
+    Drop database connections inherited from master, preloaded app must
+    not share them between workers
+    """
+
+    if server.cfg.preload_app:
+        # pylint: disable=import-outside-toplevel
+        from flask import Flask
+        from pizzaapp.app import dispose_engines
+
+        app = server.app.wsgi()
+        if not isinstance(app, Flask):
+            # ASGI adapter wraps Flask app
+            app = app.wsgi_app
+        dispose_engines(app, close=False)
@@ -65,3 +65,28 @@ Create the name of TLS secret for ingress
 {{- print "" }}
 {{- end }}
 {{- end }}
+
+
+{{/*
+Environment of app container, shared by deployment and jobs, read from
+config map and secret of given name
+*/}}
+{{- define "flask-api-pizzaapp-chart.env" -}}
+{{- $top := index . 0 -}}
+{{- $name := index . 1 -}}
+{{- range $k, $v := $top.Values.env.secrets }}
+- name: {{ $k }}
+  valueFrom:
+    secretKeyRef:
+      name: {{ $name }}
+      key: {{ $k }}
+      optional: false
+{{- end }}
+{{- range $k, $v := $top.Values.env.configMap }}
+- name: {{ $k }}
+  valueFrom:
+    configMapKeyRef:
+      name: {{ $name }}
+      key: {{ $k }}
+{{- end }}
+{{- end }}
\ No newline at end of file
@@ -3,21 +3,61 @@ This file contains main constructor for app
 """
 
 import os
+from functools import lru_cache
 from flask import Flask
-from flask import render_template
-from flask_migrate import Migrate
-from .config import app_config
+from flask import jsonify, render_template
+from werkzeug.middleware.proxy_fix import ProxyFix
+from .cli import pizza_cli
+from .config import app_config, async_database_config
 
 # Import of model is necessary
 from .models import db
+from .shared.breaker import circuit_breaker
+from .shared.cache import cache
+from .shared.changefeed import changefeed
+from .shared.coalescing import coalescer
+from .shared.compression import compression
+from .shared.idempotency import idempotency
+from .shared.metrics import metrics
+from .shared.pool_metrics import pool_metrics
+from .shared.profiling import profiling
+from .shared.ratelimit import rate_limiter
+from .shared.replicas import replicas
+from .shared.search import include_object, pizza_search
+from .shared.validation import body_limits
 from .views.pizza_view import pizza_api as pizza_blueprint
+from .views.health_view import health_api as health_blueprint
 
-migrate = Migrate()
 
+def init_migrations(app):
+    """
+    Register Flask-Migrate (flask db commands), Alembic is imported only
+    here as serving app does not need it
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from flask_migrate import Migrate
+
+    Migrate(app, db, include_object=include_object)
+
+
+def dispose_engines(app, close=True):
+    """
+    Dispose connection pools of all database engines of app, forked
+    worker passes close=False to drop connections of parent process
+    without closing them
+    """
 
-def create_app():
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def create_app(asyncio=False, serve_only=False):
     """
-    Create app
+    Create app, with asyncio database driver is used (app has to be
+    served through ASGI adapter then). Serve only app (WSGI and ASGI
+    entry points) skips migration machinery.
     """
 
     try:
@@ -32,27 +72,56 @@ def create_app():
     app = Flask(__name__, template_folder="templates")
 
     app.config.from_object(app_config[env_name])
+    if asyncio:
+        app.config.update(async_database_config(app.config, app.instance_path))
     db.init_app(app)
-    migrate.init_app(app, db)
+    if not serve_only:
+        init_migrations(app)
+    if app.config["PIZZA_PROXY_COUNT"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PIZZA_PROXY_COUNT"])
+    # Registered first, limited requests skip other hooks
+    rate_limiter.init_app(app)
+    # Registered before hooks reading request body (idempotency)
+    body_limits.init_app(app)
+    cache.init_app(app)
+    coalescer.init_app(app)
+    circuit_breaker.init_app(app)
+    changefeed.init_app(app)
+    pizza_search.init_app(app)
+    pool_metrics.init_app(app, db)
+    replicas.init_app(app, db)
+    metrics.init_app(app, db)
+    profiling.init_app(app, db)
+    # Registered last, so responses are compressed before other hooks
+    # (metrics, profiling) see them
+    compression.init_app(app)
+    # Registered after compression, so stored responses are not
+    # compressed (replayed ones are compressed for every client)
+    idempotency.init_app(app)
     app.register_blueprint(pizza_blueprint, url_prefix="/api/v1/pizza")
+    app.register_blueprint(health_blueprint)
+    app.cli.add_command(pizza_cli)
+
+    # Index page content does not change after startup
+    index_title = "Welcome page"
+    index_endp = [
+        # List of endpoints with method (some are filtered out)
+        (str(p), ([m for m in p.methods if m not in ("OPTIONS", "HEAD")]))
+        for p in app.url_map.iter_rules()
+        if str(p).startswith("/api")
+    ]
+    non_prod = True if os.environ.get("FLASK_ENV") != "production" else None
+    banner_color = os.environ.get("BANNER_COLOR") if non_prod else None
+    env_detailed_name = os.environ.get("ENV_DETAILED_NAME") if non_prod else None
 
     @app.route("/", methods=["GET"])
     @app.route("/index", methods=["GET"])
+    @lru_cache(maxsize=1)
     def index():
         """
-        Test endpoint
+        Test endpoint, template is loaded and rendered on first request
         """
 
-        index_title = "Welcome page"
-        index_endp = [
-            # List of endpoints with method (some are filtered out)
-            (str(p), ([m for m in p.methods if m not in ("OPTIONS", "HEAD")]))
-            for p in app.url_map.iter_rules()
-            if str(p).startswith("/api")
-        ]
-        non_prod = True if os.environ.get("FLASK_ENV") != "production" else None
-        banner_color = os.environ.get("BANNER_COLOR") if non_prod else None
-        env_detailed_name = os.environ.get("ENV_DETAILED_NAME") if non_prod else None
         return render_template(
             "index/index.html",
             title=index_title,
@@ -61,4 +130,20 @@ def create_app():
             env_detailed_name=env_detailed_name,
         )
 
+    @app.route("/stats", methods=["GET"])
+    def stats():
+        """
+        Runtime counters of current worker process
+        """
+
+        return jsonify(
+            breaker=circuit_breaker.stats(),
+            cache=cache.stats(),
+            changes=changefeed.stats(),
+            coalescing=coalescer.stats(),
+            idempotency=idempotency.stats(),
+            pool=pool_metrics.stats(),
+            replicas=replicas.stats(),
+        )
+
     return app
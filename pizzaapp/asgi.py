@@ -0,0 +1,26 @@
+"""
+This file contains ASGI entry point used by production server with
+uvicorn workers, database is accessed with asyncio drivers
+"""
+
+from functools import partial
+from .app import create_app, dispose_engines
+from .shared.asgi import ASGIAdapter
+from .shared.validation import request_body_limit
+
+flask_app = create_app(asyncio=True, serve_only=True)
+
+
+def dispose_engine():
+    """
+    Close pooled connections on shutdown
+    """
+
+    dispose_engines(flask_app)
+
+
+app = ASGIAdapter(
+    flask_app,
+    shutdown=dispose_engine,
+    body_limit=partial(request_body_limit, flask_app),
+)
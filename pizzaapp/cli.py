@@ -0,0 +1,86 @@
+"""
+This is a definition of flask pizza commands
+"""
+
+from datetime import datetime, timedelta, timezone
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .models.change_model import PizzaChangeModel
+from .shared.catalog import FORMATS, catalog_format, export_catalog, import_catalog
+from .shared.search import pizza_search
+
+pizza_cli = AppGroup("pizza", help="Pizza catalog maintenance commands")
+
+
+@pizza_cli.command("search-index")
+def search_index():
+    """
+    Create search indexes of database and fill them with current pizzas
+    """
+
+    dialect = pizza_search.create_indexes()
+    click.echo(f"Search indexes are ready ({dialect})")
+
+
+@pizza_cli.command("prune-changes")
+def prune_changes():
+    """
+    Delete changes older than PIZZA_CHANGES_RETENTION seconds from change
+    log, subscribers with older token have to reload pizzas
+    """
+
+    retention = current_app.config["PIZZA_CHANGES_RETENTION"]
+    before = datetime.now(timezone.utc) - timedelta(seconds=retention)
+    click.echo(f"Pruned {PizzaChangeModel.prune(before)} changes")
+
+
+@pizza_cli.command("import")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="By file extension")
+@click.option("--chunk-size", type=int, help="Defaults to PIZZA_IMPORT_CHUNK_SIZE")
+def import_pizzas(file, fmt, chunk_size):
+    """
+    Import pizzas from CSV or NDJSON file (- for standard input),
+    existing pizzas are updated by name
+    """
+
+    try:
+        fmt = catalog_format(file.name, fmt)
+    except ValueError as exc:
+        raise click.UsageError(str(exc)) from exc
+
+    def report_error(line, messages):
+        click.echo(f"Rejected line {line}: {messages}", err=True)
+
+    chunk_size = chunk_size or current_app.config["PIZZA_IMPORT_CHUNK_SIZE"]
+    stats = import_catalog(file, fmt, chunk_size, report_error)
+    click.echo(
+        f"Imported {stats['imported']} of {stats['rows']} rows "
+        f"({stats['rejected']} rejected) in {stats['seconds']:.2f} s, "
+        f"{stats['rows_per_second']:.0f} rows/s"
+    )
+
+
+@pizza_cli.command("export")
+@click.argument("file", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="By file extension")
+@click.option("--chunk-size", type=int, help="Defaults to PIZZA_EXPORT_CHUNK_SIZE")
+def export_pizzas(file, fmt, chunk_size):
+    """
+    Export all pizzas to CSV or NDJSON file (standard output by default)
+    """
+
+    try:
+        fmt = catalog_format(file.name, fmt)
+    except ValueError as exc:
+        raise click.UsageError(str(exc)) from exc
+
+    chunk_size = chunk_size or current_app.config["PIZZA_EXPORT_CHUNK_SIZE"]
+    stats = export_catalog(file, fmt, chunk_size)
+    # Summary does not mix with exported rows on standard output
+    click.echo(
+        f"Exported {stats['rows']} rows in {stats['seconds']:.2f} s, "
+        f"{stats['rows_per_second']:.0f} rows/s",
+        err=True,
+    )
@@ -3,9 +3,356 @@ This is a defitinion of possible configuration profile
 """
 
 import os
+import tempfile
+from sqlalchemy.engine import make_url
+from .shared.pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
 
+# Drivers used when app is served through ASGI adapter
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
 
-class Local:
+
+def env_int(name, default):
+    """
+    Return integer from environment variable, empty value means default
+    """
+
+    return int(os.environ.get(name) or default)
+
+
+def env_bool(name, default):
+    """
+    Return boolean from environment variable, empty value means default
+    """
+
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def env_list(name, default):
+    """
+    Return tuple of comma separated values from environment variable,
+    empty value means default
+    """
+
+    value = os.environ.get(name) or default
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
+def env_rate_limits(name, default):
+    """
+    Return rate limits of routes, environment variable lists comma
+    separated endpoint=rate/burst overriding defaults
+    """
+
+    limits = dict(default)
+    for item in env_list(name, ""):
+        endpoint, limit = item.split("=")
+        rate, burst = limit.split("/")
+        limits[endpoint.strip()] = (float(rate), int(burst))
+    return limits
+
+
+def engine_options(asyncio=False):
+    """
+    SQLAlchemy engine options of database server profiles. Every worker
+    process holds up to FLASK_DB_POOL_SIZE + FLASK_DB_MAX_OVERFLOW
+    connections, so the database must accept that multiplied by
+    workers per pod and HPA maxReplicas.
+    """
+
+    application_name = os.environ.get("FLASK_DB_APPLICATION_NAME") or "pizzaapp"
+    connect_timeout = env_int("FLASK_DB_CONNECT_TIMEOUT", 5)
+    # PgBouncer (transaction pooling) rejects "options" startup parameter,
+    # statement_timeout has to be set on database role then
+    pgbouncer = env_bool("FLASK_DB_PGBOUNCER", False)
+    statement_timeout = env_int("FLASK_DB_STATEMENT_TIMEOUT_MS", 5000)
+
+    if asyncio:
+        # Same settings in asyncpg terms
+        server_settings = {"application_name": application_name}
+        connect_args = {"timeout": connect_timeout, "server_settings": server_settings}
+        if pgbouncer:
+            # Prepared statements do not survive transaction pooling
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+        else:
+            server_settings["statement_timeout"] = str(statement_timeout)
+    else:
+        connect_args = {
+            "application_name": application_name,
+            "connect_timeout": connect_timeout,
+        }
+        if not pgbouncer:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        "pool_size": env_int("FLASK_DB_POOL_SIZE", 5),
+        "max_overflow": env_int("FLASK_DB_MAX_OVERFLOW", 5),
+        "pool_timeout": env_int("FLASK_DB_POOL_TIMEOUT", 10),
+        # Connections are reopened before proxies/PgBouncer drop them
+        "pool_recycle": env_int("FLASK_DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": env_bool("FLASK_DB_POOL_PRE_PING", True),
+        "connect_args": connect_args,
+    }
+
+
+def async_database_uri(uri, instance_path):
+    """
+    Return database URI switched to asyncio driver
+    """
+
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise KeyError(f"No asyncio driver for database: {backend}")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if "sslmode" in url.query:
+        # asyncpg names libpq sslmode parameter ssl
+        url = url.update_query_dict({"ssl": url.query["sslmode"]})
+        url = url.difference_update_query(["sslmode"])
+    if backend == "sqlite" and url.database and url.database != ":memory:":
+        # Flask-SQLAlchemy resolves relative SQLite path against instance
+        # folder only for default driver
+        url = url.set(database=os.path.join(instance_path, url.database))
+    return url.render_as_string(hide_password=False)
+
+
+def async_database_config(config, instance_path):
+    """
+    Return database settings of config switched to asyncio driver
+    """
+
+    settings = {
+        "SQLALCHEMY_DATABASE_URI": async_database_uri(
+            config["SQLALCHEMY_DATABASE_URI"], instance_path
+        ),
+        "SQLALCHEMY_BINDS": {
+            key: async_database_uri(uri, instance_path)
+            for key, uri in config.get("SQLALCHEMY_BINDS", {}).items()
+        },
+    }
+    if "SQLALCHEMY_ENGINE_OPTIONS" in config:
+        settings["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(asyncio=True)
+    return settings
+
+
+def replica_binds():
+    """
+    Binds of read replicas listed in FLASK_DB_REPLICA_HOSTS (comma
+    separated host or host:port), credentials and database name are the
+    same as of primary
+    """
+
+    hosts = (os.environ.get("FLASK_DB_REPLICA_HOSTS") or "").split(",")
+    binds = {}
+    for index, host in enumerate(h.strip() for h in hosts if h.strip()):
+        if ":" not in host:
+            host = f"{host}:{os.environ.get('FLASK_DB_PORT')}"
+        binds[f"replica_{index}"] = (
+            f"{os.environ.get('FLASK_DB_TYPE')}://"
+            f"{os.environ.get('FLASK_DB_USER')}:{os.environ.get('FLASK_DB_PASS')}@"
+            f"{host}/{os.environ.get('FLASK_DB_NAME')}?sslmode=require"
+        )
+    return binds
+
+
+class Base:
+
+    """
+    Settings shared by all profiles
+    """
+
+    # Keyset pagination of GET /api/v1/pizza
+    PIZZA_PAGE_SIZE = 100
+    PIZZA_MAX_PAGE_SIZE = 1000
+    # Rows fetched per round trip when streaming NDJSON export (and
+    # "flask pizza export")
+    PIZZA_EXPORT_CHUNK_SIZE = 1000
+    # Rows validated and written per transaction by "flask pizza import"
+    PIZZA_IMPORT_CHUNK_SIZE = env_int("FLASK_IMPORT_CHUNK_SIZE", 5000)
+    # Cache of serialized responses: lru (per process), redis (shared,
+    # memory:// url gives local stand-in) or null (disabled)
+    PIZZA_CACHE_TYPE = os.environ.get("FLASK_CACHE_TYPE") or "lru"
+    PIZZA_CACHE_REDIS_URL = os.environ.get("FLASK_CACHE_REDIS_URL") or None
+    PIZZA_CACHE_TTL = 60
+    PIZZA_CACHE_MAX_ENTRIES = 1024
+    # POST /api/v1/pizza/bulk, rows per statement and operations per request
+    PIZZA_BULK_BATCH_SIZE = env_int("FLASK_BULK_BATCH_SIZE", 500)
+    PIZZA_BULK_MAX_ITEMS = 10000
+    # Serialization of read endpoints: fast (compiled from PizzaSchema)
+    # or marshmallow (schema.dump + flask.json.dumps), output is identical
+    PIZZA_SERIALIZER = os.environ.get("FLASK_SERIALIZER") or "fast"
+    # Validation of create and update bodies: fast (compiled from
+    # PizzaSchema, invalid input is loaded by schema) or marshmallow
+    PIZZA_VALIDATOR = os.environ.get("FLASK_VALIDATOR") or "fast"
+    # Bodies larger than this are rejected (413) before they are read,
+    # single pizza writes have lower limit
+    MAX_CONTENT_LENGTH = env_int("FLASK_MAX_CONTENT_LENGTH", 4 * 1024 * 1024)
+    PIZZA_MAX_CONTENT_LENGTHS = dict.fromkeys(
+        ("pizza.create_pizza", "pizza.update_pizza"),
+        env_int("FLASK_MAX_PIZZA_CONTENT_LENGTH", 16 * 1024),
+    )
+    # GET /api/v1/pizza/search: auto (database indexes, memory index
+    # when they are missing), database or memory. Memory index is
+    # rebuilt when catalog changed, checked every PIZZA_SEARCH_REFRESH s
+    PIZZA_SEARCH_BACKEND = os.environ.get("FLASK_SEARCH_BACKEND") or "auto"
+    PIZZA_SEARCH_PAGE_SIZE = 20
+    PIZZA_SEARCH_MAX_PAGE_SIZE = 100
+    PIZZA_SEARCH_MAX_OFFSET = 1000
+    PIZZA_SEARCH_REFRESH = 5
+    # Seconds between database pings of /readyz probe
+    PIZZA_READYZ_INTERVAL = 5
+    # Reads of client are served by primary this many seconds after its
+    # write (client is recognized by cookie, or by API key or address
+    # remembered by each worker for at most sticky clients); replicas are
+    # pinged at most once per check interval
+    PIZZA_REPLICA_STICKY_SECONDS = env_int("FLASK_DB_REPLICA_STICKY_SECONDS", 5)
+    PIZZA_REPLICA_STICKY_CLIENTS = 10000
+    PIZZA_REPLICA_CHECK_INTERVAL = 5
+    # Compression of responses larger than min size, encodings are listed
+    # in order of preference
+    PIZZA_COMPRESSION = env_bool("FLASK_COMPRESSION", True)
+    PIZZA_COMPRESSION_ENCODINGS = env_list(
+        "FLASK_COMPRESSION_ENCODINGS", "br,zstd,gzip"
+    )
+    PIZZA_COMPRESSION_MIN_SIZE = env_int("FLASK_COMPRESSION_MIN_SIZE", 1024)
+    PIZZA_COMPRESSION_LEVELS = {
+        "br": env_int("FLASK_COMPRESSION_BR_LEVEL", 4),
+        "zstd": env_int("FLASK_COMPRESSION_ZSTD_LEVEL", 3),
+        "gzip": env_int("FLASK_COMPRESSION_GZIP_LEVEL", 6),
+    }
+    # Cache-Control of read endpoints, no-cache lets CDN and ingress keep
+    # responses and revalidate them with ETag. Vary lists request headers
+    # responses depend on (Accept selects NDJSON export).
+    PIZZA_CACHE_CONTROL = {
+        "pizza.get_all_pizzas": os.environ.get("FLASK_CACHE_CONTROL_LIST")
+        or "public, no-cache",
+        "pizza.get_single_pizza": os.environ.get("FLASK_CACHE_CONTROL_ITEM")
+        or "public, no-cache",
+        "pizza.search_pizzas": os.environ.get("FLASK_CACHE_CONTROL_SEARCH")
+        or "public, max-age=5",
+    }
+    PIZZA_CACHE_VARY = env_list("FLASK_CACHE_VARY", "Accept")
+    # Token bucket per client and route: (tokens per second, burst).
+    # Buckets are kept per process (memory, every worker allows the whole
+    # limit) or in redis (shared by workers, memory:// url gives local
+    # stand-in), redis is used by default when its url is set. Clients
+    # are told apart by address, API keys of key header count only when
+    # they are listed in API keys.
+    PIZZA_RATE_LIMIT = env_bool("FLASK_RATE_LIMIT", True)
+    PIZZA_RATE_LIMIT_REDIS_URL = (
+        os.environ.get("FLASK_RATE_LIMIT_REDIS_URL") or PIZZA_CACHE_REDIS_URL
+    )
+    PIZZA_RATE_LIMIT_STORAGE = os.environ.get("FLASK_RATE_LIMIT_STORAGE") or (
+        "redis" if PIZZA_RATE_LIMIT_REDIS_URL else "memory"
+    )
+    PIZZA_RATE_LIMIT_MAX_CLIENTS = 10000
+    PIZZA_RATE_LIMIT_KEY_HEADER = "X-API-Key"
+    PIZZA_RATE_LIMIT_API_KEYS = env_list("FLASK_RATE_LIMIT_API_KEYS", "")
+    PIZZA_RATE_LIMITS = env_rate_limits(
+        "FLASK_RATE_LIMITS",
+        {
+            "pizza.get_all_pizzas": (20, 40),
+            "pizza.search_pizzas": (10, 20),
+            "pizza.get_single_pizza": (50, 100),
+            "pizza.create_pizza": (5, 10),
+            "pizza.update_pizza": (5, 10),
+            "pizza.delete_pizza": (5, 10),
+            "pizza.bulk_pizzas": (1, 2),
+            "pizza.get_changes": (1, 5),
+        },
+    )
+    # Client address is taken from X-Forwarded-For set by this many
+    # proxies (ingress), 0 trusts no proxy. Unset count stops rate
+    # limiting from starting, behind ingress all clients would share one
+    # address (and one bucket).
+    PIZZA_PROXY_COUNT = (
+        env_int("FLASK_PROXY_COUNT", 0) if os.environ.get("FLASK_PROXY_COUNT") else None
+    )
+    # Concurrent identical reads of these routes share one query and
+    # serialization, others wait for result up to timeout (seconds)
+    PIZZA_COALESCE_ROUTES = env_list(
+        "FLASK_COALESCE_ROUTES",
+        "pizza.get_all_pizzas,pizza.search_pizzas,pizza.get_single_pizza",
+    )
+    PIZZA_COALESCE_TIMEOUT = env_int("FLASK_COALESCE_TIMEOUT", 5)
+    # Circuit breaker of database reads of these routes: opens after
+    # failures consecutive database errors, single request probes database
+    # reset seconds later. Meanwhile last good responses are served from
+    # snapshot (per process, optionally saved to file every save interval
+    # seconds and loaded on start) if they are not older than max age.
+    PIZZA_BREAKER = env_bool("FLASK_BREAKER", True)
+    PIZZA_BREAKER_ROUTES = env_list(
+        "FLASK_BREAKER_ROUTES",
+        "pizza.get_all_pizzas,pizza.search_pizzas,pizza.get_single_pizza",
+    )
+    PIZZA_BREAKER_FAILURES = env_int("FLASK_BREAKER_FAILURES", 5)
+    PIZZA_BREAKER_RESET_SECONDS = env_int("FLASK_BREAKER_RESET_SECONDS", 10)
+    PIZZA_SNAPSHOT_MAX_ENTRIES = env_int("FLASK_SNAPSHOT_MAX_ENTRIES", 1024)
+    PIZZA_SNAPSHOT_MAX_AGE = env_int("FLASK_SNAPSHOT_MAX_AGE", 86400)
+    PIZZA_SNAPSHOT_FILE = os.environ.get("FLASK_SNAPSHOT_FILE") or None
+    PIZZA_SNAPSHOT_SAVE_INTERVAL = env_int("FLASK_SNAPSHOT_SAVE_INTERVAL", 60)
+    # Writes of these routes sent with Idempotency-Key header are processed
+    # once, response is replayed to retries for TTL seconds. Keys are kept
+    # per process (memory) or shared by workers in redis (memory:// url
+    # gives local stand-in). Request in progress holds its key at most
+    # lock timeout seconds.
+    PIZZA_IDEMPOTENCY = env_bool("FLASK_IDEMPOTENCY", True)
+    PIZZA_IDEMPOTENCY_STORAGE = os.environ.get("FLASK_IDEMPOTENCY_STORAGE") or "memory"
+    PIZZA_IDEMPOTENCY_REDIS_URL = (
+        os.environ.get("FLASK_IDEMPOTENCY_REDIS_URL") or PIZZA_CACHE_REDIS_URL
+    )
+    PIZZA_IDEMPOTENCY_TTL = env_int("FLASK_IDEMPOTENCY_TTL", 86400)
+    PIZZA_IDEMPOTENCY_LOCK_TIMEOUT = 30
+    PIZZA_IDEMPOTENCY_MAX_KEYS = 10000
+    PIZZA_IDEMPOTENT_ROUTES = env_list(
+        "FLASK_IDEMPOTENT_ROUTES",
+        "pizza.create_pizza,pizza.update_pizza,pizza.bulk_pizzas",
+    )
+    # Change feed GET /api/v1/pizza/changes. Log is polled every interval
+    # (seconds) while worker has subscribers, recent changes are kept in
+    # memory. Long-poll waits up to timeout, event stream is closed after
+    # stream seconds (client reconnects). Changes older than retention
+    # are deleted by "flask pizza prune-changes".
+    # Subscriber holds thread of gthread worker for whole wait, so only
+    # half of GUNICORN_THREADS subscribe at once and hold for shorter
+    # time than greenlets of uvicorn worker (ASYNC settings), the rest of
+    # threads serve other requests. Subscriber over limit gets 503.
+    PIZZA_CHANGES_POLL_INTERVAL = env_int("FLASK_CHANGES_POLL_INTERVAL", 1)
+    PIZZA_CHANGES_BUFFER = 1000
+    PIZZA_CHANGES_MAX_BATCH = 500
+    PIZZA_CHANGES_TIMEOUT = 25
+    PIZZA_CHANGES_MAX_TIMEOUT = 60
+    PIZZA_CHANGES_STREAM_SECONDS = env_int("FLASK_CHANGES_STREAM_SECONDS", 30)
+    PIZZA_CHANGES_ASYNC_STREAM_SECONDS = env_int(
+        "FLASK_CHANGES_ASYNC_STREAM_SECONDS", 300
+    )
+    PIZZA_CHANGES_MAX_SUBSCRIBERS = env_int(
+        "FLASK_CHANGES_MAX_SUBSCRIBERS", max(1, env_int("GUNICORN_THREADS", 4) // 2)
+    )
+    PIZZA_CHANGES_MAX_ASYNC_SUBSCRIBERS = env_int(
+        "FLASK_CHANGES_MAX_ASYNC_SUBSCRIBERS", 1000
+    )
+    PIZZA_CHANGES_BUSY_RETRY_AFTER = 5
+    PIZZA_CHANGES_HEARTBEAT = 15
+    PIZZA_CHANGES_RETRY_MS = 1000
+    PIZZA_CHANGES_RETENTION = env_int("FLASK_CHANGES_RETENTION", 86400)
+    # Per request SQL profiling (Server-Timing header, warnings about slow
+    # requests, slow and repeated statements), opt-in in debug profiles
+    PIZZA_PROFILING = False
+    PIZZA_PROFILING_SLOW_REQUEST_MS = env_int("FLASK_PROFILING_SLOW_REQUEST_MS", 500)
+    PIZZA_PROFILING_SLOW_QUERY_MS = env_int("FLASK_PROFILING_SLOW_QUERY_MS", 100)
+    PIZZA_PROFILING_MAX_QUERIES = env_int("FLASK_PROFILING_MAX_QUERIES", 10)
+    # Profiles of requests sent with X-Profile: cprofile|pyinstrument
+    PIZZA_PROFILING_DIR = os.environ.get("FLASK_PROFILING_DIR") or os.path.join(
+        tempfile.gettempdir(), "pizzaapp-profiles"
+    )
+
+
+class Local(Base):
 
     """
     Local environment configuration
@@ -13,12 +360,19 @@ class Local:
 
     DEBUG = True
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = "sqlite:///../dev.sqlite3"
+    # FLASK_DB_URI allows to point local profile to other database
+    SQLALCHEMY_DATABASE_URI = (
+        os.environ.get("FLASK_DB_URI") or "sqlite:///../dev.sqlite3"
+    )
     JWT_SECRET_KEY = "testjwtsecret123"
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    PIZZA_PROFILING = env_bool("FLASK_PROFILING", False)
+    PIZZA_RATE_LIMIT = env_bool("FLASK_RATE_LIMIT", False)
+    # Local app runs without proxy
+    PIZZA_PROXY_COUNT = env_int("FLASK_PROXY_COUNT", 0)
 
 
-class Development:
+class Development(Base):
 
     """
     Development environment configurations
@@ -33,11 +387,15 @@ class Development:
 {os.environ.get('FLASK_DB_HOST')}:\
 {os.environ.get('FLASK_DB_PORT')}/\
 {os.environ.get('FLASK_DB_NAME')}?sslmode=require"
+    # GET requests of pizza API are routed to replicas
+    SQLALCHEMY_BINDS = replica_binds()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
     JWT_SECRET_KEY = os.environ.get("FLASK_JWT_SECRET")
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    PIZZA_PROFILING = env_bool("FLASK_PROFILING", False)
 
 
-class Production:
+class Production(Base):
 
     """
     Production environment configurations
@@ -52,6 +410,9 @@ class Production:
 {os.environ.get('FLASK_DB_HOST')}:\
 {os.environ.get('FLASK_DB_PORT')}/\
 {os.environ.get('FLASK_DB_NAME')}?sslmode=require"
+    # GET requests of pizza API are routed to replicas
+    SQLALCHEMY_BINDS = replica_binds()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
     JWT_SECRET_KEY = os.environ.get("FLASK_JWT_SECRET")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
@@ -3,6 +3,11 @@ This is a defitinion db object
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
+from ..shared.replicas import RoutingSession
 
 # Initialize db module
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# Dialects supporting INSERT ... ON CONFLICT
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
@@ -0,0 +1,129 @@
+"""
+This is a defitinion of change log of pizzas. Every write appends its
+changes in the same transaction, id of change is resume token of change
+feed.
+"""
+
+from datetime import datetime, timezone
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from . import db
+
+UPSERT = "upsert"
+DELETE = "delete"
+# Writers of change log are serialized on Postgres, so ids are committed
+# in increasing order and reader can't skip change committed later with
+# lower id. Lock is taken right before commit, writes run concurrently
+# and only allocation of ids and commit are serialized.
+CHANGE_LOCK_KEY = 0x70697A7A61
+# Session.info key of changes waiting for commit
+PENDING_CHANGES = "pizza_changes"
+
+
+class PizzaChangeModel(db.Model):
+    """
+    Pizza Change Model
+    """
+
+    # Table name
+    __tablename__ = "pizza_change"
+
+    id = db.Column(db.Integer, primary_key=True)
+    pizza_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(8), nullable=False)
+    # Pizza serialized when change was made, empty for delete
+    data = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @staticmethod
+    def record(op, changes):
+        """
+        Append changes, (pizza id, serialized pizza) pairs, to log in
+        current transaction, they are written when it commits
+        """
+
+        if changes:
+            pending = db.session.info.setdefault(PENDING_CHANGES, [])
+            pending.extend((op, pizza_id, data) for pizza_id, data in changes)
+
+    @staticmethod
+    def publish(session):
+        """
+        Write changes recorded in session, called right before commit
+        """
+
+        pending = session.info.pop(PENDING_CHANGES, None)
+        if not pending:
+            return
+
+        if session.get_bind().dialect.name == "postgresql":
+            session.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOCK_KEY}
+            )
+        now = datetime.now(timezone.utc)
+        session.execute(
+            db.insert(PizzaChangeModel),
+            [
+                {"pizza_id": pizza_id, "op": op, "data": data, "created_at": now}
+                for op, pizza_id, data in pending
+            ],
+        )
+
+    @staticmethod
+    def get_changes(after, limit):
+        """
+        Return up to limit changes with id greater than after, oldest
+        first
+        """
+
+        query = (
+            db.select(PizzaChangeModel)
+            .where(PizzaChangeModel.id > after)
+            .order_by(PizzaChangeModel.id)
+            .limit(limit)
+        )
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def get_token_range():
+        """
+        Return ids of oldest and latest change kept in log (None when
+        log is empty)
+        """
+
+        query = db.select(
+            db.func.min(PizzaChangeModel.id), db.func.max(PizzaChangeModel.id)
+        )
+        return db.session.execute(query).one()
+
+    @staticmethod
+    def prune(before):
+        """
+        Delete changes made before given time, latest change is always
+        kept so expired resume tokens are recognized. Return count of
+        deleted changes.
+        """
+
+        latest = PizzaChangeModel.get_token_range()[1]
+        if latest is None:
+            return 0
+        result = db.session.execute(
+            db.delete(PizzaChangeModel)
+            .where(PizzaChangeModel.created_at < before, PizzaChangeModel.id < latest)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
+
+event.listen(Session, "before_commit", PizzaChangeModel.publish)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def discard_changes(session, transaction):
+    """
+    Drop changes of transaction which ended without commit
+    """
+
+    if transaction.parent is None:
+        session.info.pop(PENDING_CHANGES, None)
@@ -0,0 +1,130 @@
+"""
+This is a defitinion of ingredient object in database, pizzas and
+ingredients are linked through pizza_ingredient association table
+"""
+
+from . import UPSERT_INSERTS, db
+
+# Rows of association table are unique per pizza, index on ingredient
+# serves filtering of pizzas by ingredient
+pizza_ingredient = db.Table(
+    "pizza_ingredient",
+    db.Column(
+        "pizza_id",
+        db.Integer,
+        db.ForeignKey("pizza.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Column(
+        "ingredient_id",
+        db.Integer,
+        db.ForeignKey("ingredient.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    db.Index("ix_pizza_ingredient_ingredient", "ingredient_id", "pizza_id"),
+)
+
+
+class IngredientModel(db.Model):
+    """
+    Ingredient Model
+    """
+
+    # Table name
+    __tablename__ = "ingredient"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False, unique=True)
+
+    @staticmethod
+    def get_or_create(names):
+        """
+        Return ingredients of given names (ordered by name), missing ones
+        are created in current transaction
+        """
+
+        names = sorted(set(names))
+        if not names:
+            return []
+
+        dialect = db.session.get_bind().dialect
+        if dialect.name in UPSERT_INSERTS:
+            # Concurrent writers may add the same ingredient
+            db.session.execute(
+                UPSERT_INSERTS[dialect.name](IngredientModel)
+                .values([{"name": name} for name in names])
+                .on_conflict_do_nothing(index_elements=[IngredientModel.name])
+            )
+        else:
+            existing = set(
+                db.session.scalars(
+                    db.select(IngredientModel.name).where(
+                        IngredientModel.name.in_(names)
+                    )
+                )
+            )
+            missing = [{"name": name} for name in names if name not in existing]
+            if missing:
+                db.session.execute(db.insert(IngredientModel), missing)
+
+        query = (
+            db.select(IngredientModel)
+            .where(IngredientModel.name.in_(names))
+            .order_by(IngredientModel.name)
+        )
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def assign(pizza_ingredients):
+        """
+        Replace ingredients of pizzas, pizza_ingredients maps pizza id to
+        ingredient names
+        """
+
+        if not pizza_ingredients:
+            return
+
+        ids = {
+            ingredient.name: ingredient.id
+            for ingredient in IngredientModel.get_or_create(
+                name for names in pizza_ingredients.values() for name in names
+            )
+        }
+        IngredientModel.unassign(pizza_ingredients)
+        rows = [
+            {"pizza_id": pizza_id, "ingredient_id": ids[name]}
+            for pizza_id, names in pizza_ingredients.items()
+            for name in set(names)
+        ]
+        if rows:
+            db.session.execute(db.insert(pizza_ingredient), rows)
+
+    @staticmethod
+    def unassign(pizza_ids):
+        """
+        Remove all ingredients of pizzas, SQLite does not enforce foreign
+        keys (ON DELETE CASCADE) by default
+        """
+
+        db.session.execute(
+            db.delete(pizza_ingredient).where(
+                pizza_ingredient.c.pizza_id.in_(list(pizza_ids))
+            )
+        )
+
+    @staticmethod
+    def get_names(pizza_id):
+        """
+        Return names of ingredients of pizza ordered by name
+        """
+
+        query = (
+            db.select(IngredientModel.name)
+            .join(pizza_ingredient)
+            .where(pizza_ingredient.c.pizza_id == pizza_id)
+            .order_by(IngredientModel.name)
+        )
+        return db.session.scalars(query).all()
+
+    def _repr(self):
+        return f"<name {self.name}>"
@@ -2,13 +2,63 @@
 This is a defitinion of pizza object in database
 """
 
+import csv
+import io
 from datetime import datetime, timezone
-from marshmallow import fields, Schema, ValidationError
-from . import db
+from types import SimpleNamespace
+from marshmallow import fields, validate, Schema, ValidationError
+from sqlalchemy import column, literal, table, text
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from . import UPSERT_INSERTS, db
+from .change_model import DELETE, UPSERT, PizzaChangeModel
+from .ingredient_model import IngredientModel, pizza_ingredient
+from ..shared.cache import cache
+from ..shared.changefeed import changefeed
+from ..shared.serializer import dumps
 
 # Found on SO
 # https://marshmallow.readthedocs.io/en/3.0/examples.html
 
+# Ingredients accepted per pizza
+MAX_INGREDIENTS = 32
+# Staging table of import on Postgres, rows of batch are copied there
+# and merged into pizza with single statement
+IMPORT_TABLE = "pizza_import"
+IMPORT_DDL = (
+    f"CREATE TEMPORARY TABLE IF NOT EXISTS {IMPORT_TABLE} "
+    "(name varchar(128), price double precision) ON COMMIT DROP"
+)
+
+
+def chunks(items, size):
+    """
+    Split list into consecutive lists of at most size items
+    """
+
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def without_ingredients(row):
+    """
+    Return row of bulk operation without ingredient names, they are
+    stored in association table
+    """
+
+    return {key: value for key, value in row.items() if key != "ingredient_names"}
+
+
+def batch_ingredients(rows):
+    """
+    Return ingredient names by pizza id of (pizza id, row) pairs of bulk
+    operation which carry ingredients
+    """
+
+    return {
+        pizza_id: row["ingredient_names"]
+        for pizza_id, row in rows
+        if "ingredient_names" in row
+    }
+
 
 def must_not_be_blank(data):
     """
@@ -26,12 +76,25 @@ class PizzaModel(db.Model):
 
     # Table name
     __tablename__ = "pizza"
+    __table_args__ = (
+        # Unique index on name can't serve LIKE 'prefix%' on Postgres
+        # with non-C collation, pattern_ops index can
+        db.Index(
+            "ix_pizza_name_pattern",
+            "name",
+            postgresql_ops={"name": "varchar_pattern_ops"},
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False, unique=True)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(db.Float, nullable=False, index=True)
     created_at = db.Column(db.DateTime)
-    modified_at = db.Column(db.DateTime)
+    modified_at = db.Column(db.DateTime, index=True)
+    # Loaded explicitly with selectinload (one query per page of pizzas)
+    ingredients = db.relationship(
+        IngredientModel, secondary=pizza_ingredient, order_by=IngredientModel.name
+    )
 
     # Class constructor
     def __init__(self, data):
@@ -41,10 +104,19 @@ class PizzaModel(db.Model):
 
         self.name = data.get("name")
         self.price = data.get("price")
-        self.ingeridients = data.get("ingeridients")
+        if data.get("ingredient_names"):
+            self.ingredients = IngredientModel.get_or_create(data["ingredient_names"])
         self.created_at = datetime.now(timezone.utc)
         self.modified_at = datetime.now(timezone.utc)
 
+    @property
+    def ingredient_names(self):
+        """
+        Names of ingredients of pizza
+        """
+
+        return [ingredient.name for ingredient in self.ingredients]
+
     @staticmethod
     def get_all_pizzas():
         """
@@ -53,49 +125,480 @@ class PizzaModel(db.Model):
 
         return PizzaModel.query.all()
 
+    @staticmethod
+    def get_pizzas_page(limit, cursor=None, columns=None, filters=None):
+        """
+        Return up to limit pizzas with id greater than cursor (keyset
+        pagination). Only given columns are selected if provided.
+        """
+
+        if columns:
+            query = db.select(*(getattr(PizzaModel, c) for c in columns))
+        else:
+            query = db.select(PizzaModel).options(selectinload(PizzaModel.ingredients))
+        query = PizzaModel.apply_filters(query, filters or {})
+        if cursor is not None:
+            query = query.where(PizzaModel.id > cursor)
+        query = query.order_by(PizzaModel.id).limit(limit)
+
+        if columns:
+            return db.session.execute(query).all()
+        return db.session.scalars(query).all()
+
+    @staticmethod
+    def stream_pizzas(chunk_size, cursor=None, columns=None, filters=None):
+        """
+        Iterate over all pizzas ordered by id using server-side cursor,
+        rows are fetched from database in chunks of chunk_size
+        """
+
+        if columns:
+            query = db.select(*(getattr(PizzaModel, c) for c in columns))
+        else:
+            # Ingredients are loaded per chunk
+            query = db.select(PizzaModel).options(selectinload(PizzaModel.ingredients))
+        query = PizzaModel.apply_filters(query, filters or {})
+        if cursor is not None:
+            query = query.where(PizzaModel.id > cursor)
+        query = query.order_by(PizzaModel.id).execution_options(yield_per=chunk_size)
+
+        if columns:
+            yield from db.session.execute(query)
+        else:
+            yield from db.session.scalars(query)
+
+    @staticmethod
+    def apply_filters(query, filters):
+        """
+        Narrow query with filters, every filter is backed by an index
+        """
+
+        if filters.get("min_price") is not None:
+            query = query.where(PizzaModel.price >= filters["min_price"])
+        if filters.get("max_price") is not None:
+            query = query.where(PizzaModel.price <= filters["max_price"])
+        if filters.get("name_prefix"):
+            query = query.where(
+                PizzaModel.name.startswith(filters["name_prefix"], autoescape=True)
+            )
+        if filters.get("modified_since") is not None:
+            query = query.where(PizzaModel.modified_at >= filters["modified_since"])
+        # Pizza has to have all ingredients, each is joined through index
+        # of association table
+        for name in filters.get("ingredients") or ():
+            link = pizza_ingredient.alias()
+            ingredient = aliased(IngredientModel)
+            query = query.join(link, link.c.pizza_id == PizzaModel.id).join(
+                ingredient,
+                (ingredient.id == link.c.ingredient_id) & (ingredient.name == name),
+            )
+        return query
+
+    @staticmethod
+    def get_list_version(filters=None):
+        """
+        Return row count and latest modification time of pizzas matching
+        filters, without loading rows
+        """
+
+        query = db.select(
+            db.func.count(PizzaModel.id), db.func.max(PizzaModel.modified_at)
+        )
+        return db.session.execute(PizzaModel.apply_filters(query, filters or {})).one()
+
+    @staticmethod
+    def get_pizza_version(pizza_id):
+        """
+        Return modification time of pizza or None if it does not exist,
+        without loading the row
+        """
+
+        query = db.select(PizzaModel.id, PizzaModel.modified_at).where(
+            PizzaModel.id == pizza_id
+        )
+        return db.session.execute(query).first()
+
     @staticmethod
     def get_pizza_by_id(pizza_id):
         """
         Return specific pizza by id
         """
 
-        return PizzaModel.query.session.get(PizzaModel, pizza_id)
+        # Single row, ingredients are joined to the same query
+        return PizzaModel.query.session.get(
+            PizzaModel, pizza_id, options=[joinedload(PizzaModel.ingredients)]
+        )
 
     # Not necessary yet
     # @staticmethod
     # def get_pizza_by_name(name):
     #     return PizzaModel.query.filter_by(name=name)
 
+    @staticmethod
+    def get_ids_by_name(names):
+        """
+        Return ids of pizzas with given names by name
+        """
+
+        query = db.select(PizzaModel.name, PizzaModel.id).where(
+            PizzaModel.name.in_(list(names))
+        )
+        return dict(db.session.execute(query).tuples().all())
+
+    @staticmethod
+    def upserts_on_name():
+        """
+        Return True if bulk_write updates pizza of existing name on
+        create, otherwise create of existing name fails
+        """
+
+        dialect = db.session.get_bind().dialect
+        return dialect.insert_returning and dialect.name in UPSERT_INSERTS
+
     def save(self):
         """
         Save data
         """
 
         db.session.add(self)
+        db.session.flush()
+        PizzaModel._record_upserts([self.id])
         db.session.commit()
+        cache.invalidate()
+        changefeed.notify()
 
     def update(self, data):
         """
         Modify data
         """
 
+        data = dict(data)
+        if "ingredient_names" in data:
+            self.ingredients = IngredientModel.get_or_create(
+                data.pop("ingredient_names")
+            )
         for key, item in data.items():
             setattr(self, key, item)
         self.modified_at = datetime.now(timezone.utc)
+        db.session.flush()
+        PizzaModel._record_upserts([self.id])
         db.session.commit()
+        cache.invalidate(self.id)
+        changefeed.notify()
 
     def delete(self):
         """
         Delete data
         """
 
+        PizzaChangeModel.record(DELETE, [(self.id, None)])
         db.session.delete(self)
         db.session.commit()
+        cache.invalidate(self.id)
+        changefeed.notify()
+
+    @staticmethod
+    def update_by_id(pizza_id, data, modified_at=None):
+        """
+        Modify pizza with single UPDATE ... RETURNING (row is not loaded
+        first), when modified_at is given only that version is modified.
+        Ingredients are replaced when given. Return updated row or None
+        if no row matched.
+        """
+
+        data = dict(data)
+        names = data.pop("ingredient_names", None)
+        query = (
+            db.update(PizzaModel)
+            .where(PizzaModel.id == pizza_id)
+            .values(**data, modified_at=datetime.now(timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        if modified_at is not None:
+            query = query.where(PizzaModel.modified_at == modified_at)
+
+        try:
+            if db.session.get_bind().dialect.update_returning:
+                pizza = db.session.execute(query.returning(*PIZZA_COLUMNS)).first()
+            elif db.session.execute(query).rowcount:
+                pizza = db.session.execute(
+                    db.select(*PIZZA_COLUMNS).where(PizzaModel.id == pizza_id)
+                ).first()
+            else:
+                pizza = None
+            if pizza is None:
+                db.session.rollback()
+                return None
+            if names is None:
+                names = IngredientModel.get_names(pizza_id)
+            else:
+                IngredientModel.assign({pizza_id: names})
+                names = sorted(set(names))
+            changed = SimpleNamespace(**pizza._asdict(), ingredient_names=names)
+            PizzaChangeModel.record(UPSERT, [(pizza.id, dumps(change_schema, changed))])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        cache.invalidate(pizza_id)
+        changefeed.notify()
+        return pizza
+
+    @staticmethod
+    def delete_by_id(pizza_id, modified_at=None):
+        """
+        Delete pizza with single DELETE ... RETURNING, when modified_at is
+        given only that version is deleted. Return True if row was
+        deleted.
+        """
+
+        query = (
+            db.delete(PizzaModel)
+            .where(PizzaModel.id == pizza_id)
+            .execution_options(synchronize_session=False)
+        )
+        if modified_at is not None:
+            query = query.where(PizzaModel.modified_at == modified_at)
+
+        try:
+            if db.session.get_bind().dialect.delete_returning:
+                deleted = db.session.execute(query.returning(PizzaModel.id)).first()
+            else:
+                deleted = db.session.execute(query).rowcount
+            if not deleted:
+                db.session.rollback()
+                return False
+            IngredientModel.unassign([pizza_id])
+            PizzaChangeModel.record(DELETE, [(pizza_id, None)])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        cache.invalidate(pizza_id)
+        changefeed.notify()
+        return True
+
+    @staticmethod
+    def bulk_write(creates, updates, deletes, batch_size):
+        """
+        Apply creates (upsert on name), updates (only given fields) and
+        deletes in single transaction, statements are sent in batches of
+        batch_size rows. Ingredients of created and updated pizzas are
+        replaced when given.
+        Return ids of created rows (in order) and sets of updated and
+        deleted ids, missing rows are skipped.
+        """
+
+        now = datetime.now(timezone.utc)
+        dialect = db.session.get_bind().dialect
+        created_ids, updated_ids, deleted_ids = [], set(), set()
+
+        try:
+            for batch in chunks(creates, batch_size):
+                ids = PizzaModel._upsert_batch(
+                    [without_ingredients(row) for row in batch], now, dialect
+                )
+                created_ids.extend(ids)
+                IngredientModel.assign(batch_ingredients(zip(ids, batch)))
+
+            for batch in chunks(updates, batch_size):
+                existing = PizzaModel._existing_ids(row["id"] for row in batch)
+                rows = [
+                    {**without_ingredients(row), "modified_at": now}
+                    for row in batch
+                    if row["id"] in existing
+                ]
+                if rows:
+                    # ORM bulk UPDATE by primary key, one executemany
+                    db.session.execute(db.update(PizzaModel), rows)
+                IngredientModel.assign(
+                    batch_ingredients(
+                        (row["id"], row) for row in batch if row["id"] in existing
+                    )
+                )
+                updated_ids |= existing
+
+            for batch in chunks(deletes, batch_size):
+                existing = PizzaModel._existing_ids(batch)
+                IngredientModel.unassign(existing)
+                db.session.execute(
+                    db.delete(PizzaModel)
+                    .where(PizzaModel.id.in_(existing))
+                    .execution_options(synchronize_session=False)
+                )
+                deleted_ids |= existing
+
+            for batch in chunks(created_ids + sorted(updated_ids), batch_size):
+                PizzaModel._record_upserts(batch)
+            PizzaChangeModel.record(
+                DELETE, [(pizza_id, None) for pizza_id in sorted(deleted_ids)]
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        cache.invalidate(*created_ids, *updated_ids, *deleted_ids)
+        changefeed.notify()
+        return created_ids, updated_ids, deleted_ids
+
+    @staticmethod
+    def import_batch(rows):
+        """
+        Upsert validated rows on name and commit, ingredients are
+        replaced when row carries them. Postgres gets rows with COPY
+        into staging table merged into pizza, other databases with
+        executemany. Return ids of imported rows.
+        """
+
+        now = datetime.now(timezone.utc)
+        dialect = db.session.get_bind().dialect
+        try:
+            if dialect.name == "postgresql":
+                ids_by_name = PizzaModel._copy_merge(rows, now)
+            else:
+                ids_by_name = PizzaModel._executemany_merge(rows, now, dialect)
+            ids = [ids_by_name[row["name"]] for row in rows]
+            IngredientModel.assign(batch_ingredients(zip(ids, rows)))
+            PizzaModel._record_upserts(ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        cache.invalidate(*ids)
+        changefeed.notify()
+        return ids
+
+    @staticmethod
+    def _copy_merge(rows, now):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows((row["name"], row["price"]) for row in rows)
+        buffer.seek(0)
+        # Table is dropped with commit of batch
+        db.session.execute(text(IMPORT_DDL))
+        # Raw DBAPI (psycopg2) connection of session transaction
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {IMPORT_TABLE} (name, price) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+        staging = table(IMPORT_TABLE, column("name"), column("price"))
+        query = UPSERT_INSERTS["postgresql"](PizzaModel).from_select(
+            ["name", "price", "created_at", "modified_at"],
+            db.select(staging.c.name, staging.c.price, literal(now), literal(now)),
+        )
+        query = query.on_conflict_do_update(
+            index_elements=[PizzaModel.name],
+            set_={
+                "price": query.excluded.price,
+                "modified_at": query.excluded.modified_at,
+            },
+        )
+        result = db.session.execute(query.returning(PizzaModel.name, PizzaModel.id))
+        return dict(result.tuples().all())
+
+    @staticmethod
+    def _executemany_merge(rows, now, dialect):
+        params = [
+            {
+                "name": row["name"],
+                "price": row["price"],
+                "created_at": now,
+                "modified_at": now,
+            }
+            for row in rows
+        ]
+        # Core statements on table, so rows are sent with executemany
+        if dialect.name in UPSERT_INSERTS:
+            query = UPSERT_INSERTS[dialect.name](PizzaModel.__table__)
+            query = query.on_conflict_do_update(
+                index_elements=["name"],
+                set_={
+                    "price": query.excluded.price,
+                    "modified_at": query.excluded.modified_at,
+                },
+            )
+            db.session.execute(query, params)
+        else:
+            # Without ON CONFLICT rows are only inserted, existing names
+            # fail on unique index
+            db.session.execute(db.insert(PizzaModel.__table__), params)
+        query = db.select(PizzaModel.name, PizzaModel.id).where(
+            PizzaModel.name.in_([row["name"] for row in rows])
+        )
+        return dict(db.session.execute(query).tuples().all())
+
+    @staticmethod
+    def _upsert_batch(batch, now, dialect):
+        rows = [{**row, "created_at": now, "modified_at": now} for row in batch]
+
+        if not dialect.insert_returning:
+            pizzas = [PizzaModel(row) for row in rows]
+            db.session.add_all(pizzas)
+            db.session.flush()
+            return [pizza.id for pizza in pizzas]
+
+        if dialect.name in UPSERT_INSERTS:
+            query = UPSERT_INSERTS[dialect.name](PizzaModel).values(rows)
+            query = query.on_conflict_do_update(
+                index_elements=[PizzaModel.name],
+                set_={
+                    "price": query.excluded.price,
+                    "modified_at": query.excluded.modified_at,
+                },
+            )
+        else:
+            query = db.insert(PizzaModel).values(rows)
+
+        result = db.session.execute(query.returning(PizzaModel.name, PizzaModel.id))
+        ids_by_name = dict(result.tuples().all())
+        return [ids_by_name[row["name"]] for row in rows]
+
+    @staticmethod
+    def _record_upserts(pizza_ids):
+        # Rows are read back as stored, so change carries the same
+        # representation as GET of pizza
+        query = (
+            db.select(PizzaModel)
+            .where(PizzaModel.id.in_(pizza_ids))
+            .order_by(PizzaModel.id)
+            .options(selectinload(PizzaModel.ingredients))
+            .execution_options(populate_existing=True)
+        )
+        PizzaChangeModel.record(
+            UPSERT,
+            [
+                (pizza.id, dumps(change_schema, pizza))
+                for pizza in db.session.scalars(query)
+            ],
+        )
+
+    @staticmethod
+    def _existing_ids(pizza_ids):
+        query = db.select(PizzaModel.id).where(PizzaModel.id.in_(list(pizza_ids)))
+        return set(db.session.scalars(query))
 
     def _repr(self):
         return f"<name {self.name}>"
 
 
+# Columns returned by single statement writes
+PIZZA_COLUMNS = (
+    PizzaModel.id,
+    PizzaModel.name,
+    PizzaModel.price,
+    PizzaModel.created_at,
+    PizzaModel.modified_at,
+)
+
+
 class PizzaSchema(Schema):
     """
     Pizza Schema
@@ -107,3 +610,12 @@ class PizzaSchema(Schema):
     price = fields.Float(required=True, validate=must_not_be_blank)
     created_at = fields.DateTime(dump_only=True)
     modified_at = fields.DateTime(dump_only=True)
+    ingredients = fields.List(
+        fields.Str(validate=validate.Length(min=1, max=64)),
+        attribute="ingredient_names",
+        validate=validate.Length(max=MAX_INGREDIENTS),
+    )
+
+
+# Serializes pizzas of change log
+change_schema = PizzaSchema()
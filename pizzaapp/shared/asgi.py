@@ -0,0 +1,185 @@
+"""
+This is a definition of ASGI adapter of app. Every request runs whole
+Flask app in its own greenlet on event loop, database driver (asyncpg,
+aiosqlite) switches back to event loop while waiting for database, the
+same way SQLAlchemy asyncio extension does. Thousands of slow clients
+are served by single process without change of views and models.
+"""
+
+import json
+import sys
+from io import BytesIO
+from sqlalchemy.util import await_only, greenlet_spawn
+from .validation import BODY_TOO_LARGE_MSG
+
+
+def build_environ(scope, body):
+    """
+    Return WSGI environ of ASGI HTTP request scope with buffered body
+    """
+
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ASGIAdapter:
+    """
+    ASGI application serving WSGI app in greenlets
+    """
+
+    def __init__(self, wsgi_app, shutdown=None, body_limit=None):
+        """
+        Class constructor, shutdown is called (in greenlet) when server
+        stops. Body is buffered before app runs, so body_limit(method,
+        path) returns largest body (None for no limit) accepted.
+        """
+
+        self.wsgi_app = wsgi_app
+        self.shutdown = shutdown
+        self.body_limit = body_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            limit = None
+            if self.body_limit is not None:
+                limit = self.body_limit(scope["method"], scope["path"])
+            body = await self._read_body(scope, receive, limit)
+            if body is None:
+                await self._body_too_large(send)
+                return
+            await greenlet_spawn(self._serve, build_environ(scope, body), send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.shutdown:
+                    await greenlet_spawn(self.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(scope, receive, limit):
+        """
+        Return request body, None as soon as Content-Length or read part
+        of body exceeds limit
+        """
+
+        if limit is not None:
+            for name, value in scope["headers"]:
+                if name.lower() == b"content-length" and value.isdigit():
+                    if int(value) > limit:
+                        return None
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            # Chunked body is not buffered past limit
+            if limit is not None and size > limit:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _body_too_large(send):
+        """
+        Send 413 response (the same app sends), rest of body is not read
+        """
+
+        body = json.dumps({"error": BODY_TOO_LARGE_MSG}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def _serve(self, environ, send):
+        """
+        Run WSGI app, response is sent chunk by chunk as app produces it
+        """
+
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response_start.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start.update(
+                status=int(status.split(" ", 1)[0]),
+                headers=[(k.lower().encode(), v.encode()) for k, v in headers],
+            )
+
+        def send_start():
+            await_only(
+                send(
+                    {
+                        "type": "http.response.start",
+                        "status": response_start["status"],
+                        "headers": response_start["headers"],
+                    }
+                )
+            )
+            response_start["sent"] = True
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not response_start.get("sent"):
+                    send_start()
+                await_only(
+                    send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+                )
+            if not response_start.get("sent"):
+                send_start()
+            await_only(send({"type": "http.response.body", "body": b""}))
+        finally:
+            # Runs Flask teardown of streamed responses
+            if hasattr(result, "close"):
+                result.close()
@@ -0,0 +1,323 @@
+"""
+This is a definition of circuit breaker of database reads. Database
+errors (failed connection, timeout) of routes listed in
+PIZZA_BREAKER_ROUTES are counted, after PIZZA_BREAKER_FAILURES
+consecutive ones breaker opens and requests do not touch database for
+PIZZA_BREAKER_RESET_SECONDS. Then single request probes database
+(half-open), breaker closes when it succeeds. Meanwhile last good
+responses are served from snapshot (memory, optionally saved to file)
+with Age header, requests without one get 503.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import Response, current_app, json, request
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from .conditional import not_modified
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# Errors of unavailable database, other errors do not open breaker
+FAILURES = (OperationalError, InterfaceError, PoolTimeout)
+DATABASE_UNAVAILABLE_MSG = "Database is unavailable, try again later"
+
+
+class DatabaseUnavailable(Exception):
+    """
+    Read of response stored under key failed or was not attempted as
+    breaker is open
+    """
+
+    def __init__(self, key, retry_after):
+        """
+        Class constructor
+        """
+
+        super().__init__(key)
+        self.key = key
+        self.retry_after = retry_after
+
+
+class Snapshot:
+    """
+    Last good response (body, headers, time of storing) of every key,
+    least recently stored are dropped. With path snapshot is loaded from
+    JSON file and saved to it, so it survives restart of worker.
+    """
+
+    def __init__(self, max_entries=1024, path=None):
+        """
+        Class constructor
+        """
+
+        self.max_entries = max_entries
+        self.path = path
+        self.saved_at = time.monotonic()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def get(self, key):
+        """
+        Return (body, headers, stored_at) or None if key is missing
+        """
+
+        return self._entries.get(key)
+
+    def set(self, key, body, headers):
+        """
+        Store response of key
+        """
+
+        with self._lock:
+            self._entries[key] = (body, dict(headers), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove key
+        """
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def load(self):
+        """
+        Load entries from file, unreadable file is ignored
+        """
+
+        try:
+            with open(self.path, encoding="utf-8") as snapshot_file:
+                entries = json.load(snapshot_file)
+        except (OSError, ValueError) as exc:
+            logger.warning("Snapshot %s was not loaded: %s", self.path, exc)
+            return
+        with self._lock:
+            for key, body, headers, stored_at in entries:
+                self._entries[key] = (body.encode(), headers, stored_at)
+
+    def save(self):
+        """
+        Write entries to file (replaced at once, so readers never see
+        partial file), concurrent call returns without saving
+        """
+
+        # pylint: disable-next=consider-using-with
+        if not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                entries = [
+                    (key, body.decode(), headers, stored_at)
+                    for key, (body, headers, stored_at) in self._entries.items()
+                ]
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=directory, delete=False
+            ) as snapshot_file:
+                json.dump(entries, snapshot_file)
+            os.replace(snapshot_file.name, self.path)
+        except OSError as exc:
+            logger.warning("Snapshot %s was not saved: %s", self.path, exc)
+        finally:
+            self.saved_at = time.monotonic()
+            self._save_lock.release()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CircuitBreaker:
+    """
+    Stop reading database while it fails, serve snapshot instead
+    """
+
+    def init_app(self, app):
+        """
+        Prepare per app state (snapshot is loaded from
+        PIZZA_SNAPSHOT_FILE) and response of unavailable database
+        """
+
+        app.extensions["pizza_breaker"] = {
+            "state": CLOSED,
+            "failures": 0,
+            "opened_at": None,
+            # Held only to change state, never during I/O
+            "lock": threading.Lock(),
+            "snapshot": Snapshot(
+                app.config["PIZZA_SNAPSHOT_MAX_ENTRIES"],
+                app.config["PIZZA_SNAPSHOT_FILE"],
+            ),
+            "stats": {"opened": 0, "rejected": 0, "stale": 0, "unavailable": 0},
+        }
+        app.register_error_handler(DatabaseUnavailable, self._unavailable_response)
+
+    @staticmethod
+    def _state():
+        return current_app.extensions["pizza_breaker"]
+
+    @staticmethod
+    def _enabled():
+        config = current_app.config
+        return (
+            config["PIZZA_BREAKER"]
+            and request.endpoint in config["PIZZA_BREAKER_ROUTES"]
+        )
+
+    @staticmethod
+    def _retry_after(state):
+        reset = current_app.config["PIZZA_BREAKER_RESET_SECONDS"]
+        if state["opened_at"] is None:
+            return reset
+        return max(0, reset - (time.monotonic() - state["opened_at"]))
+
+    def _acquire(self, state, key):
+        """
+        Let request read database or raise DatabaseUnavailable, when
+        reset time passed since breaker opened (or since last probe)
+        request probes database
+        """
+
+        reset = current_app.config["PIZZA_BREAKER_RESET_SECONDS"]
+        with state["lock"]:
+            if state["state"] == CLOSED:
+                return
+            if time.monotonic() - state["opened_at"] >= reset:
+                # Probe which never finishes does not keep breaker open,
+                # next one is let through after another reset time
+                state["state"] = HALF_OPEN
+                state["opened_at"] = time.monotonic()
+                return
+            state["stats"]["rejected"] += 1
+        raise DatabaseUnavailable(key, self._retry_after(state))
+
+    @staticmethod
+    def _record_success(state):
+        if state["state"] == CLOSED and not state["failures"]:
+            return
+        with state["lock"]:
+            if state["state"] != CLOSED:
+                logger.warning("Database reads recovered, circuit breaker closed")
+            state["state"] = CLOSED
+            state["failures"] = 0
+            state["opened_at"] = None
+
+    @staticmethod
+    def _record_failure(state):
+        threshold = current_app.config["PIZZA_BREAKER_FAILURES"]
+        with state["lock"]:
+            state["failures"] += 1
+            was_open = state["state"] == OPEN
+            if state["state"] == HALF_OPEN or state["failures"] >= threshold:
+                state["state"] = OPEN
+                state["opened_at"] = time.monotonic()
+            opened = state["state"] == OPEN and not was_open
+            if opened:
+                state["stats"]["opened"] += 1
+        if opened:
+            logger.warning(
+                "Circuit breaker opened after %d database errors", state["failures"]
+            )
+            if state["snapshot"].path:
+                state["snapshot"].save()
+
+    @contextmanager
+    def guard(self, key):
+        """
+        Run block reading database for response stored under key, raise
+        DatabaseUnavailable when breaker is open or block fails with
+        database error
+        """
+
+        if not self._enabled():
+            yield
+            return
+
+        state = self._state()
+        self._acquire(state, key)
+        try:
+            yield
+        except FAILURES as exc:
+            self._record_failure(state)
+            raise DatabaseUnavailable(key, self._retry_after(state)) from exc
+        self._record_success(state)
+
+    def remember(self, key, body, headers):
+        """
+        Store good response of key in snapshot, snapshot file is saved
+        at most once per PIZZA_SNAPSHOT_SAVE_INTERVAL seconds
+        """
+
+        if not self._enabled():
+            return
+        snapshot = self._state()["snapshot"]
+        snapshot.set(key, body, headers)
+        interval = current_app.config["PIZZA_SNAPSHOT_SAVE_INTERVAL"]
+        if snapshot.path and time.monotonic() - snapshot.saved_at >= interval:
+            snapshot.save()
+
+    def forget(self, key):
+        """
+        Remove key from snapshot (resource no longer exists)
+        """
+
+        if self._enabled():
+            self._state()["snapshot"].delete(key)
+
+    def _unavailable_response(self, exc):
+        """
+        Return snapshot response of key (Age header tells how old it is)
+        or 503 if there is none younger than PIZZA_SNAPSHOT_MAX_AGE
+        """
+
+        state = self._state()
+        entry = state["snapshot"].get(exc.key)
+        if entry is not None:
+            body, headers, stored_at = entry
+            age = int(max(0, time.time() - stored_at))
+            if age <= current_app.config["PIZZA_SNAPSHOT_MAX_AGE"]:
+                state["stats"]["stale"] += 1
+                response = not_modified(headers) or Response(
+                    mimetype="application/json",
+                    response=body,
+                    status=200,
+                    headers={**headers, "X-Cache": "STALE"},
+                )
+                response.headers["Age"] = str(age)
+                return response
+
+        state["stats"]["unavailable"] += 1
+        return Response(
+            mimetype="application/json",
+            response=json.dumps({"error": DATABASE_UNAVAILABLE_MSG}),
+            status=503,
+            headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+        )
+
+    def stats(self):
+        """
+        Return state of breaker, size of snapshot and counters of
+        current process
+        """
+
+        state = self._state()
+        return {
+            "state": state["state"],
+            "failures": state["failures"],
+            "snapshot": len(state["snapshot"]),
+            **state["stats"],
+        }
+
+
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,453 @@
+"""
+This is a definition of cache for serialized responses
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_request_context
+
+ITEM_KEY = "pizza:item:{}"
+LIST_KEY = "pizza:list:{}:{}"
+LIST_GENERATION_KEY = "pizza:list:generation"
+# Compressed payloads are addressed by digest of payload, so they never
+# need invalidation
+VARIANT_KEY = "pizza:variant:{}:{}"
+
+
+class LRUCache:
+    """
+    In-process LRU cache with time to live of entries
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        """
+        Class constructor
+        """
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return value or None if key is missing or expired
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value, least recently used entry is evicted when full
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        """
+        Store value only if key is missing (or expired), return True if
+        it was stored
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] >= now):
+                return False
+            self._entries[key] = (now + ttl if ttl else None, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, *keys):
+        """
+        Remove keys
+        """
+
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def incr(self, key):
+        """
+        Increment counter stored under key, counters never expire
+        """
+
+        with self._lock:
+            _, value = self._entries.get(key, (None, 0))
+            self._entries[key] = (None, value + 1)
+            self._entries.move_to_end(key)
+            return value + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Python equivalents of Lua scripts run by LocalRedis, keyed by script
+# source, called as func(keys, args, get, set)
+LOCAL_SCRIPTS = {}
+
+
+class LocalRedis:
+    """
+    In-memory stand-in of redis client, implements only commands
+    used by RedisCache and rate limiter
+    """
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        value, expires_at = self._data.get(name, (None, None))
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    def _set(self, name, value, ex=None):
+        expires_at = time.monotonic() + ex if ex else None
+        self._data[name] = (value, expires_at)
+
+    def get(self, name):
+        """
+        GET
+        """
+
+        with self._lock:
+            return self._get(name)
+
+    def set(self, name, value, ex=None, nx=False):
+        """
+        SET with optional EX and NX
+        """
+
+        with self._lock:
+            if nx and self._get(name) is not None:
+                return None
+            self._set(name, value, ex)
+            return True
+
+    def delete(self, *names):
+        """
+        DEL
+        """
+
+        with self._lock:
+            for name in names:
+                self._data.pop(name, None)
+
+    def incr(self, name):
+        """
+        INCR
+        """
+
+        with self._lock:
+            value, expires_at = self._data.get(name, (0, None))
+            self._data[name] = (int(value) + 1, expires_at)
+            return int(value) + 1
+
+    def register_script(self, script):
+        """
+        SCRIPT LOAD, Lua is not interpreted, Python equivalent of script
+        registered in LOCAL_SCRIPTS is run atomically instead
+        """
+
+        func = LOCAL_SCRIPTS[script]
+
+        def run(keys=(), args=()):
+            with self._lock:
+                return func(keys, args, self._get, self._set)
+
+        return run
+
+
+def redis_client(url):
+    """
+    Return redis client of url, memory:// gives local stand-in
+    """
+
+    if url == "memory://":
+        return LocalRedis()
+    try:
+        # Optional dependency, needed only for shared cache and rate limits
+        import redis  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("Package redis is required to connect to redis") from exc
+    return redis.Redis.from_url(url)
+
+
+class RedisCache:
+    """
+    Cache shared between workers, backed by redis compatible client
+    """
+
+    def __init__(self, client, prefix="pizzaapp:", ttl=60):
+        """
+        Class constructor
+        """
+
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        """
+        Return value or None if key is missing
+        """
+
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value with time to live
+        """
+
+        self.client.set(self.prefix + key, value, ex=self.ttl if ttl is None else ttl)
+
+    def add(self, key, value, ttl=None):
+        """
+        Store value only if key is missing, return True if it was stored
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        return bool(self.client.set(self.prefix + key, value, ex=ttl, nx=True))
+
+    def delete(self, *keys):
+        """
+        Remove keys
+        """
+
+        self.client.delete(*(self.prefix + key for key in keys))
+
+    def incr(self, key):
+        """
+        Increment counter stored under key
+        """
+
+        return self.client.incr(self.prefix + key)
+
+
+class NullCache:
+    """
+    Cache which stores nothing, used when caching is disabled
+    """
+
+    # pylint: disable=unused-argument
+
+    def get(self, key):
+        """
+        Always miss
+        """
+
+    def set(self, key, value, ttl=None):
+        """
+        Drop value
+        """
+
+    def delete(self, *keys):
+        """
+        Nothing to remove
+        """
+
+    def incr(self, key):
+        """
+        Counters are not needed, nothing is cached
+        """
+
+        return 0
+
+
+def pack(body, headers):
+    """
+    Pack response body and headers into single bytes value
+    """
+
+    return json.dumps(headers).encode() + b"\n" + body
+
+
+def unpack(value):
+    """
+    Unpack value created by pack, return body and headers
+    """
+
+    headers, body = value.split(b"\n", 1)
+    return body, json.loads(headers)
+
+
+class PizzaCache:
+    """
+    Read-through cache of serialized pizza responses. Single pizzas are
+    stored per id, lists per query string. Lists are versioned with
+    generation counter, so any write invalidates all of them at once.
+    Generation is read before database is queried and passed to set_*,
+    so response read before concurrent write is never stored as current.
+    """
+
+    def init_app(self, app):
+        """
+        Create backend selected by PIZZA_CACHE_TYPE
+        """
+
+        cache_type = app.config["PIZZA_CACHE_TYPE"]
+        ttl = app.config["PIZZA_CACHE_TTL"]
+
+        if cache_type == "lru":
+            backend = LRUCache(app.config["PIZZA_CACHE_MAX_ENTRIES"], ttl)
+        elif cache_type == "redis":
+            client = redis_client(app.config["PIZZA_CACHE_REDIS_URL"])
+            backend = RedisCache(client, ttl=ttl)
+        elif cache_type == "null":
+            backend = NullCache()
+        else:
+            raise KeyError(f"Unknown PIZZA_CACHE_TYPE: {cache_type}")
+
+        app.extensions["pizza_cache"] = {
+            "backend": backend,
+            "stats": dict.fromkeys(
+                (
+                    "item_hits",
+                    "item_misses",
+                    "list_hits",
+                    "list_misses",
+                    "variant_hits",
+                    "variant_misses",
+                ),
+                0,
+            ),
+        }
+
+    @staticmethod
+    def _state():
+        return current_app.extensions.get("pizza_cache")
+
+    def _get(self, kind, key):
+        state = self._state()
+        value = state["backend"].get(key)
+        # Counters are per process, += on dict is good enough for stats
+        state["stats"][f"{kind}_hits" if value is not None else f"{kind}_misses"] += 1
+        return unpack(value) if value is not None else None
+
+    def generation(self):
+        """
+        Return current generation, read it before querying database for
+        response which is then stored with set_item or set_list
+        """
+
+        return int(self._state()["backend"].get(LIST_GENERATION_KEY) or 0)
+
+    def _list_key(self, query, generation=None):
+        if generation is None:
+            generation = self.generation()
+        digest = hashlib.sha1(query.encode(), usedforsecurity=False).hexdigest()
+        return LIST_KEY.format(generation, digest)
+
+    def _set(self, key, value):
+        # Responses read from replica may lag behind primary, request
+        # sets shorter time to live of them (see replicas)
+        ttl = g.get("cache_ttl") if has_request_context() else None
+        self._state()["backend"].set(key, value, ttl)
+
+    def get_item(self, pizza_id):
+        """
+        Return cached body and headers of single pizza or None
+        """
+
+        return self._get("item", ITEM_KEY.format(pizza_id))
+
+    def set_item(self, pizza_id, body, headers, generation):
+        """
+        Cache body and headers of single pizza read at generation
+        """
+
+        key = ITEM_KEY.format(pizza_id)
+        self._set(key, pack(body, headers))
+        # Write which ran meanwhile may have deleted key before it was
+        # stored, it bumped generation before that (see invalidate)
+        if self.generation() != generation:
+            self._state()["backend"].delete(key)
+
+    def get_list(self, query):
+        """
+        Return cached body and headers of list query or None
+        """
+
+        return self._get("list", self._list_key(query))
+
+    def set_list(self, query, body, headers, generation):
+        """
+        Cache body and headers of list query read at generation, list
+        read before write is stored under generation nobody reads
+        """
+
+        self._set(self._list_key(query, generation), pack(body, headers))
+
+    @staticmethod
+    def _variant_key(body, encoding):
+        digest = hashlib.sha1(body, usedforsecurity=False).hexdigest()
+        return VARIANT_KEY.format(encoding, digest)
+
+    def get_variant(self, body, encoding):
+        """
+        Return cached payload body compressed with encoding or None
+        """
+
+        state = self._state()
+        value = state["backend"].get(self._variant_key(body, encoding))
+        state["stats"]["variant_hits" if value is not None else "variant_misses"] += 1
+        return value
+
+    def set_variant(self, body, encoding, data):
+        """
+        Cache payload body compressed with encoding
+        """
+
+        self._set(self._variant_key(body, encoding), data)
+
+    def invalidate(self, *pizza_ids):
+        """
+        Drop cached entries affected by write of pizzas with given ids,
+        pass no id when only new rows were added
+        """
+
+        state = self._state()
+        if state is None:
+            return
+        # Generation first, reader storing item after delete sees it
+        # changed and drops the item again
+        state["backend"].incr(LIST_GENERATION_KEY)
+        if pizza_ids:
+            state["backend"].delete(*(ITEM_KEY.format(i) for i in pizza_ids))
+
+    def stats(self):
+        """
+        Return hit/miss counters of current process
+        """
+
+        return dict(self._state()["stats"])
+
+
+cache = PizzaCache()
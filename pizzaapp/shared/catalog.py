@@ -0,0 +1,161 @@
+"""
+This is a definition of import and export of pizza catalog as CSV or
+NDJSON. Files are read and written row by row, import validates and
+writes rows in chunks, so memory does not depend on size of file.
+Exported files can be imported again, fields set by database (id,
+timestamps) are ignored by import.
+"""
+
+import csv
+import itertools
+import time
+from flask import json
+from marshmallow import ValidationError
+from ..models import db
+from ..models.pizza_model import PizzaModel, PizzaSchema
+from .serializer import dumps
+from .validation import validated
+
+FORMATS = ("csv", "ndjson")
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+CSV_COLUMNS = ("id", "name", "price", "ingredients", "created_at", "modified_at")
+STANDARD_STREAMS = ("-", "<stdin>", "<stdout>")
+# Ingredients are single CSV column
+INGREDIENT_SEPARATOR = ";"
+
+catalog_schema = PizzaSchema()
+GENERATED_FIELDS = frozenset(
+    name for name, field in catalog_schema.fields.items() if field.dump_only
+)
+
+
+def catalog_format(filename, fmt=None):
+    """
+    Return format given or guessed from file extension (NDJSON for
+    standard input and output), raise ValueError when it is unknown
+    """
+
+    if fmt is None and filename in STANDARD_STREAMS:
+        fmt = "ndjson"
+    if fmt is None:
+        fmt = next(
+            (f for ext, f in EXTENSIONS.items() if filename.lower().endswith(ext)),
+            None,
+        )
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format of {filename}, use one of {FORMATS}")
+    return fmt
+
+
+def read_csv(stream):
+    """
+    Yield (line, row) of CSV file with header, ingredients are split
+    into list
+    """
+
+    reader = csv.DictReader(stream)
+    for row in reader:
+        for name in GENERATED_FIELDS:
+            row.pop(name, None)
+        if isinstance(row.get("ingredients"), str):
+            row["ingredients"] = [
+                name.strip()
+                for name in row["ingredients"].split(INGREDIENT_SEPARATOR)
+                if name.strip()
+            ]
+        yield reader.line_num, row
+
+
+def read_ndjson(stream):
+    """
+    Yield (line, row) of NDJSON file, row is ValidationError when line
+    is not valid JSON
+    """
+
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, ValidationError("Invalid JSON")
+            continue
+        if isinstance(row, dict):
+            for name in GENERATED_FIELDS:
+                row.pop(name, None)
+        yield line, row
+
+
+def validate_chunk(chunk):
+    """
+    Validate chunk of (line, row), return valid rows (last row wins
+    when name repeats) and list of (line, error messages)
+    """
+
+    rows, errors = {}, []
+    for line, row in chunk:
+        try:
+            if isinstance(row, ValidationError):
+                raise row
+            data = validated(catalog_schema, row)
+        except ValidationError as exc:
+            errors.append((line, exc.messages))
+            continue
+        rows.pop(data["name"], None)
+        rows[data["name"]] = data
+    return list(rows.values()), errors
+
+
+def import_catalog(stream, fmt, chunk_size, on_error):
+    """
+    Import pizzas of stream in chunks of chunk_size rows (every chunk
+    is committed), on_error is called with line and messages of every
+    rejected row. Return counts and speed of import.
+    """
+
+    reader = read_csv(stream) if fmt == "csv" else read_ndjson(stream)
+    stats = {"rows": 0, "imported": 0, "rejected": 0}
+    start = time.perf_counter()
+    while chunk := list(itertools.islice(reader, chunk_size)):
+        rows, errors = validate_chunk(chunk)
+        for line, messages in errors:
+            on_error(line, messages)
+        if rows:
+            PizzaModel.import_batch(rows)
+        stats["rows"] += len(chunk)
+        stats["imported"] += len(chunk) - len(errors)
+        stats["rejected"] += len(errors)
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["rows"] else 0
+    return stats
+
+
+def export_catalog(stream, fmt, chunk_size):
+    """
+    Write all pizzas to stream, rows are read with server-side cursor
+    in chunks of chunk_size. Return count of rows and speed of export.
+    """
+
+    start = time.perf_counter()
+    count = 0
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(CSV_COLUMNS)
+    try:
+        for pizza in PizzaModel.stream_pizzas(chunk_size):
+            if writer is None:
+                stream.write(dumps(catalog_schema, pizza) + "\n")
+            else:
+                data = catalog_schema.dump(pizza)
+                data["ingredients"] = INGREDIENT_SEPARATOR.join(data["ingredients"])
+                writer.writerow([data[name] for name in CSV_COLUMNS])
+            count += 1
+    finally:
+        db.session.close()
+    seconds = time.perf_counter() - start
+    return {
+        "rows": count,
+        "seconds": seconds,
+        "rows_per_second": count / seconds if count else 0,
+    }
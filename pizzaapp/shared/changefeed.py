@@ -0,0 +1,369 @@
+"""
+This is a definition of change feed of pizzas. Writes append changes to
+change log (pizza_change table), subscribers (long-poll and Server-Sent
+Events) resume from id of last seen change. While worker process has
+subscribers, single poller reads new changes of the log every
+PIZZA_CHANGES_POLL_INTERVAL seconds (at once after write of the same
+process), keeps recent changes in memory and wakes all subscribers.
+Subscriber holds worker thread (greenlet under ASGI adapter) while it
+waits, so their number and hold time are limited per worker.
+"""
+
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+from flask import Response, current_app, json
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.util import greenlet_spawn
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from ..models import db
+from ..models.change_model import PizzaChangeModel
+
+TOKEN_EXPIRED_MSG = "Change token expired, reload pizzas and resume from new token"
+TOO_MANY_SUBSCRIBERS_MSG = "Too many subscribers of changes, try again later"
+
+
+class ChangeTokenExpired(Exception):
+    """
+    Changes following resume token were already pruned from log
+    """
+
+
+class TooManySubscribers(Exception):
+    """
+    All subscriber slots of worker are taken
+    """
+
+
+def change_event(change):
+    """
+    Return JSON text of change sent to subscribers, pizza is already
+    serialized in log
+    """
+
+    return (
+        f'{{"id": {change.pizza_id}, "op": "{change.op}", '
+        f'"pizza": {change.data or "null"}, "token": {change.id}}}'
+    )
+
+
+def is_running(poller):
+    """
+    Return True if poller (thread or asyncio task) is running
+    """
+
+    if poller is None:
+        return False
+    if isinstance(poller, threading.Thread):
+        return poller.is_alive()
+    # Task is cancelled when event loop stops
+    return not poller.done()
+
+
+def wait_event(event, timeout):
+    """
+    Wait for threading or asyncio event, return False on timeout
+    """
+
+    if isinstance(event, threading.Event):
+        return event.wait(timeout)
+    try:
+        await_only(asyncio.wait_for(event.wait(), timeout))
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+class Subscribers:
+    """
+    Waiters woken all at once when new changes arrive
+    """
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+
+        self.waiters = set()
+        self.version = 0
+        # Held only to change waiters, never during I/O
+        self.lock = threading.Lock()
+
+    def wait(self, version, timeout):
+        """
+        Wait until notified (or timeout) unless there was notification
+        since version was read, return False on timeout
+        """
+
+        # Under ASGI adapter requests are greenlets sharing one thread,
+        # waiting must not block it
+        if in_greenlet():
+            waiter = (asyncio.get_running_loop(), asyncio.Event())
+        else:
+            waiter = (None, threading.Event())
+        with self.lock:
+            if self.version != version:
+                return True
+            self.waiters.add(waiter)
+
+        try:
+            return wait_event(waiter[1], timeout)
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+    def notify_all(self):
+        """
+        Wake all waiters
+        """
+
+        with self.lock:
+            self.version += 1
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            if loop is None:
+                event.set()
+            else:
+                loop.call_soon_threadsafe(event.set)
+
+
+class ChangeFeed:
+    """
+    Changes of pizzas shared by subscribers of worker process
+    """
+
+    def init_app(self, app):
+        """
+        Prepare per app state and 410 response of expired token
+        """
+
+        app.extensions["pizza_changes"] = {
+            # Changes following token start (complete from there on) as
+            # (start, tokens, events), replaced as a whole by poller
+            "buffer": (None, [], []),
+            "subscribers": Subscribers(),
+            # Poller runs while there are subscribers, it is woken by
+            # writes of this process
+            "poller": None,
+            "wake": Subscribers(),
+            "active": 0,
+            # Requests holding subscriber slot
+            "held": 0,
+            # Held only to start and stop poller, never during I/O
+            "lock": threading.Lock(),
+            "stats": {"polls": 0, "log_reads": 0, "busy": 0},
+        }
+        app.register_error_handler(
+            ChangeTokenExpired,
+            lambda _exc: Response(
+                mimetype="application/json",
+                response=json.dumps({"error": TOKEN_EXPIRED_MSG}),
+                status=410,
+            ),
+        )
+        app.register_error_handler(
+            TooManySubscribers,
+            lambda _exc: Response(
+                mimetype="application/json",
+                response=json.dumps({"error": TOO_MANY_SUBSCRIBERS_MSG}),
+                status=503,
+                headers={
+                    "Retry-After": str(app.config["PIZZA_CHANGES_BUSY_RETRY_AFTER"])
+                },
+            ),
+        )
+
+    @staticmethod
+    def _state():
+        return current_app.extensions["pizza_changes"]
+
+    @staticmethod
+    def hold_seconds():
+        """
+        Return how long subscriber may hold worker, greenlets of ASGI
+        adapter are cheaper than threads
+        """
+
+        if in_greenlet():
+            return current_app.config["PIZZA_CHANGES_ASYNC_STREAM_SECONDS"]
+        return current_app.config["PIZZA_CHANGES_STREAM_SECONDS"]
+
+    def subscribe(self):
+        """
+        Take subscriber slot of worker or raise TooManySubscribers,
+        return function releasing it (callable without app context, so
+        it can be called when streamed response is closed)
+        """
+
+        state = self._state()
+        if in_greenlet():
+            limit = current_app.config["PIZZA_CHANGES_MAX_ASYNC_SUBSCRIBERS"]
+        else:
+            limit = current_app.config["PIZZA_CHANGES_MAX_SUBSCRIBERS"]
+        with state["lock"]:
+            if state["held"] >= limit:
+                state["stats"]["busy"] += 1
+                raise TooManySubscribers()
+            state["held"] += 1
+
+        released = []
+
+        def release():
+            with state["lock"]:
+                if not released:
+                    released.append(True)
+                    state["held"] -= 1
+
+        return release
+
+    def notify(self):
+        """
+        Wake poller after change was committed by this process
+        """
+
+        self._state()["wake"].notify_all()
+
+    @staticmethod
+    def latest_token():
+        """
+        Return token of latest change, subscriber without token starts
+        there
+        """
+
+        try:
+            return PizzaChangeModel.get_token_range()[1] or 0
+        finally:
+            # Subscriber must not hold connection while waiting
+            db.session.close()
+
+    def changes(self, after, timeout):
+        """
+        Return list of (token, event) of changes following token after,
+        wait up to timeout seconds for first of them
+        """
+
+        state = self._state()
+        deadline = time.monotonic() + timeout
+        with state["lock"]:
+            state["active"] += 1
+            if not is_running(state["poller"]):
+                state["poller"] = self._start_poller()
+        try:
+            while True:
+                version = state["subscribers"].version
+                found = self._read(state, after)
+                remaining = deadline - time.monotonic()
+                if found or remaining <= 0:
+                    return found
+                state["subscribers"].wait(version, remaining)
+        finally:
+            with state["lock"]:
+                state["active"] -= 1
+
+    def _start_poller(self):
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+        if in_greenlet():
+            # Poller is greenlet on event loop as well, it must not
+            # inherit context of request starting it
+            return asyncio.get_running_loop().create_task(
+                greenlet_spawn(self._run_poller, app), context=contextvars.Context()
+            )
+        poller = threading.Thread(
+            target=self._run_poller, args=(app,), name="pizza-changes", daemon=True
+        )
+        poller.start()
+        return poller
+
+    def _run_poller(self, app):
+        with app.app_context():
+            state = self._state()
+            while True:
+                version = state["wake"].version
+                try:
+                    changes = self._poll(state)
+                except SQLAlchemyError as exc:
+                    app.logger.warning("Polling of change log failed: %s", exc)
+                    changes = []
+                if changes:
+                    state["subscribers"].notify_all()
+                with state["lock"]:
+                    if not state["active"]:
+                        state["poller"] = None
+                        return
+                # Full batch means more changes are waiting in log
+                if len(changes) < app.config["PIZZA_CHANGES_MAX_BATCH"]:
+                    state["wake"].wait(
+                        version, app.config["PIZZA_CHANGES_POLL_INTERVAL"]
+                    )
+
+    @staticmethod
+    def _read(state, after):
+        limit = current_app.config["PIZZA_CHANGES_MAX_BATCH"]
+        start, tokens, events = state["buffer"]
+        if start is not None and after >= start:
+            index = bisect.bisect_right(tokens, after)
+            return list(
+                zip(tokens[index : index + limit], events[index : index + limit])
+            )
+
+        # Subscriber is behind changes kept in memory
+        state["stats"]["log_reads"] += 1
+        try:
+            oldest = PizzaChangeModel.get_token_range()[0]
+            if oldest is not None and after < oldest - 1:
+                raise ChangeTokenExpired(after)
+            return [
+                (change.id, change_event(change))
+                for change in PizzaChangeModel.get_changes(after, limit)
+            ]
+        finally:
+            db.session.close()
+
+    @staticmethod
+    def _poll(state):
+        """
+        Append new changes of log to buffer, return them
+        """
+
+        start, tokens, events = state["buffer"]
+        state["stats"]["polls"] += 1
+        try:
+            if start is None:
+                start = PizzaChangeModel.get_token_range()[1] or 0
+                changes = []
+            else:
+                changes = PizzaChangeModel.get_changes(
+                    tokens[-1] if tokens else start,
+                    current_app.config["PIZZA_CHANGES_MAX_BATCH"],
+                )
+        finally:
+            db.session.close()
+
+        tokens = tokens + [change.id for change in changes]
+        events = events + [change_event(change) for change in changes]
+        overflow = len(tokens) - current_app.config["PIZZA_CHANGES_BUFFER"]
+        if overflow > 0:
+            start = tokens[overflow - 1]
+            tokens, events = tokens[overflow:], events[overflow:]
+        state["buffer"] = (start, tokens, events)
+        return changes
+
+    def stats(self):
+        """
+        Return counters of change feed of current process
+        """
+
+        state = self._state()
+        start, tokens, _ = state["buffer"]
+        return {
+            **state["stats"],
+            "buffered": len(tokens),
+            "latest": tokens[-1] if tokens else start,
+            "subscribers": len(state["subscribers"].waiters),
+            "held": state["held"],
+        }
+
+
+changefeed = ChangeFeed()
@@ -0,0 +1,124 @@
+"""
+This is a definition of request coalescing (single flight). Concurrent
+identical reads of routes listed in PIZZA_COALESCE_ROUTES share one
+database query and serialization: first request (leader) computes the
+result, the others wait for it up to PIZZA_COALESCE_TIMEOUT seconds and
+get 429 when leader did not finish in time.
+"""
+
+import asyncio
+import threading
+from flask import current_app, request
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from .ratelimit import too_many_requests
+
+
+class CoalesceTimeout(Exception):
+    """
+    Leader of flight did not finish in time
+    """
+
+
+class Flight:
+    """
+    Computation of single result waited for by followers
+    """
+
+    def __init__(self):
+        """
+        Class constructor
+        """
+
+        self.result = None
+        self.error = None
+        # Under ASGI adapter requests are greenlets sharing one thread,
+        # waiting must not block it
+        self.done = asyncio.Event() if in_greenlet() else threading.Event()
+
+    def wait(self, timeout):
+        """
+        Wait until leader finished, return False on timeout
+        """
+
+        if isinstance(self.done, threading.Event):
+            return self.done.wait(timeout)
+        try:
+            await_only(asyncio.wait_for(self.done.wait(), timeout))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class Coalescer:
+    """
+    Share results of concurrent identical reads
+    """
+
+    def init_app(self, app):
+        """
+        Prepare per app state and 429 response of waiting timeout
+        """
+
+        app.extensions["pizza_coalescing"] = {
+            "flights": {},
+            # Held only to look up flights, never during I/O
+            "lock": threading.Lock(),
+            "stats": {"leaders": 0, "followers": 0},
+        }
+        app.register_error_handler(
+            CoalesceTimeout,
+            lambda _exc: too_many_requests(
+                current_app.config["PIZZA_COALESCE_TIMEOUT"]
+            ),
+        )
+
+    @staticmethod
+    def _state():
+        return current_app.extensions["pizza_coalescing"]
+
+    def run(self, key, func):
+        """
+        Return result of func, concurrent calls with the same key on
+        coalesced route share result (or exception) of single call
+        """
+
+        if request.endpoint not in current_app.config["PIZZA_COALESCE_ROUTES"]:
+            return func()
+
+        state = self._state()
+        with state["lock"]:
+            flight = state["flights"].get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = state["flights"][key] = Flight()
+
+        if not is_leader:
+            # Counters are per process, += on dict is good enough for stats
+            state["stats"]["followers"] += 1
+            if not flight.wait(current_app.config["PIZZA_COALESCE_TIMEOUT"]):
+                raise CoalesceTimeout(key)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        state["stats"]["leaders"] += 1
+        try:
+            flight.result = func()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with state["lock"]:
+                del state["flights"][key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        """
+        Return count of leaders and followers of current process
+        """
+
+        return dict(self._state()["stats"])
+
+
+coalescer = Coalescer()
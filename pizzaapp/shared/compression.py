@@ -0,0 +1,100 @@
+"""
+This is a definition of response compression. Encoding is negotiated
+with Accept-Encoding (server preference PIZZA_COMPRESSION_ENCODINGS wins
+ties), bodies smaller than PIZZA_COMPRESSION_MIN_SIZE are sent as they
+are. Compressed variants of cached payloads are cached as well, so cache
+hits are not compressed again.
+"""
+
+import gzip
+import brotli
+import zstandard
+from flask import current_app, request
+from .cache import cache
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/html", "text/plain")
+
+ENCODERS = {
+    "br": lambda data, level: brotli.compress(data, quality=level),
+    "zstd": zstandard.compress,
+    # Fixed mtime keeps output (and cached variants) deterministic
+    "gzip": lambda data, level: gzip.compress(data, level, mtime=0),
+}
+
+
+def compress(data, encoding, level):
+    """
+    Return data compressed with given encoding
+    """
+
+    return ENCODERS[encoding](data, level)
+
+
+def is_compressible(response):
+    """
+    Return True if response body is complete and may be compressed
+    """
+
+    return (
+        200 <= response.status_code < 300
+        and response.status_code not in (204, 206)
+        and not response.is_streamed
+        and not response.direct_passthrough
+        and "Content-Encoding" not in response.headers
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+    )
+
+
+class Compression:
+    """
+    Compress responses enabled with PIZZA_COMPRESSION
+    """
+
+    def init_app(self, app):
+        """
+        Register response hook if enabled
+        """
+
+        unknown = set(app.config["PIZZA_COMPRESSION_ENCODINGS"]) - set(ENCODERS)
+        if unknown:
+            raise KeyError(f"Unknown PIZZA_COMPRESSION_ENCODINGS: {sorted(unknown)}")
+        if app.config["PIZZA_COMPRESSION"]:
+            app.after_request(self._after_request)
+
+    @staticmethod
+    def _after_request(response):
+        if not is_compressible(response):
+            return response
+
+        config = current_app.config
+        response.vary.add("Accept-Encoding")
+        if response.content_length < config["PIZZA_COMPRESSION_MIN_SIZE"]:
+            return response
+        encoding = request.accept_encodings.best_match(
+            config["PIZZA_COMPRESSION_ENCODINGS"]
+        )
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        level = config["PIZZA_COMPRESSION_LEVELS"][encoding]
+        # Payload served from (or just stored to) response cache
+        if "X-Cache" in response.headers:
+            data = cache.get_variant(body, encoding)
+            if data is None:
+                data = compress(body, encoding, level)
+                cache.set_variant(body, encoding, data)
+        else:
+            data = compress(body, encoding, level)
+
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        # Compressed bytes differ, so validator is weak (as nginx does),
+        # If-None-Match uses weak comparison anyway
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
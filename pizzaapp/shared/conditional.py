@@ -0,0 +1,58 @@
+"""
+This is a definition of helpers for conditional requests
+"""
+
+import hashlib
+from datetime import timezone
+from flask import Response, request
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+
+
+def make_etag(*parts):
+    """
+    Return strong ETag (quoted) computed from version parts
+    """
+
+    digest = hashlib.sha1(
+        "|".join(map(str, parts)).encode(), usedforsecurity=False
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+def validator_headers(etag, modified_at):
+    """
+    Return ETag and Last-Modified headers, naive datetimes are UTC
+    """
+
+    headers = {"ETag": etag}
+    if modified_at is not None:
+        if modified_at.tzinfo is None:
+            modified_at = modified_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = http_date(modified_at)
+    return headers
+
+
+def not_modified(headers):
+    """
+    Return 304 response if current request validators match headers,
+    None otherwise
+    """
+
+    if is_resource_modified(
+        request.environ,
+        etag=headers["ETag"],
+        last_modified=headers.get("Last-Modified"),
+    ):
+        return None
+    return Response(status=304, headers=headers)
+
+
+def precondition_failed(etag):
+    """
+    Return True if request has If-Match header not matching etag
+    """
+
+    # Weak ETag of compressed response identifies the same version
+    return bool(request.if_match) and not request.if_match.contains_weak(
+        etag.strip('"')
+    )
@@ -0,0 +1,171 @@
+"""
+This is a definition of idempotent writes. Request of route listed in
+PIZZA_IDEMPOTENT_ROUTES sent with Idempotency-Key header is processed
+once, its response is stored for PIZZA_IDEMPOTENCY_TTL seconds and
+repeated requests (client retries) get stored response without running
+view. Keys are scoped per client and route, reuse of key with different
+request is rejected.
+"""
+
+import hashlib
+from flask import Response, current_app, g, json, request
+from .cache import LRUCache, RedisCache, pack, redis_client, unpack
+from .ratelimit import client_key
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Headers of stored response sent with replayed one
+STORED_HEADERS = ("Content-Type", "ETag")
+MAX_KEY_LENGTH = 255
+
+INVALID_KEY_MSG = f"{IDEMPOTENCY_HEADER} must have 1 to {MAX_KEY_LENGTH} characters"
+IN_PROGRESS_MSG = f"Request with this {IDEMPOTENCY_HEADER} is still in progress"
+KEY_REUSED_MSG = f"{IDEMPOTENCY_HEADER} was already used for different request"
+
+
+def error_response(message, status, headers=None):
+    """
+    Return JSON error response
+    """
+
+    return Response(
+        mimetype="application/json",
+        response=json.dumps({"error": message}),
+        status=status,
+        headers=headers,
+    )
+
+
+def request_fingerprint():
+    """
+    Return digest of method, URL and body of current request
+    """
+
+    digest = hashlib.sha1(usedforsecurity=False)
+    for part in (request.method.encode(), request.full_path.encode()):
+        digest.update(part + b"\n")
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+class Idempotency:
+    """
+    Replay stored responses of repeated writes enabled with
+    PIZZA_IDEMPOTENCY
+    """
+
+    def init_app(self, app):
+        """
+        Create store selected by PIZZA_IDEMPOTENCY_STORAGE and register
+        request hooks if enabled
+        """
+
+        if not app.config["PIZZA_IDEMPOTENCY"]:
+            return
+
+        storage = app.config["PIZZA_IDEMPOTENCY_STORAGE"]
+        ttl = app.config["PIZZA_IDEMPOTENCY_TTL"]
+        if storage == "memory":
+            store = LRUCache(app.config["PIZZA_IDEMPOTENCY_MAX_KEYS"], ttl)
+        elif storage == "redis":
+            client = redis_client(app.config["PIZZA_IDEMPOTENCY_REDIS_URL"])
+            store = RedisCache(client, prefix="pizzaapp:idempotency:", ttl=ttl)
+        else:
+            raise KeyError(f"Unknown PIZZA_IDEMPOTENCY_STORAGE: {storage}")
+        app.extensions["pizza_idempotency"] = {
+            "store": store,
+            "stats": {"stored": 0, "replayed": 0, "rejected": 0},
+        }
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def _state():
+        return current_app.extensions.get("pizza_idempotency")
+
+    def _before_request(self):
+        config = current_app.config
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None or request.endpoint not in config["PIZZA_IDEMPOTENT_ROUTES"]:
+            return None
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            return error_response(INVALID_KEY_MSG, 400)
+
+        state = self._state()
+        digest = hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()
+        store_key = f"{request.endpoint}:{client_key()}:{digest}"
+        fingerprint = request_fingerprint()
+        # Key is claimed by first request, until its response is stored
+        # retries are told to wait
+        pending = pack(b"", {"fingerprint": fingerprint})
+        if state["store"].add(
+            store_key, pending, config["PIZZA_IDEMPOTENCY_LOCK_TIMEOUT"]
+        ):
+            g.idempotency_key = store_key
+            return None
+
+        value = state["store"].get(store_key)
+        body, stored = unpack(value) if value is not None else (b"", {})
+        # Counters are per process, += on dict is good enough for stats
+        if stored.get("fingerprint", fingerprint) != fingerprint:
+            state["stats"]["rejected"] += 1
+            return error_response(KEY_REUSED_MSG, 422)
+        if "status" not in stored:
+            state["stats"]["rejected"] += 1
+            return error_response(IN_PROGRESS_MSG, 409, {"Retry-After": "1"})
+
+        state["stats"]["replayed"] += 1
+        return Response(
+            body,
+            status=stored["status"],
+            headers={**stored["headers"], REPLAYED_HEADER: "true"},
+        )
+
+    def _after_request(self, response):
+        store_key = g.pop("idempotency_key", None)
+        if store_key is None:
+            return response
+
+        state = self._state()
+        if response.status_code >= 500 or response.is_streamed:
+            # Failure may be transient, retry is processed again
+            state["store"].delete(store_key)
+            return response
+
+        stored = {
+            "fingerprint": request_fingerprint(),
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in STORED_HEADERS
+                if name in response.headers
+            },
+        }
+        state["store"].set(
+            store_key,
+            pack(response.get_data(), stored),
+            current_app.config["PIZZA_IDEMPOTENCY_TTL"],
+        )
+        state["stats"]["stored"] += 1
+        return response
+
+    def _teardown_request(self, _exc):
+        # View failed with unhandled exception, response was not stored
+        store_key = g.pop("idempotency_key", None)
+        if store_key is not None:
+            self._state()["store"].delete(store_key)
+
+    def stats(self):
+        """
+        Return counts of stored, replayed and rejected requests of
+        current process
+        """
+
+        state = self._state()
+        if state is None:
+            return {}
+        return dict(state["stats"])
+
+
+idempotency = Idempotency()
@@ -0,0 +1,175 @@
+"""
+This is a definition of Prometheus metrics of app. When
+PROMETHEUS_MULTIPROC_DIR is set (gunicorn) values are shared between
+worker processes through files in that directory.
+"""
+
+import os
+import time
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from .pool_metrics import pool_metrics
+
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+REQUEST_COUNT = Counter(
+    "pizzaapp_http_requests_total",
+    "HTTP requests by route",
+    ["method", "endpoint", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "pizzaapp_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "endpoint"],
+)
+RESPONSE_SIZE = Histogram(
+    "pizzaapp_http_response_size_bytes",
+    "HTTP response body size by route",
+    ["method", "endpoint"],
+    buckets=SIZE_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "pizzaapp_http_requests_in_flight",
+    "HTTP requests being processed",
+    multiprocess_mode="livesum",
+)
+DB_QUERY_COUNT = Counter(
+    "pizzaapp_db_queries_total",
+    "SQL statements by route and statement type",
+    ["endpoint", "statement"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "pizzaapp_db_query_duration_seconds",
+    "SQL statement execution time by statement type",
+    ["statement"],
+)
+SERIALIZATION_LATENCY = Histogram(
+    "pizzaapp_serialization_duration_seconds",
+    "Time spent serializing pizzas by route",
+    ["endpoint"],
+)
+POOL_CHECKED_OUT = Gauge(
+    "pizzaapp_db_pool_checked_out",
+    "Connections checked out from pool",
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "pizzaapp_db_pool_overflow",
+    "Connections opened above pool size",
+    multiprocess_mode="livesum",
+)
+
+
+def endpoint_label():
+    """
+    Return label of current route, requests not matching any route
+    share one label to keep cardinality bounded
+    """
+
+    return request.endpoint or "none"
+
+
+def serialization_timer():
+    """
+    Context manager measuring serialization time of current route
+    """
+
+    return SERIALIZATION_LATENCY.labels(endpoint=endpoint_label()).time()
+
+
+class Metrics:
+    """
+    Request and database instrumentation
+    """
+
+    def init_app(self, app, db):
+        """
+        Register request hooks, SQL event listeners and /metrics route
+        """
+
+        # Primary and replicas
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(
+                engine,
+                "before_cursor_execute",
+                self._before_cursor_execute,
+                named=True,
+            )
+            event.listen(
+                engine, "after_cursor_execute", self._after_cursor_execute, named=True
+            )
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view, methods=["GET"])
+
+    @staticmethod
+    def _before_cursor_execute(context, **_):
+        # Kept on execution context of statement, failed statement leaves
+        # nothing behind on pooled connection
+        context.metrics_start = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(context, statement, **_):
+        elapsed = time.perf_counter() - context.metrics_start
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        DB_QUERY_LATENCY.labels(statement=kind).observe(elapsed)
+        endpoint = endpoint_label() if has_request_context() else "none"
+        DB_QUERY_COUNT.labels(endpoint=endpoint, statement=kind).inc()
+
+    @staticmethod
+    def _before_request():
+        g.metrics_start = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @staticmethod
+    def _after_request(response):
+        endpoint = endpoint_label()
+        if "metrics_start" in g:
+            REQUEST_LATENCY.labels(request.method, endpoint).observe(
+                time.perf_counter() - g.metrics_start
+            )
+        REQUEST_COUNT.labels(request.method, endpoint, response.status_code).inc()
+        # Streamed responses have no length
+        if response.content_length is not None:
+            RESPONSE_SIZE.labels(request.method, endpoint).observe(
+                response.content_length
+            )
+        return response
+
+    @staticmethod
+    def _teardown_request(_exc):
+        if "metrics_start" in g:
+            IN_FLIGHT.dec()
+        stats = pool_metrics.stats()
+        POOL_CHECKED_OUT.set(stats.get("checked_out", 0))
+        POOL_OVERFLOW.set(max(stats.get("overflow", 0), 0))
+
+    @staticmethod
+    def metrics_view():
+        """
+        Expose metrics in Prometheus text format
+        """
+
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
@@ -0,0 +1,179 @@
+"""
+This is a definition of database connection pool instrumentation.
+Counters and checkout wait time are also exported to Prometheus
+(/metrics, shared between gunicorn workers like other metrics).
+"""
+
+import threading
+import time
+from flask import current_app
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# QueuePool default, profiles set FLASK_DB_POOL_TIMEOUT
+DEFAULT_POOL_TIMEOUT = 30
+SHORT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+# Pool event: (name of counter, description)
+EVENTS = {
+    "checkout": ("checkouts", "Connections checked out from pool"),
+    "connect": ("connects", "Connections opened by pool"),
+    "invalidate": ("invalidations", "Connections invalidated (discarded) by pool"),
+}
+
+POOL_EVENTS = {
+    event_name: Counter(f"pizzaapp_db_pool_{name}_total", description, ["engine"])
+    for event_name, (name, description) in EVENTS.items()
+}
+# Histogram is created by first app, buckets follow its pool timeout
+POOL_WAIT = {}
+
+
+def wait_buckets(timeout):
+    """
+    Return histogram buckets of checkout wait, fractions of pool timeout
+    and shorter fixed ones, wait failed with timeout falls into the last
+    """
+
+    coarse = {timeout * share for share in (0.1, 0.25, 0.5, 0.75, 1)}
+    return tuple(sorted(coarse | {le for le in SHORT_WAIT_BUCKETS if le < min(coarse)}))
+
+
+def wait_histogram(timeout):
+    """
+    Return histogram of checkout wait by engine
+    """
+
+    if "histogram" not in POOL_WAIT:
+        POOL_WAIT["histogram"] = Histogram(
+            "pizzaapp_db_pool_wait_seconds",
+            "Time waiting for connection checkout, including opening connection",
+            ["engine"],
+            buckets=wait_buckets(timeout),
+        )
+    return POOL_WAIT["histogram"]
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool recording time spent waiting for connection checkout
+    (includes opening new connection when pool is not full)
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Class constructor
+        """
+
+        super().__init__(*args, **kwargs)
+        self.wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # Set by PoolMetrics, exports wait to Prometheus
+        self.observe_wait = None
+
+    def recreate(self):
+        # Pool is recreated by dispose of engine (after fork)
+        pool = super().recreate()
+        pool.observe_wait = self.observe_wait
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self.wait_lock:
+                self.wait_count += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            if self.observe_wait is not None:
+                self.observe_wait(waited)
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """
+    InstrumentedQueuePool for asyncio drivers, waiting for connection
+    suspends greenlet instead of blocking event loop
+    """
+
+
+class PoolMetrics:
+    """
+    Counters of connection pool events of default engine
+    """
+
+    def init_app(self, app, db):
+        """
+        Register pool event listeners and wait histogram on every engine
+        of app (primary and replicas), /stats reports default engine
+        """
+
+        with app.app_context():
+            engines = dict(db.engines)
+        options = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+        histogram = wait_histogram(options.get("pool_timeout", DEFAULT_POOL_TIMEOUT))
+        counters = dict.fromkeys((name for name, _ in EVENTS.values()), 0)
+        lock = threading.Lock()
+
+        for key, engine in engines.items():
+            label = key or "primary"
+            if isinstance(engine.pool, InstrumentedQueuePool):
+                engine.pool.observe_wait = histogram.labels(engine=label).observe
+            for event_name, (name, _) in EVENTS.items():
+                event.listen(
+                    engine,
+                    event_name,
+                    self._counter(
+                        POOL_EVENTS[event_name].labels(engine=label),
+                        name,
+                        # Only default engine is counted for /stats
+                        counters if key is None else None,
+                        lock,
+                    ),
+                )
+
+        app.extensions["pool_metrics"] = {
+            "engine": engines[None],
+            "counters": counters,
+        }
+
+    @staticmethod
+    def _counter(prometheus_counter, name, counters, lock):
+        def listener(*_):
+            prometheus_counter.inc()
+            if counters is not None:
+                with lock:
+                    counters[name] += 1
+
+        return listener
+
+    @staticmethod
+    def stats():
+        """
+        Return pool state and counters of current process
+        """
+
+        state = current_app.extensions["pool_metrics"]
+        pool = state["engine"].pool
+        stats = dict(state["counters"])
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, InstrumentedQueuePool):
+            with pool.wait_lock:
+                stats.update(
+                    wait_count=pool.wait_count,
+                    wait_seconds_total=pool.wait_seconds_total,
+                    wait_seconds_max=pool.wait_seconds_max,
+                )
+        return stats
+
+
+pool_metrics = PoolMetrics()
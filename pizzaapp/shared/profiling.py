@@ -0,0 +1,201 @@
+"""
+This is a definition of per request profiling used in debug profiles.
+SQL statements of every request are recorded, summary is returned in
+Server-Timing header and slow requests, slow statements and statements
+repeated within request (N+1 queries) are logged. Request sent with
+X-Profile header (cprofile or pyinstrument) is profiled and profile is
+written to PIZZA_PROFILING_DIR. Without pyinstrument installed only
+cprofile is available.
+"""
+
+import cProfile
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+PROFILERS = ("cprofile", "pyinstrument")
+# Statements are logged shortened to this many characters
+STATEMENT_PREVIEW = 200
+
+
+def server_timing(total_ms, sql_ms, sql_count):
+    """
+    Return Server-Timing header value of request
+    """
+
+    return (
+        f'db;dur={sql_ms:.2f};desc="{sql_count} SQL statements", '
+        f"app;dur={total_ms - sql_ms:.2f}, total;dur={total_ms:.2f}"
+    )
+
+
+def request_problems(config, total_ms, queries):
+    """
+    Return descriptions of thresholds exceeded by request, queries are
+    (statement, milliseconds) pairs
+    """
+
+    problems = []
+    if total_ms > config["PIZZA_PROFILING_SLOW_REQUEST_MS"]:
+        problems.append(f"slow request ({total_ms:.1f} ms)")
+    if len(queries) > config["PIZZA_PROFILING_MAX_QUERIES"]:
+        problems.append(f"{len(queries)} SQL statements")
+
+    problems.extend(
+        f"slow statement ({duration:.1f} ms): {statement[:STATEMENT_PREVIEW]}"
+        for statement, duration in queries
+        if duration > config["PIZZA_PROFILING_SLOW_QUERY_MS"]
+    )
+    counts = Counter(statement for statement, _ in queries)
+    problems.extend(
+        f"statement repeated {count} times (N+1?): {statement[:STATEMENT_PREVIEW]}"
+        for statement, count in counts.items()
+        if count > 1
+    )
+    return problems
+
+
+def start_profiler(kind):
+    """
+    Start profiler of given kind, pyinstrument is optional dependency
+    """
+
+    if kind == "pyinstrument":
+        try:
+            # pylint: disable=import-outside-toplevel
+            from pyinstrument import Profiler as Pyinstrument
+        except ImportError as exc:
+            raise ImportError("Package pyinstrument is required") from exc
+        profiler = Pyinstrument()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def dump_profile(profiler, directory):
+    """
+    Stop profiler and write its profile, return path of written file
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r"\W", "_", request.endpoint or "none")
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    name = os.path.join(directory, f"{stamp}-{request.method}-{endpoint}")
+
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path = f"{name}.prof"
+        # Open with pstats or snakeviz
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = f"{name}.html"
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(profiler.output_html())
+    return path
+
+
+class Profiler:
+    """
+    Request profiling enabled with PIZZA_PROFILING
+    """
+
+    def init_app(self, app, db):
+        """
+        Register SQL event listeners and request hooks if enabled
+        """
+
+        if not app.config["PIZZA_PROFILING"]:
+            return
+
+        # Checked once, missing package must not fail every request
+        profilers = PROFILERS
+        try:
+            # pylint: disable=import-outside-toplevel,unused-import
+            import pyinstrument
+        except ImportError:
+            app.logger.warning(
+                "Package pyinstrument is not installed, "
+                "X-Profile: pyinstrument is ignored"
+            )
+            profilers = tuple(kind for kind in PROFILERS if kind != "pyinstrument")
+        app.extensions["pizza_profilers"] = profilers
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(
+                engine, "before_cursor_execute", self._statement_start, named=True
+            )
+            event.listen(
+                engine, "after_cursor_execute", self._statement_end, named=True
+            )
+
+    @staticmethod
+    def _statement_start(context, **_):
+        # Kept on execution context like metrics start time
+        context.profile_start = time.perf_counter()
+
+    @staticmethod
+    def _statement_end(context, statement, **_):
+        elapsed = time.perf_counter() - context.profile_start
+        if has_request_context() and "profile" in g:
+            g.profile["queries"].append((statement, elapsed * 1000))
+
+    @staticmethod
+    def _before_request():
+        kind = request.headers.get("X-Profile", "").lower()
+        profilers = current_app.extensions["pizza_profilers"]
+        profiler = start_profiler(kind) if kind in profilers else None
+        g.profile = {
+            "start": time.perf_counter(),
+            "queries": [],
+            "profiler": profiler,
+        }
+
+    @staticmethod
+    def _after_request(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+
+        config = current_app.config
+        total_ms = (time.perf_counter() - profile["start"]) * 1000
+        queries = profile["queries"]
+        sql_ms = sum(duration for _, duration in queries)
+        response.headers["Server-Timing"] = server_timing(
+            total_ms, sql_ms, len(queries)
+        )
+
+        problems = request_problems(config, total_ms, queries)
+        if problems:
+            current_app.logger.warning(
+                "%s %s: %s", request.method, request.path, "; ".join(problems)
+            )
+
+        if profile["profiler"] is not None:
+            path = dump_profile(profile["profiler"], config["PIZZA_PROFILING_DIR"])
+            response.headers["X-Profile-File"] = path
+        return response
+
+    @staticmethod
+    def _teardown_request(_exc):
+        # Request failed before response, profiler must not keep running
+        profile = g.pop("profile", None)
+        if profile is not None and profile["profiler"] is not None:
+            if isinstance(profile["profiler"], cProfile.Profile):
+                profile["profiler"].disable()
+            else:
+                profile["profiler"].stop()
+
+
+profiling = Profiler()
@@ -0,0 +1,210 @@
+"""
+This is a definition of per client rate limiting. Every client (API key
+sent in PIZZA_RATE_LIMIT_KEY_HEADER if it is one of
+PIZZA_RATE_LIMIT_API_KEYS, client address otherwise) has token bucket
+per route, limits of routes (tokens per second, burst) are set in
+PIZZA_RATE_LIMITS. Buckets are kept per process (memory, every worker
+allows the whole limit) or shared by workers in redis (memory:// url
+gives local stand-in).
+"""
+
+import hashlib
+import math
+import threading
+import time
+from flask import Response, current_app, json, request
+from .cache import LOCAL_SCRIPTS, LRUCache, redis_client
+
+TOO_MANY_REQUESTS_MSG = "Too many requests, retry later"
+
+# Bucket is stored as "tokens:timestamp", it expires when it would be
+# full again
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens, updated = burst, now
+local value = redis.call("GET", KEYS[1])
+if value then
+  local sep = string.find(value, ":", 1, true)
+  tokens = tonumber(string.sub(value, 1, sep - 1))
+  updated = tonumber(string.sub(value, sep + 1))
+end
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed, retry_after = 0, (1 - tokens) / rate
+if tokens >= 1 then
+  tokens, allowed, retry_after = tokens - 1, 1, 0
+end
+redis.call("SET", KEYS[1], tokens .. ":" .. now, "PX", math.ceil(burst / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+def take_token(value, now, rate, burst):
+    """
+    Refill bucket stored in value (None for new bucket) and take one
+    token, return new value, True if token was taken and seconds until
+    next token
+    """
+
+    tokens, updated = float(burst), now
+    if value is not None:
+        tokens, updated = map(float, value.split(":"))
+    tokens = min(float(burst), tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return f"{tokens - 1}:{now}", True, 0.0
+    return f"{tokens}:{now}", False, (1 - tokens) / rate
+
+
+def local_token_bucket(keys, args, get, set_):
+    """
+    Equivalent of TOKEN_BUCKET_LUA run by LocalRedis
+    """
+
+    rate, burst, now = map(float, args)
+    value, allowed, retry_after = take_token(get(keys[0]), now, rate, burst)
+    set_(keys[0], value, burst / rate)
+    return [int(allowed), str(retry_after)]
+
+
+LOCAL_SCRIPTS[TOKEN_BUCKET_LUA] = local_token_bucket
+
+
+def too_many_requests(retry_after):
+    """
+    Return 429 response, client should retry after given seconds
+    """
+
+    return Response(
+        mimetype="application/json",
+        response=json.dumps({"error": TOO_MANY_REQUESTS_MSG}),
+        status=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class MemoryBuckets:
+    """
+    Token buckets of worker process, least recently used are dropped
+    """
+
+    def __init__(self, max_entries):
+        """
+        Class constructor
+        """
+
+        self.buckets = LRUCache(max_entries)
+        # Held only for computation, never during I/O
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """
+        Take token from bucket, return True if it was available and
+        seconds until next token
+        """
+
+        now = time.time()
+        with self.lock:
+            value, allowed, retry_after = take_token(
+                self.buckets.get(key), now, rate, burst
+            )
+            self.buckets.set(key, value, burst / rate)
+        return allowed, retry_after
+
+
+class RedisBuckets:
+    """
+    Token buckets shared by workers, updated atomically by Lua script
+    """
+
+    def __init__(self, client, prefix="pizzaapp:ratelimit:"):
+        """
+        Class constructor
+        """
+
+        self.script = client.register_script(TOKEN_BUCKET_LUA)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        """
+        Take token from bucket, return True if it was available and
+        seconds until next token
+        """
+
+        allowed, retry_after = self.script(
+            keys=[self.prefix + key], args=[rate, burst, time.time()]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+
+def key_digest(api_key):
+    """
+    Return digest of API key, keys are not kept in plain text
+    """
+
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def client_key():
+    """
+    Return key of client of current request, API key counts only if it
+    is configured, so random keys do not get fresh buckets
+    """
+
+    api_key = request.headers.get(current_app.config["PIZZA_RATE_LIMIT_KEY_HEADER"])
+    if api_key:
+        digest = key_digest(api_key)
+        if digest in current_app.extensions["pizza_rate_limit_keys"]:
+            return f"key:{digest}"
+    return f"addr:{request.remote_addr}"
+
+
+class RateLimiter:
+    """
+    Rate limiting of routes enabled with PIZZA_RATE_LIMIT
+    """
+
+    def init_app(self, app):
+        """
+        Create buckets selected by PIZZA_RATE_LIMIT_STORAGE and register
+        request hook if enabled, digests of API keys are kept anyway
+        """
+
+        # Clients are told apart also by idempotency keys
+        app.extensions["pizza_rate_limit_keys"] = frozenset(
+            key_digest(api_key) for api_key in app.config["PIZZA_RATE_LIMIT_API_KEYS"]
+        )
+        if not app.config["PIZZA_RATE_LIMIT"]:
+            return
+        if app.config["PIZZA_PROXY_COUNT"] is None:
+            raise KeyError(
+                "Set FLASK_PROXY_COUNT (proxies in front of app, 0 for none) "
+                "or disable rate limiting with FLASK_RATE_LIMIT=false"
+            )
+
+        storage = app.config["PIZZA_RATE_LIMIT_STORAGE"]
+        if storage == "memory":
+            buckets = MemoryBuckets(app.config["PIZZA_RATE_LIMIT_MAX_CLIENTS"])
+        elif storage == "redis":
+            client = redis_client(app.config["PIZZA_RATE_LIMIT_REDIS_URL"])
+            buckets = RedisBuckets(client)
+        else:
+            raise KeyError(f"Unknown PIZZA_RATE_LIMIT_STORAGE: {storage}")
+        app.extensions["pizza_rate_limit"] = buckets
+        app.before_request(self._before_request)
+
+    @staticmethod
+    def _before_request():
+        limit = current_app.config["PIZZA_RATE_LIMITS"].get(request.endpoint)
+        if limit is None:
+            return None
+
+        rate, burst = limit
+        buckets = current_app.extensions["pizza_rate_limit"]
+        allowed, retry_after = buckets.take(
+            f"{request.endpoint}:{client_key()}", rate, burst
+        )
+        return None if allowed else too_many_requests(retry_after)
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,179 @@
+"""
+This is a definition of read replica routing. Replicas are configured as
+SQLAlchemy binds named replica_*, GET requests of pizza API read from
+healthy replica chosen round-robin, everything else uses primary. Client
+which wrote data reads from primary for PIZZA_REPLICA_STICKY_SECONDS, so
+it sees its own writes despite replication lag. Writer is recognized by
+cookie, or by client key (API key or address) remembered by worker
+process for clients which do not keep cookies.
+"""
+
+import itertools
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError
+from .cache import LRUCache
+from .ratelimit import client_key
+
+REPLICA_PREFIX = "replica_"
+STICKY_COOKIE = "pizza_primary"
+ROUTED_BLUEPRINTS = ("pizza",)
+READ_METHODS = ("GET", "HEAD")
+
+
+class RoutingSession(Session):
+    """
+    Session using replica chosen for current request, flushes (writes)
+    always go to primary
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            key = g.get("db_bind")
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Choose replica for read requests, keep writers on primary
+    """
+
+    def init_app(self, app, db):
+        """
+        Register request hooks if app has replica binds
+        """
+
+        with app.app_context():
+            engines = {
+                key: engine
+                for key, engine in db.engines.items()
+                if key and key.startswith(REPLICA_PREFIX)
+            }
+        if not engines:
+            return
+
+        state = {
+            "engines": engines,
+            "keys": sorted(engines),
+            "healthy": dict.fromkeys(engines, True),
+            "checked_at": dict.fromkeys(engines),
+            "next": itertools.count(),
+            "lock": threading.Lock(),
+            # Recent writers of this worker, cookie covers other workers
+            "writers": LRUCache(
+                app.config["PIZZA_REPLICA_STICKY_CLIENTS"],
+                app.config["PIZZA_REPLICA_STICKY_SECONDS"],
+            ),
+        }
+        for key, engine in engines.items():
+            event.listen(engine, "handle_error", self._error_listener(state, key))
+        app.extensions["pizza_replicas"] = state
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _error_listener(state, key):
+        def listener(context):
+            # Replica is skipped until next successful health check
+            if context.is_disconnect:
+                state["healthy"][key] = False
+                state["checked_at"][key] = time.monotonic()
+
+        return listener
+
+    @staticmethod
+    def _state():
+        return current_app.extensions.get("pizza_replicas")
+
+    def _is_healthy(self, state, key):
+        """
+        Return last health of replica, replica is pinged at most once per
+        PIZZA_REPLICA_CHECK_INTERVAL seconds. Lock is never waited for
+        (see readyz).
+        """
+
+        interval = current_app.config["PIZZA_REPLICA_CHECK_INTERVAL"]
+        checked_at = state["checked_at"][key]
+        is_stale = checked_at is None or time.monotonic() - checked_at >= interval
+        # pylint: disable-next=consider-using-with
+        if is_stale and state["lock"].acquire(blocking=False):
+            try:
+                with state["engines"][key].connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                state["healthy"][key] = True
+            except SQLAlchemyError:
+                state["healthy"][key] = False
+            finally:
+                state["checked_at"][key] = time.monotonic()
+                state["lock"].release()
+        return state["healthy"][key]
+
+    def choose(self):
+        """
+        Return bind key of next healthy replica or None (primary)
+        """
+
+        state = self._state()
+        keys = state["keys"]
+        start = next(state["next"])
+        for offset in range(len(keys)):
+            key = keys[(start + offset) % len(keys)]
+            if self._is_healthy(state, key):
+                return key
+        return None
+
+    def _is_writer(self):
+        """
+        Return True if client wrote data within sticky window
+        """
+
+        if STICKY_COOKIE in request.cookies:
+            return True
+        return self._state()["writers"].get(client_key()) is not None
+
+    def _before_request(self):
+        if (
+            request.method in READ_METHODS
+            and request.blueprint in ROUTED_BLUEPRINTS
+            and not self._is_writer()
+        ):
+            g.db_bind = self.choose()
+            if g.db_bind is not None:
+                # Cached replica reads expire within replication lag window
+                g.cache_ttl = current_app.config["PIZZA_REPLICA_STICKY_SECONDS"] or None
+
+    def _after_request(self, response):
+        sticky_seconds = current_app.config["PIZZA_REPLICA_STICKY_SECONDS"]
+        if (
+            request.method not in READ_METHODS
+            and request.blueprint in ROUTED_BLUEPRINTS
+            and response.status_code < 400
+            and sticky_seconds
+        ):
+            self._state()["writers"].set(client_key(), True)
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=sticky_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def stats(self):
+        """
+        Return health of replicas
+        """
+
+        state = self._state()
+        if state is None:
+            return {}
+        return dict(state["healthy"])
+
+
+replicas = ReplicaRouter()
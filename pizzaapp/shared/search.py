@@ -0,0 +1,332 @@
+"""
+This is a definition of pizza name search. Names are matched with
+trigram and full-text indexes on Postgres, FTS5 virtual table on SQLite
+or in-memory prefix index when database indexes are not available.
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+from flask import current_app
+from sqlalchemy import DDL, column, event, literal_column, table, text
+from sqlalchemy.orm import selectinload
+from ..models import db
+from ..models.pizza_model import PizzaModel
+
+TERM_RE = re.compile(r"\w+")
+TRGM_INDEX = "ix_pizza_name_trgm"
+TSVECTOR_INDEX = "ix_pizza_name_tsvector"
+FTS_TABLE = "pizza_fts"
+# Trigram similarity is meaningful from one full trigram
+FUZZY_MIN_LENGTH = 3
+
+# Extension may require elevated rights, so Postgres indexes are created
+# by "flask pizza search-index" instead of migrations
+POSTGRES_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON pizza USING gin (name gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS {TSVECTOR_INDEX} ON pizza "
+    "USING gin (to_tsvector('simple'::regconfig, name))",
+)
+# External content FTS5 table kept in sync with pizza by triggers
+SQLITE_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, content='pizza', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS pizza_fts_insert AFTER INSERT ON pizza BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS pizza_fts_delete AFTER DELETE ON pizza BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) "
+    "VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS pizza_fts_update AFTER UPDATE OF name ON pizza "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) "
+    "VALUES ('delete', old.id, old.name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+)
+SQLITE_REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+# SQLite tables created with db.create_all() get search table as well
+for ddl in SQLITE_DDL:
+    event.listen(
+        PizzaModel.__table__,
+        "after_create",
+        DDL(ddl).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    PizzaModel.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+def search_terms(query):
+    """
+    Return lowercase words of search query
+    """
+
+    return TERM_RE.findall(query.lower())
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Hide search objects from migrations autogenerate, they are managed
+    by "flask pizza search-index"
+    """
+
+    # pylint: disable=unused-argument
+    if type_ == "table":
+        return not name.startswith(FTS_TABLE)
+    if type_ == "index":
+        return name not in (TRGM_INDEX, TSVECTOR_INDEX)
+    return True
+
+
+def words(name):
+    """
+    Return distinct lowercase words of pizza name
+    """
+
+    return set(search_terms(name))
+
+
+class PrefixIndex:
+    """
+    In-memory index of words of pizza names, sorted for prefix lookup
+    """
+
+    def __init__(self, rows):
+        """
+        Class constructor, rows are (id, name) pairs
+        """
+
+        self.names = {pizza_id: " ".join(search_terms(name)) for pizza_id, name in rows}
+        self.words = {pizza_id: words(name) for pizza_id, name in rows}
+        entries = sorted(
+            (word, pizza_id)
+            for pizza_id, name_words in self.words.items()
+            for word in name_words
+        )
+        self.keys = [word for word, _ in entries]
+        self.ids = [pizza_id for _, pizza_id in entries]
+
+    def term_range(self, term, prefix=False):
+        """
+        Return slice of entries of word equal to term (or starting with
+        term if prefix)
+        """
+
+        start = bisect.bisect_left(self.keys, term)
+        if prefix:
+            end = bisect.bisect_left(self.keys, term[:-1] + chr(ord(term[-1]) + 1))
+        else:
+            end = bisect.bisect_right(self.keys, term, lo=start)
+        return slice(start, end)
+
+    def matches(self, pizza_id, terms):
+        """
+        Return True if name has all terms as words, last one as prefix
+        """
+
+        name_words = self.words[pizza_id]
+        *whole, prefix = terms
+        return all(term in name_words for term in whole) and any(
+            word.startswith(prefix) for word in name_words
+        )
+
+    def search(self, query, terms, limit, offset):
+        """
+        Return ids of pizzas matching terms, exact and prefix matches of
+        whole name first, shorter names before longer ones
+        """
+
+        # Candidates come from the rarest term, others are checked per name
+        ranges = [self.term_range(term) for term in terms[:-1]]
+        ranges.append(self.term_range(terms[-1], prefix=True))
+        rarest = min(ranges, key=lambda r: r.stop - r.start)
+        ids = {i for i in self.ids[rarest] if self.matches(i, terms)}
+        query = " ".join(terms)
+
+        def rank(pizza_id):
+            name = self.names[pizza_id]
+            return (name != query, not name.startswith(query), len(name), pizza_id)
+
+        return heapq.nsmallest(offset + limit, ids, key=rank)[offset:]
+
+
+class PizzaSearch:
+    """
+    Ranked pizza name search with backend selected by
+    PIZZA_SEARCH_BACKEND and database capabilities
+    """
+
+    def init_app(self, app):
+        """
+        Prepare per app state, backend is detected on first search
+        """
+
+        app.extensions["pizza_search"] = {
+            "backend": None,
+            "index": None,
+            "version": None,
+            # Cache generation index is known to be current for
+            "generation": None,
+            "checked_at": None,
+            "lock": threading.Lock(),
+        }
+
+    @staticmethod
+    def _state():
+        return current_app.extensions["pizza_search"]
+
+    @staticmethod
+    def _has_indexes(bind):
+        dialect = bind.dialect.name
+        if dialect == "postgresql":
+            query = text(
+                "SELECT to_regclass(:a) IS NOT NULL AND to_regclass(:b) IS NOT NULL"
+            )
+            return db.session.scalar(query, {"a": TRGM_INDEX, "b": TSVECTOR_INDEX})
+        if dialect == "sqlite":
+            query = text("SELECT count(*) FROM sqlite_master WHERE name = :name")
+            return bool(db.session.scalar(query, {"name": FTS_TABLE}))
+        return False
+
+    def backend(self):
+        """
+        Return backend used by this app: postgresql, sqlite or memory
+        """
+
+        state = self._state()
+        if state["backend"] is None:
+            configured = current_app.config["PIZZA_SEARCH_BACKEND"]
+            bind = db.session.get_bind()
+            if configured == "memory":
+                state["backend"] = "memory"
+            elif configured == "database" or self._has_indexes(bind):
+                state["backend"] = bind.dialect.name
+            else:
+                state["backend"] = "memory"
+        return state["backend"]
+
+    def create_indexes(self):
+        """
+        Create (or rebuild) search indexes of current database, return
+        database dialect name
+        """
+
+        dialect = db.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            statements = POSTGRES_DDL
+        elif dialect == "sqlite":
+            statements = SQLITE_DDL + (SQLITE_REBUILD,)
+        else:
+            raise KeyError(f"Search indexes are not supported on {dialect}")
+        for statement in statements:
+            db.session.execute(text(statement))
+        db.session.commit()
+        self._state()["backend"] = None
+        return dialect
+
+    def search(self, query, limit, offset=0, generation=None):
+        """
+        Return up to limit pizzas best matching query, skipping offset
+        best matches. Words of query have to be present in name, last one
+        may be incomplete (search as you type). In-memory index reflects
+        at least writes of cache generation when it is given.
+        """
+
+        terms = search_terms(query)
+        backend = self.backend()
+        if backend == "memory":
+            ids = self._prefix_index(generation).search(query, terms, limit, offset)
+            pizzas = db.session.scalars(
+                db.select(PizzaModel)
+                .where(PizzaModel.id.in_(ids))
+                .options(selectinload(PizzaModel.ingredients))
+            )
+            by_id = {pizza.id: pizza for pizza in pizzas}
+            return [by_id[pizza_id] for pizza_id in ids if pizza_id in by_id]
+
+        if backend == "postgresql":
+            statement = self._postgres_query(query, terms)
+        elif backend == "sqlite":
+            statement = self._sqlite_query(terms)
+        else:
+            raise KeyError(f"Search is not supported on {backend}")
+        statement = statement.options(selectinload(PizzaModel.ingredients))
+        return db.session.scalars(statement.limit(limit).offset(offset)).all()
+
+    @staticmethod
+    def _postgres_query(query, terms):
+        config = literal_column("'simple'::regconfig")
+        tsvector = db.func.to_tsvector(config, PizzaModel.name)
+        tsquery = db.func.to_tsquery(
+            config, " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        )
+        matches = tsvector.op("@@")(tsquery)
+        score = db.func.ts_rank(tsvector, tsquery)
+        if len(query) >= FUZZY_MIN_LENGTH:
+            # Trigram similarity finds misspelled names
+            matches = matches | PizzaModel.name.op("%")(query)
+            score = db.func.greatest(score, db.func.similarity(PizzaModel.name, query))
+        return (
+            db.select(PizzaModel).where(matches).order_by(score.desc(), PizzaModel.id)
+        )
+
+    @staticmethod
+    def _sqlite_query(terms):
+        fts = table(FTS_TABLE, column("rowid"), column("rank"))
+        # Terms are words, so need no escaping
+        match = " ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        return (
+            db.select(PizzaModel)
+            .join(fts, fts.c.rowid == PizzaModel.id)
+            .where(literal_column(FTS_TABLE).op("MATCH")(match))
+            .order_by(fts.c.rank, PizzaModel.id)
+        )
+
+    def _prefix_index(self, generation=None):
+        """
+        Return in-memory index, rebuilt when catalog version changed.
+        Version is checked at most once per PIZZA_SEARCH_REFRESH seconds
+        and whenever cache generation moved (write was made, results
+        are cached under new generation), lock is never waited for (see
+        readyz). Other requests use previous index while it is rebuilt,
+        unless it is older than their generation.
+        """
+
+        state = self._state()
+        current = generation is None or state["generation"] == generation
+        interval = current_app.config["PIZZA_SEARCH_REFRESH"]
+        checked_at = state["checked_at"]
+        if (
+            current
+            and checked_at is not None
+            and time.monotonic() - checked_at < interval
+        ):
+            return state["index"]
+
+        # pylint: disable-next=consider-using-with
+        if not state["lock"].acquire(blocking=False):
+            if current and state["index"] is not None:
+                return state["index"]
+            return self._build_index()
+        try:
+            # Read after generation, so index is at least that current
+            version = tuple(PizzaModel.get_list_version())
+            if state["index"] is None or version != state["version"]:
+                state["index"], state["version"] = self._build_index(), version
+            state["generation"] = generation
+            state["checked_at"] = time.monotonic()
+        finally:
+            state["lock"].release()
+        return state["index"]
+
+    @staticmethod
+    def _build_index():
+        rows = db.session.execute(db.select(PizzaModel.id, PizzaModel.name)).all()
+        return PrefixIndex([tuple(row) for row in rows])
+
+
+pizza_search = PizzaSearch()
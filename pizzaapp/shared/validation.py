@@ -0,0 +1,203 @@
+"""
+This is a definition of fast validation of request bodies with
+marshmallow schemas. Schema is compiled once into function checking
+types and validators of valid input directly, result is equal to
+schema.load(). Any other input (missing or unknown fields, wrong types,
+failed validators) is loaded by schema itself, so errors are the same.
+Size of request bodies is limited before they are read.
+"""
+
+import math
+from functools import lru_cache
+from flask import Response, current_app, json, request
+from marshmallow import RAISE, fields, missing, validate, ValidationError
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+
+# Returned by compiled loader when input has to be loaded by schema
+FALLBACK = object()
+# JSON types float() accepts the same way marshmallow Float does
+NUMBER_TYPES = (int, float, str)
+
+BODY_TOO_LARGE_MSG = "Request body is too large"
+
+
+def field_lines(field, value, namespace, depth=0):
+    """
+    Return lines of Python code converting variable value to loaded
+    value of field (returning FALLBACK when it is not valid), or None
+    if field type is not supported. Validators are added to namespace.
+    """
+
+    field_type = type(field)
+    if field.load_default is not missing:
+        return None
+    if field_type is fields.String:
+        lines = [f"if type({value}) is not str:", "    return FALLBACK"]
+    elif field_type is fields.Float:
+        lines = [
+            f"if type({value}) not in NUMBER_TYPES:",
+            "    return FALLBACK",
+            "try:",
+            f"    {value} = float({value})",
+            "except (ValueError, OverflowError):",
+            "    return FALLBACK",
+        ]
+        if field.allow_nan is False:
+            lines += [f"if not isfinite({value}):", "    return FALLBACK"]
+    elif field_type is fields.List:
+        item = f"item{depth}"
+        item_lines = field_lines(field.inner, item, namespace, depth + 1)
+        if item_lines is None:
+            return None
+        lines = [
+            f"if type({value}) is not list:",
+            "    return FALLBACK",
+            f"items{depth} = []",
+            f"for {item} in {value}:",
+            *(f"    {line}" for line in item_lines),
+            f"    items{depth}.append({item})",
+            f"{value} = items{depth}",
+        ]
+    else:
+        return None
+
+    for validator in field.validators:
+        name = f"validator{len(namespace)}"
+        namespace[name] = validator
+        if isinstance(validator, validate.Validator):
+            lines += ["try:", f"    {name}({value})"]
+        else:
+            # Plain function fails also by returning False
+            lines += [
+                "try:",
+                f"    if {name}({value}) is False:",
+                "        return FALLBACK",
+            ]
+        lines += ["except ValidationError:", "    return FALLBACK"]
+
+    if field.allow_none:
+        return [f"if {value} is not None:", *(f"    {line}" for line in lines)]
+    return [f"if {value} is None:", "    return FALLBACK", *lines]
+
+
+def schema_supported(schema):
+    """
+    Return True if schema has no hooks and unknown fields are rejected,
+    so input is loaded by fields alone
+    """
+
+    return (
+        not any(schema._hooks.values())  # pylint: disable=protected-access
+        and schema.unknown == RAISE
+        and not schema.many
+    )
+
+
+@lru_cache(maxsize=128)
+def compile_loader(schema, partial=False):
+    """
+    Compile schema into function returning loaded data of valid input
+    or FALLBACK, None if schema is not supported
+    """
+
+    if not schema_supported(schema):
+        return None
+
+    namespace = {
+        "FALLBACK": FALLBACK,
+        "NUMBER_TYPES": NUMBER_TYPES,
+        "ValidationError": ValidationError,
+        "isfinite": math.isfinite,
+        "missing": missing,
+    }
+    keys = []
+    lines = [
+        "if type(data) is not dict or not data.keys() <= KEYS:",
+        "    return FALLBACK",
+        "result = {}",
+    ]
+    for index, (name, field) in enumerate(schema.load_fields.items()):
+        key = field.data_key or name
+        attribute = field.attribute or name
+        conversion = field_lines(field, f"v{index}", namespace)
+        if conversion is None or "." in attribute:
+            return None
+        keys.append(key)
+        body = conversion + [f"result[{attribute!r}] = v{index}"]
+        lines.append(f"v{index} = data.get({key!r}, missing)")
+        if field.required and not partial:
+            lines += [f"if v{index} is missing:", "    return FALLBACK", *body]
+        else:
+            lines.append(f"if v{index} is not missing:")
+            lines += [f"    {line}" for line in body]
+
+    namespace["KEYS"] = frozenset(keys)
+    lines.append("return result")
+    source = "def load(data):\n" + "".join(f"    {line}\n" for line in lines)
+    # pylint: disable=exec-used
+    exec(source, namespace)
+    return namespace["load"]
+
+
+def validated(schema, data, partial=False):
+    """
+    Load and validate data with schema using loader selected by
+    PIZZA_VALIDATOR, raise ValidationError on invalid data
+    """
+
+    if current_app.config["PIZZA_VALIDATOR"] == "fast":
+        loader = compile_loader(schema, partial)
+        if loader is not None:
+            result = loader(data)
+            if result is not FALLBACK:
+                return result
+    return schema.load(data, partial=partial)
+
+
+def request_body_limit(app, method, path):
+    """
+    Return limit of request body of method and path (limit of endpoint
+    in PIZZA_MAX_CONTENT_LENGTHS, MAX_CONTENT_LENGTH otherwise), used by
+    ASGI adapter reading body before app runs
+    """
+
+    try:
+        endpoint, _ = app.url_map.bind("localhost").match(path, method)
+    except HTTPException:
+        endpoint = None
+    limit = app.config["PIZZA_MAX_CONTENT_LENGTHS"].get(endpoint)
+    return app.config["MAX_CONTENT_LENGTH"] if limit is None else limit
+
+
+class BodyLimits:
+    """
+    Limit size of request bodies, per endpoint limits of
+    PIZZA_MAX_CONTENT_LENGTHS override MAX_CONTENT_LENGTH
+    """
+
+    def init_app(self, app):
+        """
+        Register request hook (before any hook reading body) and 413
+        response
+        """
+
+        app.before_request(self._before_request)
+        app.register_error_handler(
+            RequestEntityTooLarge,
+            lambda _exc: Response(
+                mimetype="application/json",
+                response=json.dumps({"error": BODY_TOO_LARGE_MSG}),
+                status=413,
+            ),
+        )
+
+    @staticmethod
+    def _before_request():
+        limit = current_app.config["PIZZA_MAX_CONTENT_LENGTHS"].get(request.endpoint)
+        if limit is not None:
+            # Body with larger Content-Length is rejected before reading,
+            # chunked body once limit is exceeded
+            request.max_content_length = limit
+
+
+body_limits = BodyLimits()
@@ -0,0 +1,254 @@
+"""
+This is a defitinion of unit tests of ASGI adapter
+"""
+
+import os
+import json
+import asyncio
+import unittest
+from functools import partial
+from unittest import mock
+from ..app import create_app, db
+from ..shared.asgi import ASGIAdapter
+from ..shared.validation import request_body_limit
+
+
+async def asgi_request(app, method, path, query="", headers=None, body=b""):
+    """
+    Send single HTTP request to ASGI app, return status, headers and
+    list of body chunks. Body given as list is sent in chunks, unread
+    chunks are left in it.
+    """
+
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [
+            (name.lower().encode(), value.encode())
+            for name, value in (headers or {}).items()
+        ],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 12345),
+    }
+    chunks = body if isinstance(body, list) else [body]
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks
+    ]
+    messages[-1]["more_body"] = False
+    response = {"chunks": []}
+
+    async def receive():
+        if not messages:
+            return {"type": "http.disconnect"}
+        if isinstance(body, list):
+            body.pop(0)
+        return messages.pop(0)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {
+                name.decode(): value.decode() for name, value in message["headers"]
+            }
+        elif message.get("body"):
+            response["chunks"].append(message["body"])
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["chunks"]
+
+
+class ASGITest(unittest.TestCase):
+
+    """
+    ASGI app with asyncio driver responds the same way as WSGI app
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(
+            os.environ, {"FLASK_ENV": "local", "FLASK_CACHE_TYPE": "null"}
+        )
+        cls.env_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Sync app creates tables and serves as reference
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.client = self.app.test_client()
+        asgi_flask_app = create_app(asyncio=True)
+        self.asgi_app = ASGIAdapter(
+            asgi_flask_app, body_limit=partial(request_body_limit, asgi_flask_app)
+        )
+
+        with self.app.app_context():
+            db.create_all()
+
+    def request(self, *args, **kwargs):
+        """
+        Send request to ASGI app
+        """
+
+        return asyncio.run(asgi_request(self.asgi_app, *args, **kwargs))
+
+    def test_same_responses_as_wsgi(self):
+        status, _, chunks = self.request(
+            "POST",
+            "/api/v1/pizza/",
+            headers={"Content-Type": "application/json"},
+            body=json.dumps({"name": "asgi", "price": "21.50"}).encode(),
+        )
+        self.assertEqual(status, 201)
+        pizza_id = json.loads(b"".join(chunks))["id"]
+
+        for path, query in (
+            ("/api/v1/pizza/", "limit=5&fields=name,price"),
+            (f"/api/v1/pizza/{pizza_id}", ""),
+            ("/api/v1/pizza/999999", ""),
+            ("/api/v1/pizza/", "limit=0"),
+        ):
+            status, headers, chunks = self.request("GET", path, query)
+            res = self.client.get(path, query_string=query)
+            self.assertEqual(status, res.status_code)
+            self.assertEqual(b"".join(chunks), res.get_data())
+            self.assertEqual(headers.get("etag"), res.headers.get("ETag"))
+
+        etag = self.client.get(f"/api/v1/pizza/{pizza_id}").headers["ETag"]
+        status, _, chunks = self.request(
+            "GET", f"/api/v1/pizza/{pizza_id}", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(status, 304)
+        self.assertEqual(chunks, [])
+
+    def test_request_body_too_large(self):
+        body = json.dumps({"name": "x" * 20000, "price": 20}).encode()
+        status, headers, chunks = self.request(
+            "POST",
+            "/api/v1/pizza/",
+            headers={
+                "Content-Type": "application/json",
+                "Content-Length": str(len(body)),
+            },
+            body=[body],
+        )
+        self.assertEqual(status, 413)
+        self.assertEqual(headers["content-type"], "application/json")
+        self.assertIn("error", json.loads(b"".join(chunks)))
+
+        # Body without Content-Length is not read past limit of endpoint
+        body = [b"x" * 4096 for _ in range(10)]
+        status, _, _ = self.request("POST", "/api/v1/pizza/", body=body)
+        self.assertEqual(status, 413)
+        self.assertEqual(len(body), 5)
+
+        # Bulk endpoint has only global limit
+        status, _, _ = self.request(
+            "POST",
+            "/api/v1/pizza/bulk",
+            headers={"Content-Type": "application/json"},
+            body=json.dumps(
+                {"create": [{"name": "x" * 100, "price": 20}] * 200}
+            ).encode(),
+        )
+        self.assertEqual(status, 200)
+
+    def test_streamed_response(self):
+        for i in range(3):
+            self.client.post(
+                "/api/v1/pizza/", json={"name": f"stream-{i}", "price": "20.00"}
+            )
+
+        status, headers, chunks = self.request(
+            "GET", "/api/v1/pizza/", headers={"Accept": "application/x-ndjson"}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-type"], "application/x-ndjson")
+        self.assertEqual(len(chunks), 3)
+
+    def test_concurrent_requests(self):
+        self.client.post("/api/v1/pizza/", json={"name": "many", "price": "20.00"})
+
+        async def many():
+            return await asyncio.gather(
+                *(
+                    asgi_request(self.asgi_app, "GET", "/api/v1/pizza/", f"limit={i}")
+                    for i in range(1, 51)
+                )
+            )
+
+        responses = asyncio.run(many())
+        self.assertEqual([status for status, _, _ in responses], [200] * 50)
+
+    def test_coalesced_requests(self):
+        self.client.post("/api/v1/pizza/", json={"name": "shared", "price": "20.00"})
+
+        async def many():
+            return await asyncio.gather(
+                *(
+                    asgi_request(self.asgi_app, "GET", "/api/v1/pizza/")
+                    for _ in range(20)
+                )
+            )
+
+        responses = asyncio.run(many())
+        self.assertEqual({status for status, _, _ in responses}, {200})
+        self.assertEqual(len({b"".join(chunks) for _, _, chunks in responses}), 1)
+        # Requests waiting for leader do not block event loop
+        stats = self.asgi_app.wsgi_app.extensions["pizza_coalescing"]["stats"]
+        self.assertGreater(stats["followers"], 0)
+
+    def test_long_poll_changes(self):
+        self.client.post("/api/v1/pizza/", json={"name": "first", "price": "20.00"})
+
+        async def subscribe_and_write():
+            subscribers = [
+                asyncio.ensure_future(
+                    asgi_request(
+                        self.asgi_app, "GET", "/api/v1/pizza/changes", "since=1"
+                    )
+                )
+                for _ in range(20)
+            ]
+            await asyncio.sleep(0.2)
+            # Waiting subscribers do not block event loop
+            await asgi_request(
+                self.asgi_app,
+                "POST",
+                "/api/v1/pizza/",
+                headers={"Content-Type": "application/json"},
+                body=json.dumps({"name": "second", "price": "20.00"}).encode(),
+            )
+            return await asyncio.wait_for(asyncio.gather(*subscribers), 5)
+
+        responses = asyncio.run(subscribe_and_write())
+        self.assertEqual({status for status, _, _ in responses}, {200})
+        tokens = {json.loads(b"".join(chunks))["token"] for _, _, chunks in responses}
+        self.assertEqual(tokens, {2})
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+This is a defitinion of unit tests of circuit breaker
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from sqlalchemy.exc import OperationalError
+from ..app import create_app, db
+from ..config import Local
+from ..models.pizza_model import PizzaModel
+
+
+def database_error(*_args, **_kwargs):
+    """
+    Raise error of unavailable database
+    """
+
+    raise OperationalError("SELECT", {}, Exception("connection refused"))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    """
+    Reads stop touching failing database and are served from snapshot
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(os.environ, {"FLASK_ENV": "local"})
+        cls.env_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app with breaker opening after 2 errors
+        """
+
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = self.create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+        self.client.post("/api/v1/pizza/", json={"name": "margherita", "price": 20})
+
+    def create_app(self, snapshot_file=None):
+        """
+        Create app without response cache, snapshot is saved to
+        snapshot_file on every read
+        """
+
+        with mock.patch.multiple(
+            Local,
+            PIZZA_CACHE_TYPE="null",
+            PIZZA_BREAKER_FAILURES=2,
+            PIZZA_SNAPSHOT_FILE=snapshot_file,
+            PIZZA_SNAPSHOT_SAVE_INTERVAL=0,
+        ):
+            return create_app()
+
+    def expire_reset(self):
+        """
+        Move opening of breaker to the past, next request probes database
+        """
+
+        self.app.extensions["pizza_breaker"]["opened_at"] -= 3600
+
+    def breaker_stats(self):
+        """
+        Return breaker section of /stats
+        """
+
+        return self.client.get("/stats").json["breaker"]
+
+    def test_stale_response_while_open(self):
+        fresh = self.client.get("/api/v1/pizza/")
+        self.assertEqual(fresh.headers["X-Cache"], "MISS")
+
+        with mock.patch.object(
+            PizzaModel, "get_pizzas_page", side_effect=database_error
+        ) as page_mock:
+            for _ in range(3):
+                res = self.client.get("/api/v1/pizza/")
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.data, fresh.data)
+                self.assertEqual(res.headers["X-Cache"], "STALE")
+                self.assertEqual(res.headers["ETag"], fresh.headers["ETag"])
+                self.assertIn("Age", res.headers)
+            # Third request did not touch database
+            self.assertEqual(page_mock.call_count, 2)
+
+            res = self.client.get(
+                "/api/v1/pizza/", headers={"If-None-Match": fresh.headers["ETag"]}
+            )
+            self.assertEqual(res.status_code, 304)
+
+            # Nothing to serve from snapshot
+            res = self.client.get("/api/v1/pizza/1")
+            self.assertEqual(res.status_code, 503)
+            self.assertEqual(res.headers["Retry-After"], "10")
+
+        self.assertEqual(
+            self.breaker_stats(),
+            {
+                "state": "open",
+                "failures": 2,
+                "snapshot": 1,
+                "opened": 1,
+                "rejected": 3,
+                "stale": 4,
+                "unavailable": 1,
+            },
+        )
+
+        # Writes are not guarded
+        res = self.client.patch("/api/v1/pizza/1", json={"price": 25})
+        self.assertEqual(res.status_code, 200)
+
+    def test_half_open_probe(self):
+        with mock.patch.object(
+            PizzaModel, "get_pizza_by_id", side_effect=database_error
+        ) as item_mock:
+            for _ in range(2):
+                self.assertEqual(self.client.get("/api/v1/pizza/1").status_code, 503)
+            self.expire_reset()
+            # Failed probe opens breaker again
+            self.assertEqual(self.client.get("/api/v1/pizza/1").status_code, 503)
+            self.assertEqual(self.client.get("/api/v1/pizza/1").status_code, 503)
+            self.assertEqual(item_mock.call_count, 3)
+        self.assertEqual(self.breaker_stats()["state"], "open")
+
+        res = self.client.get("/api/v1/pizza/1")
+        self.assertEqual(res.status_code, 503)
+        self.expire_reset()
+        res = self.client.get("/api/v1/pizza/1")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers["X-Cache"], "MISS")
+        self.assertEqual(self.breaker_stats()["state"], "closed")
+
+    def test_other_errors_do_not_open_breaker(self):
+        with mock.patch.object(
+            PizzaModel, "get_pizza_by_id", side_effect=ValueError("bug")
+        ):
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    self.client.get("/api/v1/pizza/1")
+        self.assertEqual(self.breaker_stats()["state"], "closed")
+
+        self.app.config["PIZZA_BREAKER"] = False
+        with mock.patch.object(
+            PizzaModel, "get_pizza_by_id", side_effect=database_error
+        ):
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    self.client.get("/api/v1/pizza/1")
+        self.assertEqual(self.breaker_stats()["failures"], 0)
+
+    def test_snapshot_file(self):
+        snapshot_file = os.path.join(self.tmp_dir.name, "snapshot.json")
+        app = self.create_app(snapshot_file)
+        fresh = app.test_client().get("/api/v1/pizza/1")
+        self.assertTrue(os.path.exists(snapshot_file))
+
+        # Restarted worker serves snapshot of previous one
+        restarted = self.create_app(snapshot_file)
+        with mock.patch.object(
+            PizzaModel, "get_pizza_by_id", side_effect=database_error
+        ):
+            res = restarted.test_client().get("/api/v1/pizza/1")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers["X-Cache"], "STALE")
+        self.assertEqual(res.data, fresh.data)
+
+        # Snapshot older than max age is not served
+        restarted.config["PIZZA_SNAPSHOT_MAX_AGE"] = -1
+        with mock.patch.object(
+            PizzaModel, "get_pizza_by_id", side_effect=database_error
+        ):
+            res = restarted.test_client().get("/api/v1/pizza/1")
+        self.assertEqual(res.status_code, 503)
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        self.tmp_dir.cleanup()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
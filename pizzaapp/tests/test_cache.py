@@ -0,0 +1,67 @@
+"""
+This is a defitinion of unit tests of cache backends
+"""
+
+import time
+import unittest
+from ..shared.cache import LRUCache, LocalRedis, RedisCache, pack, unpack
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    """
+    In-process LRU cache
+    """
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_entries=2, ttl=60)
+        lru.set("a", b"1")
+        lru.set("b", b"2")
+        lru.get("a")
+        lru.set("c", b"3")
+        self.assertEqual(lru.get("a"), b"1")
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), b"3")
+
+    def test_expires_entries(self):
+        lru = LRUCache(max_entries=2, ttl=0.01)
+        lru.set("a", b"1")
+        time.sleep(0.02)
+        self.assertIsNone(lru.get("a"))
+
+    def test_incr(self):
+        lru = LRUCache()
+        self.assertEqual(lru.incr("gen"), 1)
+        self.assertEqual(lru.incr("gen"), 2)
+
+    def test_add(self):
+        for store in (LRUCache(ttl=0.01), RedisCache(LocalRedis(), ttl=0.01)):
+            self.assertTrue(store.add("a", b"1"))
+            self.assertFalse(store.add("a", b"2"))
+            self.assertEqual(store.get("a"), b"1")
+            # Expired key can be added again
+            time.sleep(0.02)
+            self.assertTrue(store.add("a", b"3"))
+
+
+class RedisCacheTest(unittest.TestCase):
+
+    """
+    Shared cache with local stand-in of redis
+    """
+
+    def test_set_get_delete(self):
+        shared = RedisCache(LocalRedis(), ttl=60)
+        shared.set("a", b"1")
+        self.assertEqual(shared.get("a"), b"1")
+        shared.delete("a")
+        self.assertIsNone(shared.get("a"))
+        self.assertEqual(shared.incr("gen"), 1)
+
+    def test_pack_unpack(self):
+        value = pack(b'{"id": 1}', {"Link": "<x>"})
+        self.assertEqual(unpack(value), (b'{"id": 1}', {"Link": "<x>"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
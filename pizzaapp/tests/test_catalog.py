@@ -0,0 +1,158 @@
+"""
+This is a defitinion of unit tests of catalog import and export
+"""
+
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+from ..app import create_app, db
+from ..models.change_model import PizzaChangeModel
+
+
+class CatalogTest(unittest.TestCase):
+
+    """
+    Pizzas are imported from and exported to CSV and NDJSON files
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(
+            os.environ, {"FLASK_ENV": "local", "FLASK_CACHE_TYPE": "null"}
+        )
+        cls.env_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app and directory of catalog files
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.client = self.app.test_client()
+        self.runner = self.app.test_cli_runner()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        with self.app.app_context():
+            db.create_all()
+
+    def write_file(self, name, content):
+        """
+        Write catalog file, return its path
+        """
+
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "w", encoding="utf-8") as output:
+            output.write(content)
+        return path
+
+    def pizzas(self):
+        """
+        Return (name, price, ingredients) of all pizzas
+        """
+
+        return sorted(
+            (pizza["name"], pizza["price"], tuple(pizza["ingredients"]))
+            for pizza in self.client.get("/api/v1/pizza/").json
+        )
+
+    def test_import_csv(self):
+        self.client.post("/api/v1/pizza/", json={"name": "marinara", "price": 10})
+        path = self.write_file(
+            "menu.csv",
+            "name,price,ingredients\n"
+            "margherita,20,tomato;mozzarella\n"
+            "marinara,15.5,tomato; garlic\n"
+            ",10,\n"
+            "capricciosa,cheap,\n"
+            "margherita,21,tomato;mozzarella;basil\n",
+        )
+
+        res = self.runner.invoke(args=["pizza", "import", path, "--chunk-size", "2"])
+        self.assertEqual(res.exit_code, 0, res.output)
+        self.assertIn("Imported 3 of 5 rows (2 rejected)", res.output)
+        self.assertIn("rows/s", res.output)
+        self.assertIn("Rejected line 4: {'name':", res.output)
+        self.assertIn("Rejected line 5: {'price':", res.output)
+
+        # Existing pizza is updated by name, last row of name wins
+        self.assertEqual(
+            self.pizzas(),
+            [
+                ("margherita", 21.0, ("basil", "mozzarella", "tomato")),
+                ("marinara", 15.5, ("garlic", "tomato")),
+            ],
+        )
+        with self.app.app_context():
+            self.assertEqual(PizzaChangeModel.get_token_range()[1], 4)
+
+    def test_import_ndjson(self):
+        path = self.write_file(
+            "menu.ndjson",
+            '{"name": "margherita", "price": 20}\n'
+            "\n"
+            "{not json\n"
+            '{"name": "marinara", "price": "15.5", "secret": true}\n',
+        )
+
+        res = self.runner.invoke(args=["pizza", "import", path])
+        self.assertEqual(res.exit_code, 0, res.output)
+        self.assertIn("Imported 1 of 3 rows (2 rejected)", res.output)
+        self.assertIn("Rejected line 3: ['Invalid JSON']", res.output)
+        self.assertEqual(self.pizzas(), [("margherita", 20.0, ())])
+
+        res = self.runner.invoke(args=["pizza", "import", path + ".txt"])
+        self.assertNotEqual(res.exit_code, 0)
+
+    def test_export_and_import_again(self):
+        self.client.post(
+            "/api/v1/pizza/bulk",
+            json={
+                "create": [
+                    {"name": f"pizza-{i}", "price": 20 + i, "ingredients": ["tomato"]}
+                    for i in range(5)
+                ]
+            },
+        )
+        pizzas = self.pizzas()
+
+        res = self.runner.invoke(args=["pizza", "export", "--chunk-size", "2"])
+        self.assertEqual(res.exit_code, 0, res.output)
+        lines = [json.loads(line) for line in res.stdout.splitlines()]
+        self.assertEqual(lines, self.client.get("/api/v1/pizza/").json)
+        self.assertIn("Exported 5 rows", res.stderr)
+
+        for name in ("menu.csv", "menu.ndjson"):
+            path = os.path.join(self.tmp_dir.name, name)
+            res = self.runner.invoke(args=["pizza", "export", path])
+            self.assertEqual(res.exit_code, 0, res.output)
+            with self.app.app_context():
+                db.drop_all()
+                db.create_all()
+            res = self.runner.invoke(args=["pizza", "import", path])
+            self.assertIn("Imported 5 of 5 rows (0 rejected)", res.output)
+            self.assertEqual(self.pizzas(), pizzas)
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        self.tmp_dir.cleanup()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
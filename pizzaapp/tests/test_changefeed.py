@@ -0,0 +1,248 @@
+"""
+This is a defitinion of unit tests of change feed
+"""
+
+import os
+import json
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from ..app import create_app, db
+from ..models.change_model import PizzaChangeModel
+
+
+class ChangeFeedTest(unittest.TestCase):
+
+    """
+    Writes are delivered to long-poll and event stream subscribers
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(
+            os.environ, {"FLASK_ENV": "local", "FLASK_CACHE_TYPE": "null"}
+        )
+        cls.env_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app polling change log often
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.app.config["PIZZA_CHANGES_POLL_INTERVAL"] = 0.05
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+    def changes(self, **args):
+        """
+        Long-poll changes
+        """
+
+        res = self.client.get("/api/v1/pizza/changes", query_string=args)
+        self.assertEqual(res.status_code, 200)
+        return res.json
+
+    def test_changes_since_token(self):
+        self.assertEqual(self.changes(timeout=0), {"changes": [], "token": 0})
+
+        pizza_id = self.client.post(
+            "/api/v1/pizza/", json={"name": "margherita", "price": 20}
+        ).json["id"]
+        self.client.patch(
+            f"/api/v1/pizza/{pizza_id}", json={"name": "margherita", "price": 25}
+        )
+        self.client.post(
+            "/api/v1/pizza/bulk",
+            json={"create": [{"name": "capricciosa", "price": 30}]},
+        )
+        self.client.delete(f"/api/v1/pizza/{pizza_id}")
+
+        # Subscriber resumes from token of last response
+        changes, token = [], 0
+        while token < 4:
+            res = self.changes(since=token, timeout=5)
+            changes.extend(res["changes"])
+            token = res["token"]
+        self.assertEqual(token, 4)
+        self.assertEqual(
+            [(change["op"], change["id"]) for change in changes],
+            [
+                ("upsert", pizza_id),
+                ("upsert", pizza_id),
+                ("upsert", pizza_id + 1),
+                ("delete", pizza_id),
+            ],
+        )
+        # Change carries pizza as it was after the write
+        self.assertEqual(changes[1]["pizza"]["price"], 25)
+        self.assertEqual(
+            changes[2]["pizza"],
+            self.client.get(f"/api/v1/pizza/{pizza_id + 1}").json,
+        )
+        self.assertIsNone(changes[3]["pizza"])
+
+        self.assertEqual(self.changes(since=2)["changes"], changes[2:])
+        # Subscriber without token starts from latest change
+        self.assertEqual(self.changes(timeout=0), {"changes": [], "token": 4})
+
+    def test_long_poll_woken_by_write(self):
+        self.client.post("/api/v1/pizza/", json={"name": "first", "price": 20})
+        self.app.config["PIZZA_CHANGES_POLL_INTERVAL"] = 10
+        self.app.config["PIZZA_CHANGES_MAX_SUBSCRIBERS"] = 5
+        responses = []
+
+        def subscribe():
+            responses.append(
+                self.app.test_client().get("/api/v1/pizza/changes?since=1&timeout=10")
+            )
+
+        subscribers = [threading.Thread(target=subscribe) for _ in range(5)]
+        for subscriber in subscribers:
+            subscriber.start()
+        deadline = time.monotonic() + 5
+        while self.client.get("/stats").json["changes"]["subscribers"] < 5:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        log_reads = self.client.get("/stats").json["changes"]["log_reads"]
+
+        # Write of the same process wakes subscribers before poll is due
+        started = time.monotonic()
+        self.client.post("/api/v1/pizza/", json={"name": "second", "price": 20})
+        for subscriber in subscribers:
+            subscriber.join()
+        self.assertLess(time.monotonic() - started, 5)
+
+        self.assertEqual({res.json["token"] for res in responses}, {2})
+        self.assertEqual({len(res.json["changes"]) for res in responses}, {1})
+        # Subscribers were served from memory, not each from change log
+        self.assertEqual(
+            self.client.get("/stats").json["changes"]["log_reads"], log_reads
+        )
+
+    def test_event_stream(self):
+        self.app.config["PIZZA_CHANGES_STREAM_SECONDS"] = 0.2
+        self.client.post("/api/v1/pizza/", json={"name": "first", "price": 20})
+        self.client.post("/api/v1/pizza/", json={"name": "second", "price": 20})
+
+        res = self.client.get(
+            "/api/v1/pizza/changes",
+            headers={"Accept": "text/event-stream", "Last-Event-ID": "1"},
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, "text/event-stream")
+        self.assertEqual(res.headers["Cache-Control"], "no-store")
+        self.assertNotIn("Content-Encoding", res.headers)
+
+        events = res.get_data(as_text=True).split("\n\n")
+        self.assertEqual(events[0], "retry: 1000")
+        event_id, data = events[1].split("\n")
+        self.assertEqual(event_id, "id: 2")
+        self.assertEqual(json.loads(data[len("data: ") :])["pizza"]["name"], "second")
+        self.assertIn(": keep-alive", events[2:])
+
+    def test_subscribers_limited(self):
+        self.app.config["PIZZA_CHANGES_MAX_SUBSCRIBERS"] = 1
+        self.app.config["PIZZA_CHANGES_STREAM_SECONDS"] = 0.5
+        waiting = threading.Thread(
+            target=self.app.test_client().get,
+            args=("/api/v1/pizza/changes?timeout=10",),
+        )
+        started = time.monotonic()
+        waiting.start()
+        deadline = started + 5
+        while self.client.get("/stats").json["changes"]["held"] < 1:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        res = self.client.get("/api/v1/pizza/changes?timeout=0")
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers["Retry-After"], "5")
+        self.assertIn("error", res.json)
+
+        # Long-poll holds thread only for stream seconds, not timeout
+        waiting.join()
+        self.assertLess(time.monotonic() - started, 5)
+
+        # Slot of event stream is released when it is closed
+        stream = self.client.get(
+            "/api/v1/pizza/changes",
+            headers={"Accept": "text/event-stream"},
+            buffered=False,
+        )
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/changes?timeout=0").status_code, 503
+        )
+        stream.close()
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/changes?timeout=0").status_code, 200
+        )
+        self.assertEqual(self.client.get("/stats").json["changes"]["busy"], 2)
+
+    def test_invalid_and_expired_token(self):
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/changes?since=x").status_code, 400
+        )
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/changes?timeout=3600").status_code, 400
+        )
+
+        for i in range(3):
+            self.client.post("/api/v1/pizza/", json={"name": f"old-{i}", "price": 20})
+        with self.app.app_context():
+            # Latest change is kept
+            pruned = PizzaChangeModel.prune(
+                datetime.now(timezone.utc) + timedelta(seconds=1)
+            )
+        self.assertEqual(pruned, 2)
+
+        res = self.client.get("/api/v1/pizza/changes?since=1&timeout=0")
+        self.assertEqual(res.status_code, 410)
+        self.assertIn("error", res.json)
+        self.assertEqual(len(self.changes(since=2, timeout=0)["changes"]), 1)
+
+    def test_changes_written_on_commit(self):
+        with self.app.app_context():
+            PizzaChangeModel.record("upsert", [(1, "{}")])
+            # Log is written (and locked on Postgres) only by commit
+            self.assertEqual(PizzaChangeModel.get_token_range(), (None, None))
+            db.session.rollback()
+            db.session.commit()
+            self.assertEqual(PizzaChangeModel.get_token_range(), (None, None))
+
+            PizzaChangeModel.record("upsert", [(1, "{}")])
+            PizzaChangeModel.record("delete", [(1, None), (2, None)])
+            db.session.commit()
+            changes = PizzaChangeModel.get_changes(0, 10)
+        self.assertEqual(
+            [(change.id, change.op, change.pizza_id) for change in changes],
+            [(1, "upsert", 1), (2, "delete", 1), (3, "delete", 2)],
+        )
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+This is a defitinion of unit tests of response compression and caching
+headers
+"""
+
+import gzip
+import json
+import os
+import unittest
+from unittest import mock
+import brotli
+import zstandard
+from ..app import create_app, db
+
+DECODERS = {
+    "br": brotli.decompress,
+    "zstd": zstandard.decompress,
+    "gzip": gzip.decompress,
+}
+
+
+class CompressionTest(unittest.TestCase):
+
+    """
+    Pizzas with long names make list large enough to be compressed
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(os.environ, {"FLASK_ENV": "local"})
+        cls.env_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app with pizzas
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+        self.client.post(
+            "/api/v1/pizza/bulk",
+            json={
+                "create": [
+                    {"name": f"pizza {i} " + "x" * 50, "price": 10} for i in range(50)
+                ]
+            },
+        )
+
+    def test_negotiated_encodings(self):
+        plain = self.client.get("/api/v1/pizza/")
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertIn("Accept-Encoding", plain.headers["Vary"])
+
+        for accept, encoding in (
+            ("gzip, br, zstd", "br"),
+            ("gzip, zstd", "zstd"),
+            ("gzip;q=1, br;q=0.5", "gzip"),
+            ("br;q=0, *", "zstd"),
+        ):
+            res = self.client.get("/api/v1/pizza/", headers={"Accept-Encoding": accept})
+            self.assertEqual(res.headers["Content-Encoding"], encoding)
+            self.assertEqual(res.headers["Content-Length"], str(len(res.data)))
+            self.assertLess(len(res.data), len(plain.data))
+            self.assertEqual(DECODERS[encoding](res.data), plain.data)
+
+        res = self.client.get("/api/v1/pizza/", headers={"Accept-Encoding": "deflate"})
+        self.assertEqual(res.data, plain.data)
+
+    def test_small_responses_are_not_compressed(self):
+        res = self.client.get("/api/v1/pizza/1", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", res.headers)
+        self.assertIn("Accept-Encoding", res.headers["Vary"])
+
+        self.app.config["PIZZA_COMPRESSION_MIN_SIZE"] = 0
+        res = self.client.get("/api/v1/pizza/1", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(res.headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(res.data))["id"], 1)
+
+    def test_variants_are_cached(self):
+        headers = {"Accept-Encoding": "br"}
+        res_one = self.client.get("/api/v1/pizza/", headers=headers)
+        res_two = self.client.get("/api/v1/pizza/", headers=headers)
+        self.assertEqual(res_two.headers["X-Cache"], "HIT")
+        self.assertEqual(res_one.data, res_two.data)
+
+        stats = self.client.get("/stats").json["cache"]
+        self.assertEqual(stats["variant_misses"], 1)
+        self.assertEqual(stats["variant_hits"], 1)
+
+    def test_weak_etag_of_compressed_response(self):
+        self.app.config["PIZZA_COMPRESSION_MIN_SIZE"] = 0
+        headers = {"Accept-Encoding": "gzip"}
+        res_one = self.client.get("/api/v1/pizza/1", headers=headers)
+        etag = res_one.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        res_two = self.client.get(
+            "/api/v1/pizza/1", headers={**headers, "If-None-Match": etag}
+        )
+        self.assertEqual(res_two.status_code, 304)
+
+        res_three = self.client.patch(
+            "/api/v1/pizza/1",
+            json={"name": "renamed", "price": 11},
+            headers={"If-Match": etag},
+        )
+        self.assertEqual(res_three.status_code, 200)
+
+    def test_cache_control(self):
+        res_one = self.client.get("/api/v1/pizza/")
+        self.assertEqual(res_one.headers["Cache-Control"], "public, no-cache")
+        self.assertIn("Accept", res_one.headers["Vary"])
+
+        res_two = self.client.get(
+            "/api/v1/pizza/", headers={"If-None-Match": res_one.headers["ETag"]}
+        )
+        self.assertEqual(res_two.status_code, 304)
+        self.assertEqual(res_two.headers["Cache-Control"], "public, no-cache")
+
+        res_three = self.client.get("/api/v1/pizza/search?q=pizza")
+        self.assertEqual(res_three.headers["Cache-Control"], "public, max-age=5")
+
+        res_four = self.client.get("/api/v1/pizza/1000")
+        self.assertNotIn("Cache-Control", res_four.headers)
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
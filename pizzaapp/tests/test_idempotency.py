@@ -0,0 +1,148 @@
+"""
+This is a defitinion of unit tests of idempotent writes
+"""
+
+import os
+import unittest
+from unittest import mock
+from ..app import create_app, db
+from ..config import Local
+from ..models.pizza_model import PizzaModel
+
+
+class IdempotencyTest(unittest.TestCase):
+
+    """
+    Retries sent with the same Idempotency-Key get stored response
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(
+            os.environ, {"FLASK_ENV": "local", "FLASK_CACHE_TYPE": "null"}
+        )
+        cls.env_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app
+        """
+
+        super().setUp()
+        with mock.patch.object(Local, "PIZZA_RATE_LIMIT_API_KEYS", ("other",)):
+            self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+    def create(self, key, name="margherita", **kwargs):
+        """
+        Create pizza with idempotency key
+        """
+
+        return self.client.post(
+            "/api/v1/pizza/",
+            json={"name": name, "price": 20},
+            headers={"Idempotency-Key": key, **kwargs.pop("headers", {})},
+            **kwargs,
+        )
+
+    def test_replayed_create(self):
+        res = self.create("retry-1")
+        self.assertEqual(res.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", res.headers)
+
+        with mock.patch.object(PizzaModel, "save") as save:
+            retry = self.create("retry-1")
+        save.assert_not_called()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json, res.json)
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+
+        # Other key and other client (API key) are processed
+        self.assertEqual(self.create("retry-2").status_code, 400)
+        res = self.create("retry-1", headers={"X-API-Key": "other"})
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(len(self.client.get("/api/v1/pizza/").json), 1)
+        self.assertEqual(
+            self.client.get("/stats").json["idempotency"],
+            {"stored": 3, "replayed": 1, "rejected": 0},
+        )
+
+    def test_replayed_update(self):
+        pizza_id = self.create("create").json["id"]
+        headers = {"Idempotency-Key": "update"}
+        payload = {"name": "margherita", "price": 25}
+        res = self.client.patch(
+            f"/api/v1/pizza/{pizza_id}", json=payload, headers=headers
+        )
+        self.assertEqual(res.status_code, 200)
+
+        with mock.patch.object(PizzaModel, "get_pizza_by_id") as get_pizza:
+            retry = self.client.patch(
+                f"/api/v1/pizza/{pizza_id}", json=payload, headers=headers
+            )
+        get_pizza.assert_not_called()
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.headers["ETag"], res.headers["ETag"])
+
+        # Key can't be reused for different request
+        res = self.client.patch(
+            f"/api/v1/pizza/{pizza_id}", json={**payload, "price": 30}, headers=headers
+        )
+        self.assertEqual(res.status_code, 422)
+
+    def test_request_in_progress(self):
+        save = PizzaModel.save
+        retries = []
+
+        def save_with_retry(pizza):
+            # Client retries while first request is still processed
+            retries.append(self.create("slow"))
+            save(pizza)
+
+        with mock.patch.object(PizzaModel, "save", save_with_retry):
+            self.assertEqual(self.create("slow").status_code, 201)
+        self.assertEqual(retries[0].status_code, 409)
+        self.assertEqual(retries[0].headers["Retry-After"], "1")
+
+    def test_failed_request_is_not_stored(self):
+        with mock.patch.object(PizzaModel, "save", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.create("failed")
+        self.assertEqual(self.create("failed").status_code, 201)
+
+        self.assertEqual(self.create("x" * 256).status_code, 400)
+
+    def test_redis_storage(self):
+        with mock.patch.multiple(
+            Local,
+            PIZZA_IDEMPOTENCY_STORAGE="redis",
+            PIZZA_IDEMPOTENCY_REDIS_URL="memory://",
+        ):
+            self.client = create_app().test_client()
+        first, retry = self.create("shared"), self.create("shared")
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
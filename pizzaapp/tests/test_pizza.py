@@ -6,8 +6,12 @@ import re
 import os
 import json
 import unittest
+from datetime import datetime
 from unittest import mock
+from sqlalchemy import event
 from ..app import create_app, db
+from ..models.pizza_model import PizzaModel
+from ..shared.cache import cache
 
 
 class PizzaTest(unittest.TestCase):
@@ -58,6 +62,15 @@ class PizzaTest(unittest.TestCase):
         )
         self.assertEqual(title.group(1), "Welcome page - PizzaApp")
 
+    def test_serve_only_app(self):
+        self.assertIn("migrate", self.app.extensions)
+
+        app = create_app(serve_only=True)
+        self.assertNotIn("migrate", app.extensions)
+        client = app.test_client()
+        self.assertEqual(client.get("/").data, client.get("/index").data)
+        self.assertEqual(client.get("/api/v1/pizza/").status_code, 404)
+
     def test_check_banner_visibility(self):
         res_one = self.client.get("/")
         is_banner_visible = bool(
@@ -216,6 +229,51 @@ class PizzaTest(unittest.TestCase):
         )
         self.assertEqual(res_two.status_code, 400)
 
+    def test_update_pizza_partial(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.patch(
+            f"/api/v1/pizza/{created_pizza_id}", json={"price": "25.12"}
+        )
+        self.assertEqual(res_one.status_code, 200)
+        res_two = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        self.assertEqual(
+            (res_two.json["name"], res_two.json["price"]), ("test-pizza", 25.12)
+        )
+
+        res_three = self.client.patch(f"/api/v1/pizza/{created_pizza_id}", json={})
+        self.assertEqual(res_three.status_code, 400)
+        res_four = self.client.patch(
+            f"/api/v1/pizza/{created_pizza_id}", json={"price": 0}
+        )
+        self.assertEqual(res_four.status_code, 400)
+
+    def test_request_body_too_large(self):
+        res_one = self.client.post(
+            "/api/v1/pizza/",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps({"name": "x" * 20000, "price": "22.83"}),
+        )
+        self.assertEqual(res_one.status_code, 413)
+        self.assertIn("error", res_one.json)
+
+        # Bulk endpoint has higher limit
+        res_two = self.client.post(
+            "/api/v1/pizza/bulk",
+            json={
+                "create": [{"name": f"pizza-{i:05d}", "price": 20} for i in range(1000)]
+            },
+        )
+        self.assertEqual(res_two.status_code, 200)
+        self.app.config["MAX_CONTENT_LENGTH"] = 1024
+        res_three = self.client.post(
+            "/api/v1/pizza/bulk",
+            json={
+                "create": [{"name": f"pizza-{i:05d}", "price": 20} for i in range(1000)]
+            },
+        )
+        self.assertEqual(res_three.status_code, 413)
+
     def test_delete_pizza(self):
         res_one = self.client.post(
             "/api/v1/pizza/",
@@ -240,6 +298,559 @@ class PizzaTest(unittest.TestCase):
         )
         self.assertEqual(res_two.status_code, 404)
 
+    def _create_pizza(self, name, price):
+        res = self.client.post(
+            "/api/v1/pizza/",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps({"name": name, "price": price}),
+        )
+        self.assertEqual(res.status_code, 201)
+        return res.json.get("id")
+
+    def test_get_all_pizzas_pagination(self):
+        for i in range(5):
+            self._create_pizza(f"test-pizza-{i}", 20 + i)
+
+        res_one = self.client.get("/api/v1/pizza/?limit=2")
+        self.assertEqual(res_one.status_code, 200)
+        self.assertEqual(len(res_one.json), 2)
+        self.assertIn('rel="next"', res_one.headers["Link"])
+
+        names = [p["name"] for p in res_one.json]
+        next_url = res_one.headers["Link"][1:].split(">")[0]
+        while next_url:
+            res_next = self.client.get(next_url)
+            self.assertEqual(res_next.status_code, 200)
+            names.extend(p["name"] for p in res_next.json)
+            link = res_next.headers.get("Link")
+            next_url = link[1:].split(">")[0] if link else None
+        self.assertEqual(names, [f"test-pizza-{i}" for i in range(5)])
+
+    def test_get_all_pizzas_invalid_limit(self):
+        res_one = self.client.get("/api/v1/pizza/?limit=100000")
+        self.assertEqual(res_one.status_code, 400)
+
+        res_two = self.client.get("/api/v1/pizza/?cursor=abc")
+        self.assertEqual(res_two.status_code, 400)
+
+    def test_get_all_pizzas_fields(self):
+        self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.get("/api/v1/pizza/?fields=name,price")
+        self.assertEqual(res_one.status_code, 200)
+        self.assertEqual(res_one.json, [{"name": "test-pizza", "price": 22.83}])
+
+        res_two = self.client.get("/api/v1/pizza/?fields=name,secret")
+        self.assertEqual(res_two.status_code, 400)
+
+    def test_get_all_pizzas_filters(self):
+        self._create_pizza("margherita", 20)
+        self._create_pizza("marinara", 25)
+        self._create_pizza("capricciosa", 30)
+
+        res_one = self.client.get("/api/v1/pizza/?name_prefix=mar&max_price=22")
+        self.assertEqual([p["name"] for p in res_one.json], ["margherita"])
+
+        res_two = self.client.get("/api/v1/pizza/?min_price=24")
+        self.assertEqual([p["name"] for p in res_two.json], ["marinara", "capricciosa"])
+
+        res_three = self.client.get("/api/v1/pizza/?modified_since=2999-01-01T00:00:00")
+        self.assertEqual(res_three.status_code, 404)
+
+        res_four = self.client.get("/api/v1/pizza/?min_price=cheap")
+        self.assertEqual(res_four.status_code, 400)
+
+    def test_export_pizzas_ndjson(self):
+        for i in range(3):
+            self._create_pizza(f"test-pizza-{i}", 20 + i)
+
+        res_one = self.client.get(
+            "/api/v1/pizza/?limit=1&fields=name",
+            headers={"Accept": "application/x-ndjson"},
+        )
+        self.assertEqual(res_one.status_code, 200)
+        self.assertEqual(res_one.mimetype, "application/x-ndjson")
+        lines = res_one.get_data(as_text=True).splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{"name": f"test-pizza-{i}"} for i in range(3)],
+        )
+
+    def test_pizza_ingredients(self):
+        res_one = self.client.post(
+            "/api/v1/pizza/",
+            json={
+                "name": "margherita",
+                "price": 20,
+                "ingredients": ["tomato", "mozzarella", "tomato"],
+            },
+        )
+        self.assertEqual(res_one.status_code, 201)
+        pizza_id = res_one.json["id"]
+        self._create_pizza("marinara", 15)
+        self.client.post(
+            "/api/v1/pizza/bulk",
+            json={
+                "create": [
+                    {"name": "capricciosa", "price": 30, "ingredients": ["tomato"]}
+                ],
+                "update": [
+                    {
+                        "id": pizza_id + 1,
+                        "name": "marinara",
+                        "price": 15,
+                        "ingredients": ["tomato", "garlic"],
+                    }
+                ],
+            },
+        )
+
+        res_two = self.client.get(f"/api/v1/pizza/{pizza_id}")
+        self.assertEqual(res_two.json["ingredients"], ["mozzarella", "tomato"])
+        res_three = self.client.get("/api/v1/pizza/?ingredient=tomato")
+        self.assertEqual(
+            [(p["name"], p["ingredients"]) for p in res_three.json],
+            [
+                ("margherita", ["mozzarella", "tomato"]),
+                ("marinara", ["garlic", "tomato"]),
+                ("capricciosa", ["tomato"]),
+            ],
+        )
+        res_four = self.client.get(
+            "/api/v1/pizza/?ingredient=tomato&ingredient=garlic&fields=ingredients"
+        )
+        self.assertEqual(res_four.json, [{"ingredients": ["garlic", "tomato"]}])
+        self.assertEqual(self.client.get("/api/v1/pizza/?ingredient=").status_code, 400)
+
+        # Ingredients are kept unless given, replaced otherwise
+        payload = {"name": "margherita", "price": 21}
+        self.client.patch(f"/api/v1/pizza/{pizza_id}", json=payload)
+        res_five = self.client.get(f"/api/v1/pizza/{pizza_id}")
+        self.assertEqual(res_five.json["ingredients"], ["mozzarella", "tomato"])
+        payload["ingredients"] = ["basil"]
+        self.client.patch(f"/api/v1/pizza/{pizza_id}", json=payload)
+        res_six = self.client.get(f"/api/v1/pizza/{pizza_id}")
+        self.assertEqual(res_six.json["ingredients"], ["basil"])
+
+        self.client.delete(f"/api/v1/pizza/{pizza_id}")
+        res_seven = self.client.get("/api/v1/pizza/?ingredient=basil")
+        self.assertEqual(res_seven.status_code, 404)
+
+    def test_list_ingredients_query_count(self):
+        statements = []
+
+        def count_statement(*_):
+            statements.append(1)
+
+        with self.app.app_context():
+            engine = db.engine
+        for pizzas in (2, 40):
+            for i in range(pizzas):
+                self.client.post(
+                    "/api/v1/pizza/",
+                    json={
+                        "name": f"pizza-{pizzas}-{i}",
+                        "price": 20,
+                        "ingredients": [f"i{i}"],
+                    },
+                )
+            event.listen(engine, "before_cursor_execute", count_statement)
+            try:
+                res = self.client.get("/api/v1/pizza/?limit=100")
+            finally:
+                event.remove(engine, "before_cursor_execute", count_statement)
+            self.assertTrue(all(p["ingredients"] for p in res.json))
+            # Version, page and ingredients of whole page
+            self.assertEqual(len(statements), 3)
+            statements.clear()
+
+    def test_cache_single_pizza(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        self.assertEqual(res_one.headers["X-Cache"], "MISS")
+        res_two = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        self.assertEqual(res_two.headers["X-Cache"], "HIT")
+        self.assertEqual(res_two.json, res_one.json)
+
+        self.client.patch(
+            f"/api/v1/pizza/{created_pizza_id}",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps({"name": "modified-test-pizza", "price": "25.12"}),
+        )
+        res_three = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        self.assertEqual(res_three.headers["X-Cache"], "MISS")
+        self.assertEqual(res_three.json.get("name"), "modified-test-pizza")
+
+        self.client.delete(f"/api/v1/pizza/{created_pizza_id}")
+        res_four = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        self.assertEqual(res_four.status_code, 404)
+
+    def test_cache_pizza_list(self):
+        self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.get("/api/v1/pizza/?limit=10")
+        self.assertEqual(res_one.headers["X-Cache"], "MISS")
+        res_two = self.client.get("/api/v1/pizza/?limit=10")
+        self.assertEqual(res_two.headers["X-Cache"], "HIT")
+
+        self._create_pizza("next-test-pizza", "29.99")
+        res_three = self.client.get("/api/v1/pizza/?limit=10")
+        self.assertEqual(res_three.headers["X-Cache"], "MISS")
+        self.assertEqual(len(res_three.json), 2)
+
+        stats = self.client.get("/stats").json["cache"]
+        self.assertEqual(stats["list_hits"], 1)
+        self.assertEqual(stats["list_misses"], 2)
+
+    def test_cache_skips_response_read_before_write(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+
+        def read_then_write(read):
+            # Concurrent write commits and invalidates cache after rows
+            # were read, before response is stored
+            def side_effect(*args, **kwargs):
+                result = read(*args, **kwargs)
+                cache.invalidate(created_pizza_id)
+                return result
+
+            return side_effect
+
+        for method, path in (
+            ("get_pizza_by_id", f"/api/v1/pizza/{created_pizza_id}"),
+            ("get_pizzas_page", "/api/v1/pizza/"),
+        ):
+            with self.subTest(path=path):
+                read = getattr(PizzaModel, method)
+                with mock.patch.object(
+                    PizzaModel, method, side_effect=read_then_write(read)
+                ):
+                    res_one = self.client.get(path)
+                self.assertEqual(res_one.headers["X-Cache"], "MISS")
+                res_two = self.client.get(path)
+                self.assertEqual(res_two.headers["X-Cache"], "MISS")
+                self.assertEqual(self.client.get(path).headers["X-Cache"], "HIT")
+
+    def test_conditional_get_single_pizza(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        etag = res_one.headers["ETag"]
+        self.assertIn("Last-Modified", res_one.headers)
+
+        res_two = self.client.get(
+            f"/api/v1/pizza/{created_pizza_id}", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(res_two.status_code, 304)
+
+        # Version is read from database when response is not cached
+        self.app.extensions["pizza_cache"]["backend"].delete(
+            f"pizza:item:{created_pizza_id}"
+        )
+        res_three = self.client.get(
+            f"/api/v1/pizza/{created_pizza_id}",
+            headers={"If-Modified-Since": res_one.headers["Last-Modified"]},
+        )
+        self.assertEqual(res_three.status_code, 304)
+
+    def test_conditional_get_all_pizzas(self):
+        self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.get("/api/v1/pizza/")
+        etag = res_one.headers["ETag"]
+        res_two = self.client.get("/api/v1/pizza/", headers={"If-None-Match": etag})
+        self.assertEqual(res_two.status_code, 304)
+
+        self._create_pizza("next-test-pizza", "29.99")
+        res_three = self.client.get("/api/v1/pizza/", headers={"If-None-Match": etag})
+        self.assertEqual(res_three.status_code, 200)
+        self.assertNotEqual(res_three.headers["ETag"], etag)
+
+    def test_conditional_get_all_pizzas_after_delete(self):
+        first_id = self._create_pizza("test-pizza", "22.83")
+        self._create_pizza("next-test-pizza", "29.99")
+        self._create_pizza("last-test-pizza", "31.99")
+
+        res_one = self.client.get("/api/v1/pizza/")
+        etag = res_one.headers["ETag"]
+        # Deleting older row keeps max modified_at, list has no Last-Modified
+        self.assertNotIn("Last-Modified", res_one.headers)
+        self.client.delete(f"/api/v1/pizza/{first_id}")
+
+        res_two = self.client.get(
+            "/api/v1/pizza/",
+            headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"},
+        )
+        self.assertEqual(res_two.status_code, 200)
+        self.assertEqual(len(res_two.json), 2)
+
+        res_three = self.client.get("/api/v1/pizza/", headers={"If-None-Match": etag})
+        self.assertEqual(res_three.status_code, 200)
+        self.assertNotEqual(res_three.headers["ETag"], etag)
+
+    def test_update_pizza_if_match(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+        etag = self.client.get(f"/api/v1/pizza/{created_pizza_id}").headers["ETag"]
+
+        res_one = self.client.patch(
+            f"/api/v1/pizza/{created_pizza_id}",
+            headers={"Content-Type": "application/json", "If-Match": etag},
+            data=json.dumps({"name": "modified-test-pizza", "price": "25.12"}),
+        )
+        self.assertEqual(res_one.status_code, 200)
+
+        res_two = self.client.patch(
+            f"/api/v1/pizza/{created_pizza_id}",
+            headers={"Content-Type": "application/json", "If-Match": etag},
+            data=json.dumps({"name": "test-pizza", "price": "22.83"}),
+        )
+        self.assertEqual(res_two.status_code, 412)
+
+        res_three = self.client.delete(
+            f"/api/v1/pizza/{created_pizza_id}", headers={"If-Match": etag}
+        )
+        self.assertEqual(res_three.status_code, 412)
+
+        res_four = self.client.delete(
+            f"/api/v1/pizza/{created_pizza_id}",
+            headers={"If-Match": res_one.headers["ETag"]},
+        )
+        self.assertEqual(res_four.status_code, 200)
+
+    def test_single_statement_writes(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+        payload = {"name": "modified-test-pizza", "price": "25.12"}
+
+        # Row is not loaded before it is written
+        with mock.patch.object(PizzaModel, "get_pizza_by_id") as get_pizza:
+            res_one = self.client.patch(
+                f"/api/v1/pizza/{created_pizza_id}", json=payload
+            )
+        get_pizza.assert_not_called()
+        self.assertEqual(res_one.status_code, 200)
+        res_two = self.client.get(f"/api/v1/pizza/{created_pizza_id}")
+        self.assertEqual(res_one.headers["ETag"], res_two.headers["ETag"])
+        self.assertEqual(res_two.json["price"], 25.12)
+
+        with self.app.app_context():
+            # Version checked by If-Match was modified meanwhile
+            stale = datetime.fromisoformat(res_two.json["created_at"])
+            self.assertIsNone(
+                PizzaModel.update_by_id(created_pizza_id, {"price": 1.0}, stale)
+            )
+            self.assertFalse(PizzaModel.delete_by_id(created_pizza_id, stale))
+
+            # Databases without RETURNING
+            dialect = db.engine.dialect
+            with mock.patch.multiple(
+                dialect, update_returning=False, delete_returning=False
+            ):
+                pizza = PizzaModel.update_by_id(created_pizza_id, {"price": 26.0})
+                self.assertEqual((pizza.id, pizza.price), (created_pizza_id, 26.0))
+                self.assertIsNone(PizzaModel.update_by_id(9999, {"price": 1.0}))
+                self.assertTrue(PizzaModel.delete_by_id(created_pizza_id))
+                self.assertFalse(PizzaModel.delete_by_id(created_pizza_id))
+
+    def test_bulk_pizzas(self):
+        existing_id = self._create_pizza("test-pizza", "22.83")
+        deleted_id = self._create_pizza("deleted-test-pizza", "19.99")
+
+        res_one = self.client.post(
+            "/api/v1/pizza/bulk",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(
+                {
+                    "create": [
+                        {"name": "new-test-pizza", "price": "30.00"},
+                        {"name": "test-pizza", "price": "23.50"},
+                        {"name": "", "price": "30.00"},
+                        {"name": "new-test-pizza", "price": "31.00"},
+                    ],
+                    "update": [
+                        {"id": deleted_id, "name": "renamed", "price": "9.99"},
+                        {"id": 9999, "name": "ghost", "price": "9.99"},
+                        {"name": "no-id", "price": "9.99"},
+                    ],
+                    "delete": [deleted_id, 9999],
+                }
+            ),
+        )
+        self.assertEqual(res_one.status_code, 200)
+        self.assertEqual(
+            [r["status"] for r in res_one.json["create"]], [200, 200, 400, 400]
+        )
+        # Existing name is upserted
+        self.assertEqual(res_one.json["create"][1]["id"], existing_id)
+        self.assertEqual([r["status"] for r in res_one.json["update"]], [200, 404, 400])
+        self.assertEqual([r["status"] for r in res_one.json["delete"]], [200, 404])
+
+        res_two = self.client.get(f"/api/v1/pizza/{existing_id}")
+        self.assertEqual(res_two.json["price"], 23.5)
+        res_three = self.client.get(f"/api/v1/pizza/{deleted_id}")
+        self.assertEqual(res_three.status_code, 404)
+
+    def test_bulk_pizzas_name_conflict(self):
+        created_pizza_id = self._create_pizza("test-pizza", "22.83")
+        next_pizza_id = self._create_pizza("next-test-pizza", "29.99")
+
+        res_one = self.client.post(
+            "/api/v1/pizza/bulk",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(
+                {
+                    "create": [{"name": "new-test-pizza", "price": "30.00"}],
+                    "update": [
+                        {"id": created_pizza_id, "name": "next-test-pizza", "price": 1},
+                        {"id": next_pizza_id, "name": "new-test-pizza"},
+                        {"id": next_pizza_id, "price": 5},
+                    ],
+                }
+            ),
+        )
+        # Only conflicting items are rejected, the rest is applied
+        self.assertEqual(res_one.status_code, 200)
+        self.assertEqual(res_one.json["create"][0]["status"], 200)
+        self.assertEqual(
+            [result["status"] for result in res_one.json["update"]], [400, 400, 200]
+        )
+        self.assertEqual(
+            res_one.json["update"][0]["error"], "Pizza with this name already exists"
+        )
+        res_two = self.client.get("/api/v1/pizza/")
+        self.assertEqual(
+            sorted((pizza["name"], pizza["price"]) for pizza in res_two.json),
+            [("new-test-pizza", 30.0), ("next-test-pizza", 5.0), ("test-pizza", 22.83)],
+        )
+
+    def test_bulk_pizzas_partial_update(self):
+        pizza_id = self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.post(
+            "/api/v1/pizza/bulk",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(
+                {
+                    "update": [
+                        {"id": pizza_id, "price": "19.99"},
+                        {"id": pizza_id, "ingredients": ["tomato"]},
+                        {"id": pizza_id},
+                    ]
+                }
+            ),
+        )
+        self.assertEqual(
+            [result["status"] for result in res_one.json["update"]], [200, 200, 400]
+        )
+        res_two = self.client.get(f"/api/v1/pizza/{pizza_id}")
+        self.assertEqual(res_two.json["name"], "test-pizza")
+        self.assertEqual(res_two.json["price"], 19.99)
+        self.assertEqual(res_two.json["ingredients"], ["tomato"])
+
+    def test_bulk_pizzas_invalid_body(self):
+        res_one = self.client.post(
+            "/api/v1/pizza/bulk",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps({"create": "not-a-list"}),
+        )
+        self.assertEqual(res_one.status_code, 400)
+
+    def test_search_pizzas(self):
+        for name in ("Margherita", "Marinara", "Pepperoni", "Quattro Formaggi"):
+            self._create_pizza(name, 25)
+
+        for setting, backend in (("auto", "sqlite"), ("memory", "memory")):
+            self.app.config["PIZZA_SEARCH_BACKEND"] = setting
+            self.app.extensions["pizza_search"]["backend"] = None
+            with self.app.app_context():
+                cache.invalidate()
+
+            res_one = self.client.get("/api/v1/pizza/search?q=mar")
+            self.assertEqual(res_one.status_code, 200)
+            self.assertEqual(res_one.headers["X-Search-Backend"], backend)
+            self.assertEqual(
+                sorted(p["name"] for p in res_one.json), ["Margherita", "Marinara"]
+            )
+
+            res_two = self.client.get("/api/v1/pizza/search?q=formaggi quat&limit=1")
+            self.assertEqual([p["name"] for p in res_two.json], ["Quattro Formaggi"])
+            self.assertNotIn("Link", res_two.headers)
+
+            res_three = self.client.get("/api/v1/pizza/search?q=mar&limit=1")
+            self.assertEqual(len(res_three.json), 1)
+            self.assertIn("offset=1", res_three.headers["Link"])
+
+            res_four = self.client.get("/api/v1/pizza/search?q=hawaii")
+            self.assertEqual(res_four.status_code, 404)
+
+        res_five = self.client.get("/api/v1/pizza/search?q=%20!")
+        self.assertEqual(res_five.status_code, 400)
+        res_six = self.client.get("/api/v1/pizza/search?q=mar&offset=-1")
+        self.assertEqual(res_six.status_code, 400)
+
+    def test_search_follows_writes(self):
+        pizza_id = self._create_pizza("Diavola", 30)
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/search?q=diav").status_code, 200
+        )
+
+        self.client.patch(
+            f"/api/v1/pizza/{pizza_id}", json={"name": "Capricciosa", "price": 30}
+        )
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/search?q=diav").status_code, 404
+        )
+        res = self.client.get("/api/v1/pizza/search?q=capri")
+        self.assertEqual([p["id"] for p in res.json], [pizza_id])
+
+        # In-memory index is rebuilt for search following write, not only
+        # after refresh interval, stale matches are not cached
+        self.app.config["PIZZA_SEARCH_BACKEND"] = "memory"
+        self.app.extensions["pizza_search"]["backend"] = None
+        self.assertEqual(
+            self.client.get("/api/v1/pizza/search?q=capr").status_code, 200
+        )
+        self.client.patch(f"/api/v1/pizza/{pizza_id}", json={"name": "Diavola"})
+        for _ in range(2):
+            self.assertEqual(
+                self.client.get("/api/v1/pizza/search?q=capri").status_code, 404
+            )
+        res = self.client.get("/api/v1/pizza/search?q=diav")
+        self.assertEqual([p["id"] for p in res.json], [pizza_id])
+
+    def test_stats_pool(self):
+        self._create_pizza("test-pizza", "22.83")
+
+        res_one = self.client.get("/stats")
+        self.assertEqual(res_one.status_code, 200)
+        self.assertGreater(res_one.json["pool"]["checkouts"], 0)
+        self.assertIn("checked_out", res_one.json["pool"])
+
+    def test_metrics(self):
+        self._create_pizza("test-pizza", "22.83")
+        self.client.get("/api/v1/pizza/")
+
+        res_one = self.client.get("/metrics")
+        self.assertEqual(res_one.status_code, 200)
+        body = res_one.get_data(as_text=True)
+        self.assertIn(
+            'pizzaapp_http_requests_total{endpoint="pizza.get_all_pizzas",'
+            'method="GET",status="200"}',
+            body,
+        )
+        self.assertIn('pizzaapp_db_queries_total{endpoint="pizza.create_pizza"', body)
+        self.assertIn("pizzaapp_serialization_duration_seconds_bucket", body)
+        self.assertIn("pizzaapp_http_requests_in_flight", body)
+        self.assertIn('pizzaapp_db_pool_checkouts_total{engine="primary"}', body)
+        self.assertIn('pizzaapp_db_pool_connects_total{engine="primary"}', body)
+
+    def test_health_probes(self):
+        res_one = self.client.get("/healthz")
+        self.assertEqual(res_one.status_code, 200)
+        self.assertEqual(res_one.json, {"status": "ok"})
+
+        res_two = self.client.get("/readyz")
+        self.assertEqual(res_two.status_code, 200)
+
     def tearDown(self):
         """
         Tear Down
@@ -0,0 +1,53 @@
+"""
+This is a defitinion of unit tests of connection pool instrumentation
+"""
+
+import unittest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from ..shared.pool_metrics import InstrumentedQueuePool, wait_buckets, wait_histogram
+
+
+class InstrumentedQueuePoolTest(unittest.TestCase):
+
+    """
+    Pool records checkout wait time
+    """
+
+    def test_records_wait(self):
+        engine = create_engine(
+            "sqlite://", poolclass=InstrumentedQueuePool, pool_size=1
+        )
+        engine.pool.observe_wait = wait_histogram(10).labels(engine="test").observe
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        self.assertEqual(engine.pool.wait_count, 2)
+        self.assertGreater(engine.pool.wait_seconds_total, 0)
+        self.assertGreaterEqual(
+            engine.pool.wait_seconds_total, engine.pool.wait_seconds_max
+        )
+
+        engine.dispose()
+        self.assertIsInstance(engine.pool, InstrumentedQueuePool)
+        # Recreated pool keeps exporting wait
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "pizzaapp_db_pool_wait_seconds_count", {"engine": "test"}
+            ),
+            3,
+        )
+
+    def test_wait_buckets(self):
+        self.assertEqual(
+            wait_buckets(10),
+            (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 7.5, 10),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+This is a defitinion of unit tests of request profiling
+"""
+
+import os
+import pstats
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from ..app import create_app, db
+from ..config import Local
+
+
+class ProfilingTest(unittest.TestCase):
+
+    """
+    Profiling enabled in local profile
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(
+            os.environ, {"FLASK_ENV": "local", "FLASK_CACHE_TYPE": "null"}
+        )
+        cls.env_patcher.start()
+        cls.config_patcher = mock.patch.object(Local, "PIZZA_PROFILING", True)
+        cls.config_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.config_patcher.stop()
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app with profiling
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+    def test_server_timing(self):
+        res = self.client.post("/api/v1/pizza/", json={"name": "x", "price": 10})
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client.get("/api/v1/pizza/1")
+        self.assertRegex(
+            res.headers["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="1 SQL statements", app;dur=[\d.]+, total;dur=',
+        )
+
+    def test_repeated_statements_are_logged(self):
+        self.app.config["PIZZA_BULK_BATCH_SIZE"] = 1
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.post(
+                "/api/v1/pizza/bulk",
+                json={"create": [{"name": f"n{i}", "price": 10} for i in range(3)]},
+            )
+        self.assertIn("statement repeated 3 times (N+1?): INSERT", logs.output[0])
+
+    def test_thresholds_are_logged(self):
+        self.app.config["PIZZA_PROFILING_MAX_QUERIES"] = 0
+        self.app.config["PIZZA_PROFILING_SLOW_QUERY_MS"] = -1
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.get("/api/v1/pizza/1")
+        self.assertIn("1 SQL statements", logs.output[0])
+        self.assertIn("slow statement", logs.output[0])
+
+    def test_profile_dump(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config["PIZZA_PROFILING_DIR"] = directory
+            res = self.client.get("/api/v1/pizza/", headers={"X-Profile": "cprofile"})
+
+            path = res.headers["X-Profile-File"]
+            self.assertTrue(path.startswith(directory))
+            self.assertTrue(path.endswith("-GET-pizza_get_all_pizzas.prof"))
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+        res = self.client.get("/api/v1/pizza/")
+        self.assertNotIn("X-Profile-File", res.headers)
+
+    def test_failed_statement(self):
+        with self.app.app_context():
+            connection = db.session.connection()
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    connection.execute(text("SELECT * FROM missing"))
+            # Start times of failed statements are not left on pooled
+            # connection (metrics and profiling)
+            self.assertEqual(dict(connection.info), {})
+            db.session.rollback()
+
+        res = self.client.get("/api/v1/pizza/1")
+        self.assertIn("Server-Timing", res.headers)
+
+    def test_missing_pyinstrument(self):
+        with mock.patch.dict(sys.modules, {"pyinstrument": None}):
+            with self.assertLogs("pizzaapp", "WARNING") as logs:
+                app = create_app()
+        self.assertIn("pyinstrument is not installed", logs.output[0])
+
+        res = app.test_client().get(
+            "/api/v1/pizza/", headers={"X-Profile": "pyinstrument"}
+        )
+        self.assertNotEqual(res.status_code, 500)
+        self.assertIn("Server-Timing", res.headers)
+        self.assertNotIn("X-Profile-File", res.headers)
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+This is a defitinion of unit tests of rate limiting and request
+coalescing
+"""
+
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from ..app import create_app, db
+from ..config import Local
+from ..models.pizza_model import PizzaModel
+from ..shared.cache import LocalRedis
+from ..shared.ratelimit import MemoryBuckets, RedisBuckets, take_token
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    """
+    Both bucket storages behave the same way
+    """
+
+    def test_take_token(self):
+        value, allowed, retry_after = take_token(None, 100.0, 2, 2)
+        self.assertEqual((value, allowed, retry_after), ("1.0:100.0", True, 0.0))
+        value, allowed, _ = take_token(value, 100.0, 2, 2)
+        self.assertTrue(allowed)
+        value, allowed, retry_after = take_token(value, 100.0, 2, 2)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 0.5)
+        # Refill is capped by burst
+        self.assertEqual(take_token(value, 200.0, 2, 2)[0], "1.0:200.0")
+
+    def test_storages(self):
+        for buckets in (MemoryBuckets(10), RedisBuckets(LocalRedis())):
+            results = [buckets.take("client", 0.5, 3) for _ in range(4)]
+            self.assertEqual([allowed for allowed, _ in results], [1, 1, 1, 0])
+            self.assertAlmostEqual(results[-1][1], 2, delta=0.1)
+            self.assertTrue(buckets.take("other", 0.5, 3)[0])
+
+
+class RateLimitTest(unittest.TestCase):
+
+    """
+    Rate limiting is disabled in local profile by default
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = mock.patch.dict(os.environ, {"FLASK_ENV": "local"})
+        cls.env_patcher.start()
+        cls.config_patchers = [
+            mock.patch.object(Local, "PIZZA_RATE_LIMIT", True),
+            mock.patch.object(Local, "PIZZA_CACHE_TYPE", "null"),
+            mock.patch.object(Local, "PIZZA_RATE_LIMIT_API_KEYS", ("secret",)),
+        ]
+        for patcher in cls.config_patchers:
+            patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        for patcher in cls.config_patchers:
+            patcher.stop()
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        """
+        Setup app with small limits
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.app.config["PIZZA_RATE_LIMITS"] = {"pizza.get_single_pizza": (0.1, 2)}
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+    def test_too_many_requests(self):
+        statuses = [self.client.get("/api/v1/pizza/1").status_code for _ in range(3)]
+        self.assertEqual(statuses, [404, 404, 429])
+
+        res = self.client.get("/api/v1/pizza/1")
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.headers["Retry-After"], "10")
+        self.assertIn("error", res.json)
+
+        # Unknown API key does not escape limit of client address
+        res = self.client.get("/api/v1/pizza/1", headers={"X-API-Key": "random"})
+        self.assertEqual(res.status_code, 429)
+
+        # Other clients and routes have own buckets
+        res = self.client.get("/api/v1/pizza/1", headers={"X-API-Key": "secret"})
+        self.assertEqual(res.status_code, 404)
+        res = self.client.get(
+            "/api/v1/pizza/1", environ_base={"REMOTE_ADDR": "10.0.0.1"}
+        )
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(self.client.get("/api/v1/pizza/").status_code, 404)
+
+    def test_requires_proxy_count(self):
+        with mock.patch.object(Local, "PIZZA_PROXY_COUNT", None):
+            with self.assertRaises(KeyError):
+                create_app()
+            with mock.patch.object(Local, "PIZZA_RATE_LIMIT", False):
+                create_app()
+
+    def test_coalesced_reads(self):
+        self.client.post("/api/v1/pizza/", json={"name": "shared", "price": 10})
+        state = self.app.extensions["pizza_coalescing"]
+        get_pizzas_page = PizzaModel.get_pizzas_page
+        calls = []
+
+        def slow_page(*args):
+            # Leader waits until other requests joined its flight
+            calls.append(args)
+            deadline = time.monotonic() + 5
+            while state["stats"]["followers"] < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return get_pizzas_page(*args)
+
+        responses = []
+
+        def get():
+            responses.append(self.app.test_client().get("/api/v1/pizza/"))
+
+        with mock.patch.object(PizzaModel, "get_pizzas_page", side_effect=slow_page):
+            threads = [threading.Thread(target=get) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([res.status_code for res in responses], [200] * 5)
+        self.assertEqual(len({res.data for res in responses}), 1)
+        self.assertEqual(
+            self.client.get("/stats").json["coalescing"],
+            {"leaders": 1, "followers": 4},
+        )
+
+    def test_coalescing_timeout(self):
+        self.app.config["PIZZA_COALESCE_TIMEOUT"] = 0
+        started = threading.Event()
+        release = threading.Event()
+        get_pizza_by_id = PizzaModel.get_pizza_by_id
+
+        def slow_pizza(pizza_id):
+            started.set()
+            release.wait(5)
+            return get_pizza_by_id(pizza_id)
+
+        responses = []
+        with mock.patch.object(PizzaModel, "get_pizza_by_id", side_effect=slow_pizza):
+            leader = threading.Thread(
+                target=lambda: responses.append(self.client.get("/api/v1/pizza/1"))
+            )
+            leader.start()
+            started.wait(5)
+            res = self.app.test_client().get("/api/v1/pizza/1")
+            release.set()
+            leader.join()
+
+        self.assertEqual(res.status_code, 429)
+        self.assertIn("Retry-After", res.headers)
+        self.assertEqual(responses[0].status_code, 404)
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+This is a defitinion of unit tests of read replica routing
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from ..app import create_app, db
+from ..config import Local
+from ..shared.replicas import STICKY_COOKIE
+
+
+class ReplicaTest(unittest.TestCase):
+
+    """
+    Replica is separate SQLite database, so reads served by it do not see
+    data written to primary
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.env_patcher = mock.patch.dict(
+            os.environ, {"FLASK_ENV": "local", "FLASK_CACHE_TYPE": "null"}
+        )
+        cls.env_patcher.start()
+        cls.binds_patcher = mock.patch.object(
+            Local,
+            "SQLALCHEMY_BINDS",
+            {
+                "replica_0": f"sqlite:///{cls.tmp_dir}/replica.sqlite3",
+                "replica_1": f"sqlite:///{cls.tmp_dir}/missing/replica.sqlite3",
+            },
+            create=True,
+        )
+        cls.binds_patcher.start()
+
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+
+        cls.binds_patcher.stop()
+        cls.env_patcher.stop()
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        """
+        Create tables in primary and in healthy replica
+        """
+
+        super().setUp()
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all(bind_key=None)
+            db.metadata.create_all(db.engines["replica_0"])
+
+    def test_reads_go_to_replica(self):
+        res_one = self.client.post("/api/v1/pizza/", json={"name": "r", "price": 10})
+        self.assertEqual(res_one.status_code, 201)
+        self.assertIsNotNone(self.client.get_cookie(STICKY_COOKIE))
+
+        # Other client reads from replica where pizza was not replicated
+        other = self.app.test_client()
+        other.environ_base["REMOTE_ADDR"] = "10.0.0.2"
+        for _ in range(3):
+            self.assertEqual(other.get("/api/v1/pizza/1").status_code, 404)
+
+        # Writer sticks to primary and sees its pizza
+        self.assertEqual(self.client.get("/api/v1/pizza/1").status_code, 200)
+
+        # Broken replica is skipped
+        self.assertEqual(
+            self.client.get("/stats").json["replicas"],
+            {"replica_0": True, "replica_1": False},
+        )
+
+        # Writes always go to primary
+        res_two = other.delete("/api/v1/pizza/1")
+        self.assertEqual(res_two.status_code, 200)
+
+        # Pool of replica is instrumented as well
+        body = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn('pizzaapp_db_pool_checkouts_total{engine="replica_0"}', body)
+
+    def test_writer_without_cookie(self):
+        self.client.post("/api/v1/pizza/", json={"name": "r", "price": 10})
+        self.client.delete_cookie(STICKY_COOKIE)
+
+        # Client is recognized by address
+        self.assertEqual(self.client.get("/api/v1/pizza/1").status_code, 200)
+
+        # and not after sticky window
+        later = time.monotonic() + 60
+        with mock.patch("time.monotonic", return_value=later):
+            self.assertEqual(self.client.get("/api/v1/pizza/1").status_code, 404)
+
+    def test_no_healthy_replica(self):
+        with self.app.app_context():
+            db.metadata.drop_all(db.engines["replica_0"])
+        self.client.post("/api/v1/pizza/", json={"name": "r", "price": 10})
+        self.app.extensions["pizza_replicas"]["healthy"]["replica_0"] = False
+        self.app.extensions["pizza_replicas"]["checked_at"]["replica_0"] = 1e12
+
+        other = self.app.test_client()
+        other.environ_base["REMOTE_ADDR"] = "10.0.0.2"
+        self.assertEqual(other.get("/api/v1/pizza/1").status_code, 200)
+
+    def tearDown(self):
+        """
+        Tear Down
+        """
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all(bind_key=None)
+            db.metadata.drop_all(db.engines["replica_0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+This is a defitinion of unit tests of fast serializer
+"""
+
+import unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from flask import Flask, json
+from marshmallow import Schema, fields
+from ..models.pizza_model import PizzaSchema
+from ..shared.serializer import dumps
+
+
+class SerializerTest(unittest.TestCase):
+
+    """
+    Fast serializer output must be identical to marshmallow + flask.json
+    """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["PIZZA_SERIALIZER"] = "fast"
+        self.pizzas = [
+            SimpleNamespace(
+                id=1,
+                name="test-pizza",
+                price=22.83,
+                created_at=datetime(2024, 1, 2, 3, 4, 5, 678901),
+                modified_at=datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+                ingredient_names=["basil", "mozzarella", "tomato"],
+            ),
+            SimpleNamespace(
+                id=2,
+                name='pizza "quattro" stagioni ćó\U0001f355\n',
+                price=1e16,
+                created_at=None,
+                modified_at=datetime(2024, 1, 2),
+                ingredient_names=['pomodoro "San Marzano" ć\U0001f345'],
+            ),
+            SimpleNamespace(
+                id=3,
+                name="",
+                price=float("inf"),
+                created_at=datetime(1999, 12, 31, 23, 59, 59),
+                modified_at=None,
+                ingredient_names=[],
+            ),
+        ]
+
+    def test_identical_output(self):
+        for schema in (
+            PizzaSchema(),
+            PizzaSchema(only=("price", "id")),
+            PizzaSchema(only=("ingredients",)),
+        ):
+            with self.app.app_context():
+                for pizza in self.pizzas:
+                    self.assertEqual(
+                        dumps(schema, pizza), json.dumps(schema.dump(pizza))
+                    )
+                self.assertEqual(
+                    dumps(schema, self.pizzas, many=True),
+                    json.dumps(schema.dump(self.pizzas, many=True)),
+                )
+                self.assertEqual(dumps(schema, [], many=True), "[]")
+
+    def test_generic_fields(self):
+        class OtherSchema(Schema):
+            """
+            Fields without compiled encoder
+            """
+
+            id = fields.Int(as_string=True)
+            flag = fields.Bool(data_key="is_flag")
+            name = fields.Str(attribute="label")
+            flags = fields.List(fields.Bool())
+
+        schema = OtherSchema()
+        obj = SimpleNamespace(id=7, flag=True, label="x", flags=[True, False])
+        with self.app.app_context():
+            self.assertEqual(dumps(schema, obj), json.dumps(schema.dump(obj)))
+
+    def test_marshmallow_serializer(self):
+        self.app.config["PIZZA_SERIALIZER"] = "marshmallow"
+        schema = PizzaSchema()
+        with self.app.app_context():
+            self.assertEqual(
+                dumps(schema, self.pizzas, many=True),
+                json.dumps(schema.dump(self.pizzas, many=True)),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
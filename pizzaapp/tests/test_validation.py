@@ -0,0 +1,123 @@
+"""
+This is a defitinion of unit tests of fast validation
+"""
+
+import unittest
+from unittest import mock
+from flask import Flask
+from marshmallow import EXCLUDE, Schema, ValidationError, fields, validates
+from ..models.pizza_model import PizzaSchema
+from ..shared import validation
+from ..shared.validation import compile_loader, validated
+
+
+class ValidationTest(unittest.TestCase):
+
+    """
+    Fast validation must load the same data and raise the same errors
+    as marshmallow
+    """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["PIZZA_VALIDATOR"] = "fast"
+        self.payloads = [
+            {"name": "margherita", "price": 20},
+            {"name": "margherita", "price": "29.99", "ingredients": ["tomato"]},
+            {"name": "margherita", "price": 1.5, "ingredients": []},
+            {"name": "", "price": 20},
+            {"name": "margherita", "price": 0},
+            {"name": "margherita", "price": True},
+            {"name": "margherita", "price": "nan"},
+            {"name": "margherita", "price": 10**400},
+            {"name": "margherita", "price": None},
+            {"name": 5, "price": "cheap"},
+            {"name": "margherita", "price": 20, "ingredients": ["", "x" * 65]},
+            {"name": "margherita", "price": 20, "ingredients": ["basil"] * 33},
+            {"name": "margherita", "price": 20, "ingredients": "tomato"},
+            {"name": "margherita", "price": 20, "id": 7},
+            {"name": "margherita"},
+            {"price": 25},
+            {},
+            [],
+            None,
+        ]
+
+    def assert_same_result(self, schema, payload, partial=False):
+        """
+        Compare result or errors of fast and marshmallow loading
+        """
+
+        try:
+            expected = schema.load(payload, partial=partial)
+        except ValidationError as exc:
+            with self.assertRaises(ValidationError) as raised:
+                validated(schema, payload, partial)
+            self.assertEqual(raised.exception.messages, exc.messages)
+        else:
+            self.assertEqual(validated(schema, payload, partial), expected)
+
+    def test_identical_result(self):
+        schema = PizzaSchema()
+        with self.app.app_context():
+            for partial in (False, True):
+                for payload in self.payloads:
+                    with self.subTest(payload=payload, partial=partial):
+                        self.assert_same_result(schema, payload, partial)
+
+    def test_valid_input_is_not_loaded_by_schema(self):
+        schema = PizzaSchema()
+        with self.app.app_context():
+            with mock.patch.object(schema, "load") as load:
+                self.assertEqual(
+                    validated(schema, {"price": 25, "ingredients": ["basil"]}, True),
+                    {"price": 25.0, "ingredient_names": ["basil"]},
+                )
+                load.assert_not_called()
+                validated(schema, {"price": 0}, True)
+                load.assert_called_once_with({"price": 0}, partial=True)
+
+    def test_unsupported_schema(self):
+        class HookSchema(Schema):
+            """
+            Schema with field validation hook
+            """
+
+            name = fields.Str()
+
+            @validates("name")
+            def validate_name(self, value):
+                """
+                Reject reserved name
+                """
+
+                if value == "reserved":
+                    raise ValidationError("Reserved")
+
+        class OtherSchema(Schema):
+            """
+            Schema with field without compiled loader
+            """
+
+            count = fields.Int()
+
+        for schema in (HookSchema(), OtherSchema(), PizzaSchema(unknown=EXCLUDE)):
+            self.assertIsNone(compile_loader(schema))
+        with self.app.app_context():
+            self.assert_same_result(HookSchema(), {"name": "reserved"})
+            self.assert_same_result(OtherSchema(), {"count": "3"})
+
+    def test_marshmallow_validator(self):
+        self.app.config["PIZZA_VALIDATOR"] = "marshmallow"
+        schema = PizzaSchema()
+        with self.app.app_context():
+            with mock.patch.object(validation, "compile_loader") as compile_mock:
+                self.assertEqual(
+                    validated(schema, {"name": "margherita", "price": 20}),
+                    {"name": "margherita", "price": 20.0},
+                )
+            compile_mock.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+This is a definiton of liveness and readiness probes
+"""
+
+import threading
+import time
+from flask import Blueprint, current_app, json, Response
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from ..models import db
+
+health_api = Blueprint("health", __name__)
+
+# Last database check result shared by threads of worker process
+readiness = {"ready": False, "checked_at": None}
+readiness_lock = threading.Lock()
+
+
+def probe_response(status, status_code):
+    """
+    Minimal probe response
+    """
+
+    return Response(
+        mimetype="application/json",
+        response=json.dumps({"status": status}),
+        status=status_code,
+    )
+
+
+@health_api.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    Liveness probe, process is able to serve requests (no I/O)
+    """
+
+    return probe_response("ok", 200)
+
+
+@health_api.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness probe, database is reachable. Database is pinged at most
+    once per PIZZA_READYZ_INTERVAL seconds, probes in between (and
+    probes arriving while ping is running) get last result. Lock is
+    never waited for, under ASGI adapter probes share one thread.
+    """
+
+    interval = current_app.config["PIZZA_READYZ_INTERVAL"]
+    checked_at = readiness["checked_at"]
+    is_stale = checked_at is None or time.monotonic() - checked_at >= interval
+
+    # pylint: disable-next=consider-using-with
+    if is_stale and readiness_lock.acquire(blocking=False):
+        try:
+            db.session.execute(text("SELECT 1"))
+            readiness["ready"] = True
+        except SQLAlchemyError:
+            db.session.rollback()
+            readiness["ready"] = False
+        finally:
+            readiness["checked_at"] = time.monotonic()
+            readiness_lock.release()
+
+    if readiness["ready"]:
+        return probe_response("ok", 200)
+    return probe_response("unavailable", 503)
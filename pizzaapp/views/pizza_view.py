@@ -2,26 +2,337 @@
 This is a definiton of available views
 """
 
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import urlencode
 from marshmallow import ValidationError
 from sqlalchemy.exc import IntegrityError
-from flask import request, json, Response, Blueprint
+from flask import (
+    request,
+    json,
+    Response,
+    Blueprint,
+    current_app,
+    stream_with_context,
+    url_for,
+)
 from ..models.pizza_model import PizzaModel, PizzaSchema
+from ..shared.breaker import circuit_breaker
+from ..shared.cache import cache
+from ..shared.changefeed import changefeed
+from ..shared.coalescing import coalescer
+from ..shared.metrics import serialization_timer
+from ..shared.search import pizza_search, search_terms
+from ..shared.serializer import dumps
+from ..shared.validation import validated
+from ..shared.conditional import (
+    make_etag,
+    not_modified,
+    precondition_failed,
+    validator_headers,
+)
 
 pizza_api = Blueprint("pizza", __name__)
 pizza_schema = PizzaSchema()
+bulk_schema = PizzaSchema(many=True)
 
 ALREADY_EXISTS_MSG = "Pizza with this name already exists"
 NOT_EXISTS_MSG = "Pizza with this id does not exists"
 BLANK_FIELD_MSG = "Name and/or price can't be blank"
+NO_FIELDS_MSG = "No fields to update"
+PRECONDITION_FAILED_MSG = "Pizza was modified, ETag does not match"
+INVALID_BULK_MSG = "Expected object with create, update and delete lists"
+TOO_MANY_OPERATIONS_MSG = "Too many operations in single request"
+INVALID_ID_MSG = "Missing or invalid id"
+DUPLICATE_NAME_MSG = "Duplicate name in request"
+INVALID_PARAM_MSG = "Invalid value of query parameter"
+UNKNOWN_FIELD_MSG = "Unknown field requested"
+NDJSON_MIMETYPE = "application/x-ndjson"
+EVENT_STREAM_MIMETYPE = "text/event-stream"
+
+
+def custom_response(res, status_code, headers=None):
+    """
+    Custom Response
+    """
+
+    return Response(
+        mimetype="application/json",
+        response=json.dumps(res),
+        status=status_code,
+        headers=headers,
+    )
 
 
-def custom_response(res, status_code):
+def is_conditional():
     """
-    Custom Response
+    Return True if request carries If-None-Match or If-Modified-Since
+    """
+
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+@pizza_api.after_request
+def cache_headers(response):
+    """
+    Add Cache-Control and Vary policy of read endpoint
+    """
+
+    policy = current_app.config["PIZZA_CACHE_CONTROL"].get(request.endpoint)
+    if policy and response.status_code in (200, 304):
+        response.headers["Cache-Control"] = policy
+        for header in current_app.config["PIZZA_CACHE_VARY"]:
+            response.vary.add(header)
+    return response
+
+
+def json_response(body, headers, cache_status):
+    """
+    Response from already serialized body, cache status is reported
+    in X-Cache header
+    """
+
+    return Response(
+        mimetype="application/json",
+        response=body,
+        status=200,
+        headers={**headers, "X-Cache": cache_status},
+    )
+
+
+@lru_cache(maxsize=64)
+def projection_schema(fields):
+    """
+    Return schema dumping only given fields (cached per fields tuple)
+    """
+
+    return PizzaSchema(only=fields)
+
+
+def projection_columns(fields):
+    """
+    Return columns to select for requested fields, id is always selected
+    as it is the pagination key. Whole rows are loaded when ingredients
+    are requested.
+    """
+
+    if not fields or "ingredients" in fields:
+        return None
+    return ("id",) + tuple(f for f in fields if f != "id")
+
+
+def next_page_headers(last_id):
+    """
+    Return headers pointing to page following the one ending at last_id
+    """
+
+    next_args = {**request.args.to_dict(), "cursor": last_id}
+    next_url = url_for("pizza.get_all_pizzas", **next_args)
+    return {"Link": f'<{next_url}>; rel="next"', "X-Next-Cursor": str(last_id)}
+
+
+def parse_list_args(args):
+    """
+    Parse pagination, projection and filter query parameters,
+    raise ValueError on invalid input
+    """
+
+    config = current_app.config
+    limit = args.get("limit", config["PIZZA_PAGE_SIZE"], type=int)
+    if limit is None or not 0 < limit <= config["PIZZA_MAX_PAGE_SIZE"]:
+        raise ValueError(f"{INVALID_PARAM_MSG}: limit")
+
+    cursor = args.get("cursor")
+    if cursor is not None:
+        if not cursor.isdigit():
+            raise ValueError(f"{INVALID_PARAM_MSG}: cursor")
+        cursor = int(cursor)
+
+    fields = None
+    if args.get("fields"):
+        fields = tuple(dict.fromkeys(f.strip() for f in args["fields"].split(",")))
+        if not set(fields) <= set(pizza_schema.fields):
+            raise ValueError(UNKNOWN_FIELD_MSG)
+
+    filters = {"name_prefix": args.get("name_prefix")}
+    for name in ("min_price", "max_price"):
+        if name in args:
+            try:
+                filters[name] = float(args[name])
+            except ValueError as exc:
+                raise ValueError(f"{INVALID_PARAM_MSG}: {name}") from exc
+    if "modified_since" in args:
+        try:
+            since = datetime.fromisoformat(args["modified_since"])
+        except ValueError as exc:
+            raise ValueError(f"{INVALID_PARAM_MSG}: modified_since") from exc
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        filters["modified_since"] = since.astimezone(timezone.utc)
+    ingredients = args.getlist("ingredient")
+    if not all(ingredients):
+        raise ValueError(f"{INVALID_PARAM_MSG}: ingredient")
+    filters["ingredients"] = tuple(dict.fromkeys(ingredients))
+
+    return limit, cursor, fields, filters
+
+
+def parse_search_args(args):
+    """
+    Parse search query and pagination parameters, raise ValueError on
+    invalid input
+    """
+
+    config = current_app.config
+    query = args.get("q", "").strip()
+    # Single character would match most of catalog
+    if not search_terms(query) or not 2 <= len(query) <= 128:
+        raise ValueError(f"{INVALID_PARAM_MSG}: q")
+
+    limit = args.get("limit", config["PIZZA_SEARCH_PAGE_SIZE"], type=int)
+    if limit is None or not 0 < limit <= config["PIZZA_SEARCH_MAX_PAGE_SIZE"]:
+        raise ValueError(f"{INVALID_PARAM_MSG}: limit")
+
+    offset = args.get("offset", 0, type=int)
+    if offset is None or not 0 <= offset <= config["PIZZA_SEARCH_MAX_OFFSET"]:
+        raise ValueError(f"{INVALID_PARAM_MSG}: offset")
+
+    return query, limit, offset
+
+
+def wants_ndjson():
+    """
+    Return True if client prefers NDJSON over JSON
+    """
+
+    accepted = request.accept_mimetypes.best_match(
+        ["application/json", NDJSON_MIMETYPE]
+    )
+    return accepted == NDJSON_MIMETYPE
+
+
+def ndjson_response(cursor, fields, filters):
+    """
+    Stream all matching pizzas as newline delimited JSON, rows are
+    serialized one by one as they are read from database
+    """
+
+    columns = projection_columns(fields)
+    schema = projection_schema(fields) if fields else pizza_schema
+    chunk_size = current_app.config["PIZZA_EXPORT_CHUNK_SIZE"]
+
+    def generate():
+        for pizza in PizzaModel.stream_pizzas(chunk_size, cursor, columns, filters):
+            yield dumps(schema, pizza) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def parse_changes_args(args):
+    """
+    Parse resume token (since, Last-Event-ID header of reconnecting
+    event stream) and long-poll timeout, raise ValueError on invalid
+    input. Token is None when client starts from latest change.
+    """
+
+    since = args.get("since", request.headers.get("Last-Event-ID"))
+    if since is not None:
+        if not since.isdigit():
+            raise ValueError(f"{INVALID_PARAM_MSG}: since")
+        since = int(since)
+
+    config = current_app.config
+    timeout = args.get("timeout", config["PIZZA_CHANGES_TIMEOUT"], type=int)
+    if timeout is None or not 0 <= timeout <= config["PIZZA_CHANGES_MAX_TIMEOUT"]:
+        raise ValueError(f"{INVALID_PARAM_MSG}: timeout")
+
+    return since, timeout
+
+
+def wants_event_stream():
+    """
+    Return True if client subscribes with Server-Sent Events
+    """
+
+    accepted = request.accept_mimetypes.best_match(
+        ["application/json", EVENT_STREAM_MIMETYPE]
+    )
+    return accepted == EVENT_STREAM_MIMETYPE
+
+
+def event_stream_response(since, changes):
+    """
+    Stream changes as Server-Sent Events (event id is resume token)
+    until hold time of worker passes, client reconnects then with
+    Last-Event-ID. Comment is sent when there was no change for
+    PIZZA_CHANGES_HEARTBEAT seconds, so proxies keep connection open.
+    """
+
+    config = current_app.config
+    deadline = time.monotonic() + changefeed.hold_seconds()
+
+    def generate():
+        token = since
+        found = changes
+        yield f"retry: {config['PIZZA_CHANGES_RETRY_MS']}\n\n"
+        while True:
+            for token, event in found:
+                yield f"id: {token}\ndata: {event}\n\n"
+            if not found:
+                yield ": keep-alive\n\n"
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            found = changefeed.changes(
+                token, min(remaining, config["PIZZA_CHANGES_HEARTBEAT"])
+            )
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EVENT_STREAM_MIMETYPE,
+        # Proxy (nginx ingress) must not buffer events
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@pizza_api.route("/changes", methods=["GET"])
+def get_changes():
     """
+    Get changes of pizzas following resume token, waiting (long-poll)
+    or streaming (Server-Sent Events) until they are made
+    """
+
+    try:
+        since, timeout = parse_changes_args(request.args)
+    except ValueError as exc:
+        return custom_response({"error": str(exc)}, 400)
 
+    release = changefeed.subscribe()
+    streaming = False
+    try:
+        if since is None:
+            since = changefeed.latest_token()
+        if wants_event_stream():
+            # Expired token is reported before stream starts
+            response = event_stream_response(since, changefeed.changes(since, 0))
+            # Slot is held until stream is closed
+            response.call_on_close(release)
+            streaming = True
+            return response
+
+        changes = changefeed.changes(since, min(timeout, changefeed.hold_seconds()))
+    finally:
+        if not streaming:
+            release()
+    token = changes[-1][0] if changes else since
+    # Events are already serialized JSON objects
+    events = ", ".join(event for _, event in changes)
     return Response(
-        mimetype="application/json", response=json.dumps(res), status=status_code
+        mimetype="application/json",
+        response=f'{{"changes": [{events}], "token": {token}}}',
+        status=200,
+        headers={"Cache-Control": "no-store"},
     )
 
 
@@ -34,7 +345,7 @@ def create_pizza():
     req_data = request.get_json()
 
     try:
-        data = pizza_schema.load(req_data)
+        data = validated(pizza_schema, req_data)
 
         pizza = PizzaModel(data)
         pizza.save()
@@ -51,67 +362,421 @@ def create_pizza():
     return custom_response(message, 201)
 
 
+def load_many(items, partial=False):
+    """
+    Validate items with schema, return list of (index, data) of valid
+    items and dict of errors by index
+    """
+
+    try:
+        loaded, errors = bulk_schema.load(items, partial=partial), {}
+    except ValidationError as exc:
+        loaded, errors = exc.valid_data, exc.messages
+    return [(i, data) for i, data in enumerate(loaded) if i not in errors], errors
+
+
+def item_error(index, error):
+    """
+    Per item result of rejected operation
+    """
+
+    return {"index": index, "status": 400, "error": error}
+
+
+def validate_bulk_creates(items):
+    """
+    Return valid create operations and results of rejected ones
+    """
+
+    valid, errors = load_many(items)
+    results = [item_error(i, error) for i, error in errors.items()]
+    seen, creates = set(), []
+    for index, data in valid:
+        if data["name"] in seen:
+            results.append(item_error(index, DUPLICATE_NAME_MSG))
+        else:
+            seen.add(data["name"])
+            creates.append((index, data))
+    return creates, results
+
+
+def validate_bulk_updates(items):
+    """
+    Return valid update operations (with id) and results of rejected
+    ones, like PATCH only given fields are modified
+    """
+
+    results, indexes, ids, payloads = [], [], [], []
+    for index, item in enumerate(items):
+        pizza_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(pizza_id, int) or isinstance(pizza_id, bool):
+            results.append(item_error(index, INVALID_ID_MSG))
+            continue
+        indexes.append(index)
+        ids.append(pizza_id)
+        payloads.append({k: v for k, v in item.items() if k != "id"})
+
+    valid, errors = load_many(payloads, partial=True)
+    results.extend(item_error(indexes[i], error) for i, error in errors.items())
+    updates = []
+    for i, data in valid:
+        if data:
+            updates.append((indexes[i], {**data, "id": ids[i]}))
+        else:
+            results.append(item_error(indexes[i], NO_FIELDS_MSG))
+    return updates, results
+
+
+def reject_name_conflicts(creates, updates, create_results, update_results):
+    """
+    Return creates and updates without those taking name of other pizza
+    (existing one, or created or renamed earlier in request), results of
+    rejected ones are appended to create_results and update_results, so
+    conflict fails only its own item instead of whole transaction
+    """
+
+    names = {data["name"] for _, data in creates + updates if "name" in data}
+    if not names:
+        return creates, updates
+    # Owner (id, None for new pizza) of every name taken so far
+    owners = PizzaModel.get_ids_by_name(names)
+
+    accepted_creates, accepted_updates = [], []
+    upserts = PizzaModel.upserts_on_name()
+    for index, data in creates:
+        if data["name"] in owners and not upserts:
+            create_results.append(item_error(index, ALREADY_EXISTS_MSG))
+        else:
+            owners.setdefault(data["name"], None)
+            accepted_creates.append((index, data))
+
+    for index, data in updates:
+        name = data.get("name")
+        if name is not None and owners.setdefault(name, data["id"]) != data["id"]:
+            update_results.append(item_error(index, ALREADY_EXISTS_MSG))
+        else:
+            accepted_updates.append((index, data))
+    return accepted_creates, accepted_updates
+
+
+def validate_bulk_deletes(items):
+    """
+    Return valid delete operations (ids) and results of rejected ones
+    """
+
+    deletes, results = [], []
+    for index, pizza_id in enumerate(items):
+        if isinstance(pizza_id, int) and not isinstance(pizza_id, bool):
+            deletes.append((index, pizza_id))
+        else:
+            results.append(item_error(index, INVALID_ID_MSG))
+    return deletes, results
+
+
+@pizza_api.route("/bulk", methods=["POST"])
+def bulk_pizzas():
+    """
+    Create, update and delete many pizzas in single transaction
+    """
+
+    req_data = request.get_json(silent=True)
+    if not isinstance(req_data, dict):
+        return custom_response({"error": INVALID_BULK_MSG}, 400)
+    operations = {op: req_data.get(op, []) for op in ("create", "update", "delete")}
+    if not all(isinstance(items, list) for items in operations.values()):
+        return custom_response({"error": INVALID_BULK_MSG}, 400)
+    if sum(map(len, operations.values())) > current_app.config["PIZZA_BULK_MAX_ITEMS"]:
+        return custom_response({"error": TOO_MANY_OPERATIONS_MSG}, 400)
+
+    creates, create_results = validate_bulk_creates(operations["create"])
+    updates, update_results = validate_bulk_updates(operations["update"])
+    deletes, delete_results = validate_bulk_deletes(operations["delete"])
+    creates, updates = reject_name_conflicts(
+        creates, updates, create_results, update_results
+    )
+
+    try:
+        created_ids, updated_ids, deleted_ids = PizzaModel.bulk_write(
+            [data for _, data in creates],
+            [data for _, data in updates],
+            [pizza_id for _, pizza_id in deletes],
+            current_app.config["PIZZA_BULK_BATCH_SIZE"],
+        )
+    except IntegrityError:
+        # Name was taken by concurrent writer after it was checked
+        message = {"error": ALREADY_EXISTS_MSG}
+        return custom_response(message, 400)
+
+    create_results.extend(
+        {"index": index, "status": 200, "id": pizza_id}
+        for (index, _), pizza_id in zip(creates, created_ids)
+    )
+    for results, done, applied in (
+        (update_results, [(i, data["id"]) for i, data in updates], updated_ids),
+        (delete_results, deletes, deleted_ids),
+    ):
+        for index, pizza_id in done:
+            if pizza_id in applied:
+                results.append({"index": index, "status": 200, "id": pizza_id})
+            else:
+                results.append({"index": index, "status": 404, "error": NOT_EXISTS_MSG})
+
+    message = {
+        op: sorted(results, key=lambda result: result["index"])
+        for op, results in (
+            ("create", create_results),
+            ("update", update_results),
+            ("delete", delete_results),
+        )
+    }
+    return custom_response(message, 200)
+
+
 @pizza_api.route("/", methods=["GET"])
 def get_all_pizzas():
     """
-    Get all pizzas
+    Get all pizzas, one page at a time
     """
 
-    pizzas = PizzaModel.get_all_pizzas()
+    try:
+        limit, cursor, fields, filters = parse_list_args(request.args)
+    except ValueError as exc:
+        return custom_response({"error": str(exc)}, 400)
+
+    # Export mode, whole catalog is streamed instead of being paginated
+    if wants_ndjson():
+        return ndjson_response(cursor, fields, filters)
+
+    query = urlencode(sorted(request.args.items(multi=True)))
+    cached = cache.get_list(query)
+    if cached is not None:
+        return not_modified(cached[1]) or json_response(*cached, "HIT")
+
+    key = f"list?{query}"
+    # Snapshot of page is served while database is unavailable
+    with circuit_breaker.guard(key):
+        if request.if_none_match:
+            # Version (count, max modified_at) of whole filtered set, rows
+            # are not loaded
+            version = PizzaModel.get_list_version(filters)
+            if version[0]:
+                response = not_modified({"ETag": make_etag(query, *version)})
+                if response:
+                    return response
+
+        page = coalescer.run(
+            key, lambda: load_page(query, limit, cursor, fields, filters)
+        )
+    if page:
+        circuit_breaker.remember(key, *page)
+        return json_response(*page, "MISS")
+
+    circuit_breaker.forget(key)
+    message = {"error": "No pizzas were found"}
+    return custom_response(message, 404)
 
-    if pizzas:
-        serialized_pizzas = pizza_schema.dump(pizzas, many=True)
-        return custom_response(serialized_pizzas, 200)
 
+def load_page(query, limit, cursor, fields, filters):
+    """
+    Load and serialize page of pizzas, return cached body and headers
+    or None if page is empty
+    """
+
+    # Read before database, page read before concurrent write is not
+    # stored as current one
+    generation = cache.generation()
+    version = PizzaModel.get_list_version(filters)
+    # No Last-Modified, deleting row other than the newest one keeps max
+    # modified_at, only ETag (with count of rows) tells the list changed
+    headers = {"ETag": make_etag(query, *version)}
+    # One extra row tells whether next page exists
+    pizzas = PizzaModel.get_pizzas_page(
+        limit + 1, cursor, projection_columns(fields), filters
+    )
+    has_next = len(pizzas) > limit
+    pizzas = pizzas[:limit]
+    if not pizzas:
+        return None
+
+    schema = projection_schema(fields) if fields else pizza_schema
+    if has_next:
+        headers.update(next_page_headers(pizzas[-1].id))
+    with serialization_timer():
+        body = dumps(schema, pizzas, many=True).encode()
+    cache.set_list(query, body, headers, generation)
+    return body, headers
+
+
+@pizza_api.route("/search", methods=["GET"])
+def search_pizzas():
+    """
+    Search pizzas by name, best matches first
+    """
+
+    try:
+        query, limit, offset = parse_search_args(request.args)
+    except ValueError as exc:
+        return custom_response({"error": str(exc)}, 400)
+
+    cache_key = "search?" + urlencode(sorted(request.args.items(multi=True)))
+    cached = cache.get_list(cache_key)
+    if cached is not None:
+        return json_response(*cached, "HIT")
+
+    with circuit_breaker.guard(cache_key):
+        matches = coalescer.run(
+            cache_key, lambda: load_matches(cache_key, query, limit, offset)
+        )
+    if matches:
+        circuit_breaker.remember(cache_key, *matches)
+        return json_response(*matches, "MISS")
+
+    circuit_breaker.forget(cache_key)
     message = {"error": "No pizzas were found"}
     return custom_response(message, 404)
 
 
+def load_matches(cache_key, query, limit, offset):
+    """
+    Search and serialize matching pizzas, return cached body and
+    headers or None if nothing matches
+    """
+
+    generation = cache.generation()
+    # One extra match tells whether next page exists
+    pizzas = pizza_search.search(query, limit + 1, offset, generation)
+    has_next = len(pizzas) > limit
+    pizzas = pizzas[:limit]
+    if not pizzas:
+        return None
+
+    headers = {"X-Search-Backend": pizza_search.backend()}
+    if has_next:
+        next_args = {**request.args.to_dict(), "offset": offset + limit}
+        next_url = url_for("pizza.search_pizzas", **next_args)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+    with serialization_timer():
+        body = dumps(pizza_schema, pizzas, many=True).encode()
+    cache.set_list(cache_key, body, headers, generation)
+    return body, headers
+
+
 @pizza_api.route("/<int:pizza_id>", methods=["GET"])
 def get_single_pizza(pizza_id):
     """
     Get a single pizza
     """
 
-    pizza = PizzaModel.get_pizza_by_id(pizza_id)
-
-    if not pizza:
+    cached = cache.get_item(pizza_id)
+    if cached is not None:
+        return not_modified(cached[1]) or json_response(*cached, "HIT")
+
+    key = f"item:{pizza_id}"
+    with circuit_breaker.guard(key):
+        if is_conditional():
+            # Only version is read, row is loaded when it was modified
+            version = PizzaModel.get_pizza_version(pizza_id)
+            if version:
+                response = not_modified(
+                    validator_headers(make_etag(*version), version.modified_at)
+                )
+                if response:
+                    return response
+
+        loaded = coalescer.run(key, lambda: load_pizza(pizza_id))
+
+    if not loaded:
+        circuit_breaker.forget(key)
         message = {"error": NOT_EXISTS_MSG}
         return custom_response(message, 404)
 
-    serialized_pizza = pizza_schema.dump(pizza)
+    circuit_breaker.remember(key, *loaded)
+    return json_response(*loaded, "MISS")
 
-    return custom_response(serialized_pizza, 200)
+
+def load_pizza(pizza_id):
+    """
+    Load and serialize pizza, return cached body and headers or None
+    if pizza does not exist
+    """
+
+    generation = cache.generation()
+    pizza = PizzaModel.get_pizza_by_id(pizza_id)
+    if not pizza:
+        return None
+
+    with serialization_timer():
+        body = dumps(pizza_schema, pizza).encode()
+    headers = validator_headers(
+        make_etag(pizza.id, pizza.modified_at), pizza.modified_at
+    )
+    cache.set_item(pizza_id, body, headers, generation)
+    return body, headers
+
+
+def checked_version(pizza_id):
+    """
+    Return (response, modified_at) for request with If-Match header:
+    404 or 412 response when pizza is missing or ETag does not match,
+    otherwise version expected by write. Without If-Match nothing is
+    read.
+    """
+
+    if not request.if_match:
+        return None, None
+    version = PizzaModel.get_pizza_version(pizza_id)
+    if version is None:
+        return custom_response({"error": NOT_EXISTS_MSG}, 404), None
+    if precondition_failed(make_etag(*version)):
+        return custom_response({"error": PRECONDITION_FAILED_MSG}, 412), None
+    return None, version.modified_at
+
+
+def write_not_applied(pizza_id, modified_at):
+    """
+    Response of write which matched no row, pizza does not exist or
+    (with If-Match) it was modified after its version was checked
+    """
+
+    if modified_at is not None and PizzaModel.get_pizza_version(pizza_id):
+        return custom_response({"error": PRECONDITION_FAILED_MSG}, 412)
+    return custom_response({"error": NOT_EXISTS_MSG}, 404)
 
 
 @pizza_api.route("/<int:pizza_id>", methods=["PATCH"])
 def update_pizza(pizza_id):
     """
-    Update a pizza
+    Update a pizza, only given fields are modified
     """
 
     req_data = request.get_json()
 
     try:
-        data = pizza_schema.load(req_data)
-        pizza = PizzaModel.get_pizza_by_id(pizza_id)
-        pizza.update(data)
-
+        data = validated(pizza_schema, req_data, partial=True)
     except ValidationError:
         message = {"error": BLANK_FIELD_MSG}
         return custom_response(message, 400)
+    if not data:
+        return custom_response({"error": NO_FIELDS_MSG}, 400)
+
+    response, modified_at = checked_version(pizza_id)
+    if response:
+        return response
 
+    try:
+        pizza = PizzaModel.update_by_id(pizza_id, data, modified_at)
     except IntegrityError:
         message = {"error": ALREADY_EXISTS_MSG}
         return custom_response(message, 400)
 
-    except AttributeError:
-        message = {"error": NOT_EXISTS_MSG}
-        return custom_response(message, 404)
+    if pizza is None:
+        return write_not_applied(pizza_id, modified_at)
 
     message = {"message": "Pizza updated", "id": pizza.id}
     # In case of response 204, message is not displayed
-    return custom_response(message, 200)
+    return custom_response(
+        message, 200, {"ETag": make_etag(pizza.id, pizza.modified_at)}
+    )
 
 
 @pizza_api.route("/<int:pizza_id>", methods=["DELETE"])
@@ -120,14 +785,13 @@ def delete_pizza(pizza_id):
     Delete a pizza
     """
 
-    try:
-        pizza = PizzaModel.get_pizza_by_id(pizza_id)
-        pizza.delete()
+    response, modified_at = checked_version(pizza_id)
+    if response:
+        return response
 
-    except AttributeError:
-        message = {"error": NOT_EXISTS_MSG}
-        return custom_response(message, 404)
+    if not PizzaModel.delete_by_id(pizza_id, modified_at):
+        return write_not_applied(pizza_id, modified_at)
 
-    message = {"message": "Pizza deleted", "id": pizza.id}
+    message = {"message": "Pizza deleted", "id": pizza_id}
     # In case of response 204, message is not displayed
     return custom_response(message, 200)
@@ -0,0 +1,7 @@
+"""
+This file contains WSGI entry point used by production server
+"""
+
+from .app import create_app
+
+app = create_app(serve_only=True)
@@ -2,14 +2,44 @@
 
 set -euo pipefail
 
-# Skip DB migration if variable FLASK_SKIP_MIGRATION is set
-# - added because of possible UBOUND VARIABLE erorr
-if [[ -z "${FLASK_SKIP_DB_MIGRATION-}" ]]; then
+run_migrations() {
   echo "INFO: Running DB migrations..."
   flask --app pizzaapp.app db init
   flask --app pizzaapp.app db migrate
   flask --app pizzaapp.app db upgrade
+  flask --app pizzaapp.app pizza search-index
+}
+
+# "run.sh migrate" only migrates database (one-shot job), then exits
+if [[ "${1-}" == "migrate" ]]; then
+  run_migrations
+  exit 0
+fi
+
+# Skip DB migration if variable FLASK_SKIP_MIGRATION is set
+# (pods of Helm release leave it to migration job)
+# - added because of possible UBOUND VARIABLE erorr
+if [[ -z "${FLASK_SKIP_DB_MIGRATION-}" ]]; then
+  run_migrations
+fi
+
+# Flask development server can be still used for debugging
+if [[ -n "${FLASK_DEV_SERVER-}" ]]; then
+  echo "INFO: Starting application (development server)..."
+  exec flask --app pizzaapp.app run --host=0.0.0.0
+fi
+
+# Metrics of all gunicorn workers are aggregated through this directory,
+# it has to be empty on start
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/pizzaapp-metrics}"
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+
+# Uvicorn workers serve ASGI variant of app (asyncio database driver)
+APP_MODULE="pizzaapp.wsgi:app"
+if [[ "${GUNICORN_WORKER_CLASS-}" == "uvicorn" ]]; then
+  APP_MODULE="pizzaapp.asgi:app"
 fi
 
 echo "INFO: Starting application..."
-flask --app pizzaapp.app run --host=0.0.0.0
+exec gunicorn --config gunicorn.conf.py "${APP_MODULE}"